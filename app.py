@@ -1,20 +1,46 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context
 from assistant_core import AssistantCore
-from train_intent_model import train_save
+from query_log import QueryLog
+from query_analytics import QueryAggregates
+from query_index import QueryIndex, DEFAULT_PAGE_SIZE
+from retrain_service import ModelWatcher, RetrainService, current_model_path
+from config import LIVE_DEFAULTS, LiveSettings, tunable
+from session_store import ChatState, make_session_store
+from ledger import Ledger
+from intent_store import open_store
+from batch_classify import BatchClassifier, iter_jsonl, parse_message
+from metrics import ERRORS, INTENTS, REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, MetricsExporter, RequestProfiler
 import json
 import os
 import csv
+import io
+import secrets
 from datetime import datetime
+import time
 import traceback
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 
 # --- CONFIGURATION ---
-QUERY_LOG_FILE = "user_queries_log.json"
-SETTINGS_FILE = "settings.json"
+# Environment variables (upper-case) override settings.json keys
+QUERY_LOG_FILE = "user_queries_log.json"  # legacy JSON array, migrated once into QUERY_LOG_DIR
+QUERY_LOG_DIR = tunable("query_log_dir", "query_log")
+RETRAIN_MODE = tunable("retrain_mode", "full")  # "full" or "incremental"
+FULL_REFIT_EVERY = tunable("full_refit_every", 10)  # incremental mode: full refit every N runs
+SESSION_BACKEND = tunable("session_backend", "memory")  # "memory" or "sqlite" (multi-worker)
+SESSION_TTL = tunable("session_ttl", 1800)
+SESSION_DB = tunable("session_db", "chat_sessions.sqlite3")
+LEDGER_DB = tunable("ledger_db", "ledger.sqlite3")
+INTENTS_DB = tunable("intents_db", "intents.sqlite3")  # intent catalogue, seeded from intents.json
+MODELS_DIR = tunable("models_dir", "models")  # models published by background retrains
+DASHBOARD_TRANSACTIONS = tunable("dashboard_transactions", 20)  # rows rendered per page
+BATCH_WORKERS = tunable("batch_workers", 1)  # fuzzy fallback processes for /chatbot/batch (1: in the web worker)
+METRICS_DIR = tunable("metrics_dir", "metrics")  # per-worker metric snapshots merged by /metrics
+SETTINGS_FILE = "settings.json"  # live settings (thresholds, cache sizes), see config.LiveSettings
 
 # ---------------- FAKE USER DATABASE ----------------
+# Logins; balances and transactions seed the ledger on first start
 users = {
     "user1": {
         "password": "pass123",
@@ -32,62 +58,123 @@ users = {
     }
 }
 
-# ---------------- INITIALIZE ASSISTANT ----------------
+# ---------------- SERVICES ----------------
+# Created by create_app(); module-level so the route functions can use them
 MODEL_PATH = "intent_model.pkl"
-
-if not os.path.exists(MODEL_PATH):
-    print("Training model for the first time...")
-    train_save()
-
-assistant = AssistantCore()
-
-# Map all user accounts to assistant
-for username, user in users.items():
-    if "account_no" in user:
-        acct_no = user["account_no"]
-        assistant.accounts[acct_no] = {
-            "balance": user["balance"],
-            "transactions": user["transactions"],
-            "full_name": user["full_name"],
-            "username": username
-        }
+assistant = None
+intent_store = None
+live_settings = None
+ledger = None
+retrainer = None
+model_watcher = None
+query_log = None
+query_stats = None
+query_index = None
+chat_sessions = None
+metrics_exporter = None
+profiler = RequestProfiler()
+_STAGE_SESSION_LOAD, _STAGE_LOG_QUERY, _STAGE_SESSION_SAVE = (
+    STAGE_SECONDS.labels(stage) for stage in ("session_load", "log_query", "session_save"))
+
+def create_app(start_background=True):
+    """Load the model and set up the services, then return the Flask app.
+
+    A pre-forking server (see gunicorn.conf.py) calls this in the master with
+    ``start_background=False`` so the model is loaded once and shared
+    copy-on-write by the workers, and then calls ``start_background()`` in
+    each worker after the fork, since threads do not survive ``fork()``.
+    """
+    global assistant, intent_store, live_settings, ledger, retrainer, model_watcher, query_log, query_stats, query_index, chat_sessions, metrics_exporter
+    if assistant is not None:
+        if start_background:
+            start_background_services()
+        return app
+
+    # Admin edits live in the store; hand edits of intents.json are merged in
+    intent_store = open_store(INTENTS_DB)
+    if not os.path.exists(MODEL_PATH):
+        # Training-only imports (sklearn metrics, model_selection) stay off the serving path
+        from train_intent_model import train_save
+        print("Training model for the first time...")
+        train_save(intents_path=INTENTS_DB)
+
+    # Prefer the newest model published by a background retrain
+    ledger = Ledger(LEDGER_DB)
+    live_settings = LiveSettings(SETTINGS_FILE)
+    assistant = AssistantCore(current_model_path(MODELS_DIR, default=MODEL_PATH), ledger=ledger, settings=live_settings.current,
+                              intent_store=intent_store)
+    live_settings.subscribe(assistant.configure)
+    # Intent edits (from any worker) patch the router, fuzzy index and handlers in place
+    intent_store.subscribe(assistant.apply_intent_changes)
+
+    # Accounts and transactions live in the ledger; users only seeds it
+    ledger.seed(users)
+
+    retrainer = RetrainService(
+        on_model_ready=lambda path, version: assistant.load_model(path),
+        models_dir=MODELS_DIR,
+        mode=RETRAIN_MODE,
+        full_refit_every=FULL_REFIT_EVERY,
+        start=False,
+        intents_path=INTENTS_DB
+    )
+    # Picks up models published by a retrain in another worker process
+    model_watcher = ModelWatcher(assistant, MODELS_DIR)
+
+    query_log = QueryLog(QUERY_LOG_DIR, legacy_path=QUERY_LOG_FILE, start_writer=False)
+    query_stats = QueryAggregates(query_log)
+    query_index = QueryIndex(query_log)
+
+    # Chat state lives server-side; the cookie only carries a short session id
+    chat_sessions = make_session_store(SESSION_BACKEND, ttl=SESSION_TTL, path=SESSION_DB)
+
+    cache = assistant.prediction_cache
+    REGISTRY.callback("bankbot_prediction_cache_hits_total", "Prediction cache hits", lambda: cache.hits, kind="counter")
+    REGISTRY.callback("bankbot_prediction_cache_misses_total", "Prediction cache misses", lambda: cache.misses, kind="counter")
+    REGISTRY.callback("bankbot_prediction_cache_entries", "Prediction cache entries", lambda: cache.stats()["size"])
+    metrics_exporter = MetricsExporter(REGISTRY, METRICS_DIR)
+    metrics_exporter.clear()
+
+    if start_background:
+        start_background_services()
+    return app
+
+def start_background_services():
+    query_log.start()
+    retrainer.start()
+    model_watcher.start()
+    live_settings.start()
+    intent_store.start()
+    metrics_exporter.start()
 
 # ---------------- HELPER FUNCTIONS ----------------
 def log_user_query(username, message, tag):
-    new_query = {
+    query_log.append({
         "user": username,
         "query": message,
         "intent_tag": tag,
         "timestamp": datetime.now().isoformat()
-    }
-    logs = []
-    if os.path.exists(QUERY_LOG_FILE):
-        try:
-            with open(QUERY_LOG_FILE, "r", encoding="utf-8") as f:
-                logs = json.load(f)
-        except json.JSONDecodeError:
-            logs = []
-    logs.append(new_query)
-    with open(QUERY_LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=4, ensure_ascii=False)
-
-def get_query_logs():
-    if os.path.exists(QUERY_LOG_FILE):
-        try:
-            with open(QUERY_LOG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
-    return []
+    })
+
+def query_filters():
+    """Filters shared by the admin query browser and the CSV export."""
+    return dict(
+        user=request.args.get("user") or None,
+        tag=request.args.get("intent") or None,
+        date_from=request.args.get("date_from") or None,
+        date_to=request.args.get("date_to") or None
+    )
+
+def matches_filters(log, user=None, tag=None, date_from=None, date_to=None):
+    day = log.get("timestamp","")[:10]
+    return ((user is None or log.get("user","Anonymous") == user)
+            and (tag is None or log.get("intent_tag","N/A") == tag)
+            and (date_from is None or day >= date_from)
+            and (date_to is None or day <= date_to))
 
 def get_current_settings():
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {"confidence_threshold": 0.7, "max_response_length": 500}
-    return {"confidence_threshold": 0.7, "max_response_length": 500}
+    # Served from memory; the watcher reloads it when settings.json changes
+    return live_settings.current.as_dict()
 
 # ---------------- ROUTES ----------------
 @app.route("/")
@@ -102,7 +189,7 @@ def login():
         user = users.get(username)
         if user and user["password"] == password:
             session["user"] = username
-            session["chat_state"] = {}
+            session["sid"] = secrets.token_urlsafe(12)
             return redirect(url_for("dashboard"))
         else:
             return render_template("login.html", error="Invalid username or password")
@@ -115,38 +202,143 @@ def dashboard():
         return redirect(url_for("login"))
     user = users[username]
     is_admin = username == "user1"
+    account = ledger.get_account(user["account_no"]) or user
+    transactions = ledger.last_transactions(user["account_no"], DASHBOARD_TRANSACTIONS)
     return render_template(
         "dashboard.html",
         user=user,
-        transactions_json=json.dumps(user.get("transactions", [])),
-        account=user,
+        transactions_json=json.dumps(transactions),
+        account=account,
         is_admin=is_admin
     )
 
+def account_access_error(account_no):
+    """Error response unless the logged-in user may read ``account_no``."""
+    username = session.get("user")
+    if not username:
+        return jsonify({"error": "Please login first."}), 401
+    if users[username].get("account_no") != account_no and username != "user1":
+        return jsonify({"error": "Forbidden"}), 403
+    if account_no not in ledger:
+        return jsonify({"error": "Unknown account"}), 404
+    return None
+
+@app.route("/api/accounts/<account_no>/transactions")
+def account_transactions(account_no):
+    """One page of history, newest first; pass ``next_cursor`` back as
+    ``before`` for the next page. ``from``/``to`` select a date range
+    instead, oldest first."""
+    error = account_access_error(account_no)
+    if error:
+        return error
+    limit = min(max(request.args.get("limit", DASHBOARD_TRANSACTIONS, type=int), 1), 500)
+    date_from, date_to = request.args.get("from"), request.args.get("to")
+    next_cursor = None
+    if date_from or date_to:
+        txs = ledger.transactions_between(account_no, date_from, date_to, limit=limit)
+    else:
+        txs = ledger.last_transactions(account_no, limit, before=request.args.get("before", type=int))
+        if len(txs) == limit:
+            next_cursor = txs[-1]["id"]
+    return jsonify({
+        "transactions": txs,
+        "next_cursor": next_cursor,
+        "balance": ledger.get_account(account_no)["balance"]
+    })
+
+@app.route("/api/accounts/<account_no>/insights")
+def account_insights(account_no):
+    """Category totals, monthly cash flow with rolling averages, and unusual
+    debits; cached per account until its next transaction."""
+    error = account_access_error(account_no)
+    if error:
+        return error
+    months = min(max(request.args.get("months", 12, type=int), 1), 120)
+    return jsonify(assistant.spending.insights(account_no).report(months=months))
+
 # ---------------- CHATBOT ROUTE ----------------
+# The async serving mode (asgi_app.py) runs the same steps with awaits in between
 @app.route("/chatbot", methods=["POST"])
 def chatbot():
-    username = session.get("user")
+    username, message, sid = chat_request()
     if not username:
         return jsonify({"reply": "Please login first."})
+    reply = profiler.run(chat_turn, username, message, sid)
+    return jsonify({"reply": reply})
 
+def chat_request():
+    """``(username, message, sid)`` of the current /chatbot request; the
+    username is None when nobody is logged in."""
+    username = session.get("user")
+    if not username:
+        return None, None, None
     message = request.json.get("message", "")
-    session_state = session.get("chat_state", {})
+    sid = session.get("sid")
+    if not sid:
+        sid = session["sid"] = secrets.token_urlsafe(12)
+    return username, message, sid
 
+def answer(message, session_state):
+    """``handle_input``, with the error reply if it fails."""
     try:
-        reply, tag, new_session_state = assistant.handle_input(message, session_state)
-        log_user_query(username, message, tag)
+        return assistant.handle_input(message, session_state)
     except Exception:
-        reply, tag = "I'm sorry, I encountered an error. Please try again.", "error"
-        new_session_state = session_state
-        log_user_query(username, message, tag)
+        ERRORS.inc("chatbot")
         traceback.print_exc()
+        return "I'm sorry, I encountered an error. Please try again.", "error", session_state
+
+def chat_turn(username, message, sid):
+    clock = time.perf_counter
+    start = clock()
+    session_state = chat_sessions.get(sid) or ChatState()
+    loaded = clock()
+    _STAGE_SESSION_LOAD.observe(loaded - start)
+
+    reply, tag, new_session_state = answer(message, session_state)
+    handled = clock()
+    log_user_query(username, message, tag)
+    logged = clock()
+    _STAGE_LOG_QUERY.observe(logged - handled)
+    INTENTS.inc(tag)
+
+    chat_sessions.put(sid, new_session_state)
+    end = clock()
+    _STAGE_SESSION_SAVE.observe(end - logged)
+    REQUEST_SECONDS.observe(end - start)
+    return reply
+
+@app.route("/chatbot/batch", methods=["POST"])
+def chatbot_batch():
+    """Classify a JSON list (or ``{"messages": [...]}``) or a JSONL body of
+    messages or query-log entries, each as a fresh conversation. Streams one
+    JSON line per message with its tag, confidence and whether it differs
+    from the logged tag. Nothing is written to the query log."""
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get("messages")
+        if not isinstance(data, list):
+            return jsonify({"error": "Expected a list of messages"}), 400
+        try:
+            messages = [parse_message(item) for item in data]
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        messages = iter_jsonl(request.stream)
+    classifier = BatchClassifier(assistant, workers=BATCH_WORKERS, replies=request.args.get("replies") == "1")
 
-    session["chat_state"] = new_session_state
-    return jsonify({"reply": reply})
+    def generate():
+        for result in classifier.run(messages):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 @app.route("/logout")
 def logout():
+    if session.get("sid"):
+        chat_sessions.delete(session["sid"])
     session.clear()
     return redirect(url_for("home"))
 
@@ -183,23 +375,93 @@ def add_intent():
         return jsonify({"success": False, "message": "All fields must be filled."})
 
     try:
-        with open("intents.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {"intents": []}
-
-    data["intents"].append({
-        "tag": intent_name,
-        "patterns": patterns,
-        "responses": responses
-    })
-
-    with open("intents.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+        if intent_name in intent_store:
+            # An existing tag gets the new patterns and responses, without duplicates
+            added = intent_store.add_patterns(intent_name, patterns)
+            intent_store.add_responses(intent_name, responses)
+            message = f"Intent updated with {len(added)} new pattern(s)."
+        else:
+            added = intent_store.add_intent(intent_name, patterns, responses)["patterns"]
+            message = "Intent added."
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)})
+
+    if not added:
+        return jsonify({"success": True, "message": message}), 200
+    job = retrainer.submit(f"add_intent:{intent_name}")
+    return jsonify({
+        "success": True,
+        "message": f"{message} The model is retraining in the background.",
+        "job_id": job["id"]
+    }), 202
+
+# ---------------- INTENT CATALOGUE ----------------
+@app.route("/admin/intents")
+def admin_intents():
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({"version": intent_store.version(), "intents": intent_store.summary()})
 
-    train_save()
-    assistant.load_model()
-    return jsonify({"success": True, "message": "Intent added and model retrained successfully!"})
+@app.route("/admin/intents/<tag>", methods=["GET", "PUT", "DELETE"])
+def admin_intent(tag):
+    """One intent: GET it, PUT ``{"patterns": [...], "responses": [...], ...}``
+    to replace those fields, or DELETE it."""
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    try:
+        if request.method == "GET":
+            intent = intent_store.get(tag)
+            if intent is None:
+                raise KeyError(tag)
+            return jsonify(intent)
+        if request.method == "DELETE":
+            intent_store.delete_intent(tag)
+            intent = None
+        else:
+            fields = request.get_json(silent=True) or {}
+            fields.pop("tag", None)
+            intent = intent_store.update_intent(tag, **fields)
+    except KeyError:
+        return jsonify({"success": False, "message": f"No intent '{tag}'."}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    job = retrainer.submit(f"{request.method.lower()}_intent:{tag}")
+    return jsonify({"success": True, "intent": intent, "job_id": job["id"]}), 202
+
+@app.route("/admin/intents/<tag>/patterns", methods=["POST", "DELETE"])
+def admin_intent_patterns(tag):
+    """Add (POST) or remove (DELETE) ``{"patterns": [...]}`` of one intent."""
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    patterns = (request.get_json(silent=True) or {}).get("patterns")
+    if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+        return jsonify({"success": False, "message": "Expected a list of patterns."}), 400
+    try:
+        if request.method == "POST":
+            changed = len(intent_store.add_patterns(tag, patterns))
+        else:
+            changed = intent_store.remove_patterns(tag, patterns)
+    except KeyError:
+        return jsonify({"success": False, "message": f"No intent '{tag}'."}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 409
+    if not changed:
+        return jsonify({"success": True, "changed": 0})
+    job = retrainer.submit(f"patterns:{tag}")
+    return jsonify({"success": True, "changed": changed, "job_id": job["id"]}), 202
+
+# ---------------- RETRAIN STATUS ----------------
+@app.route("/admin/retrain_status")
+def admin_retrain_status():
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    job_id = request.args.get("job_id", type=int)
+    if job_id is None:
+        return jsonify(retrainer.status())
+    job = retrainer.status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job)
 
 # ---------------- ADMIN DASHBOARD DATA ----------------
 @app.route("/admin/dashboard_data")
@@ -207,30 +469,20 @@ def admin_dashboard_data():
     if session.get("user") != "user1":
         return jsonify({"error": "Unauthorized"}), 403
 
-    logs = get_query_logs()
-    total_queries = len(logs)
-    successful_queries = sum(1 for log in logs if log['intent_tag'] not in ['fallback', 'error'])
-    success_rate = round((successful_queries / total_queries) * 100, 1) if total_queries else 0
-
-    # Count all defined intents
-    try:
-        with open("intents.json", "r", encoding="utf-8") as f:
-            intent_data = json.load(f)
-            intent_count = len(intent_data.get("intents", []))
-    except:
-        intent_count = 0
-
+    stats = query_stats.refresh()
     recent_queries = [dict(
         query=q.get("query","N/A"),
         intent=q.get("intent_tag","N/A"),
         confidence=95 if q.get("intent_tag") not in ["fallback","error"] else 50,
         date=q.get("timestamp","")[:10]
-    ) for q in logs[-10:][::-1]]
+    ) for q in stats.recent_queries(10)]
 
     return jsonify({
-        "total_queries": total_queries,
-        "success_rate": success_rate,
-        "intent_count": intent_count,
+        "total_queries": stats.total,
+        "success_rate": stats.success_rate(),
+        "fallback_rate": stats.fallback_rate(),
+        "error_rate": stats.error_rate(),
+        "intent_count": len(assistant.intent_map),
         "entity_count": 0,
         "recent_queries": recent_queries
     })
@@ -241,13 +493,19 @@ def admin_user_queries():
     if session.get("user") != "user1":
         return jsonify({"error": "Unauthorized"}), 403
 
-    logs = get_query_logs()
+    logs, next_cursor = query_index.refresh().page(
+        cursor=request.args.get("cursor", type=int),
+        limit=request.args.get("limit", DEFAULT_PAGE_SIZE, type=int),
+        **query_filters()
+    )
     user_queries = [dict(
+        id=log["id"],
         user=log.get("user","Anonymous"),
         query=log.get("query","N/A"),
+        intent=log.get("intent_tag","N/A"),
         date=log.get("timestamp","")[:16].replace("T"," ")
-    ) for log in logs[::-1]]
-    return jsonify({"queries": user_queries})
+    ) for log in logs]
+    return jsonify({"queries": user_queries, "next_cursor": next_cursor})
 
 # ---------------- FAQS ----------------
 @app.route("/admin/faqs")
@@ -276,17 +534,57 @@ def admin_faqs():
 def admin_analytics_data():
     if session.get("user") != "user1":
         return jsonify({"error": "Unauthorized"}), 403
+    stats = query_stats.refresh()
+    labels, monthly = stats.monthly_series(6)
     analytics_data = {
-        "monthly_queries": [150, 220, 300, 250, 410, 350],
-        "query_labels": ["May", "Jun", "Jul", "Aug", "Sep", "Oct"],
-        "top_intents": [
-            {"intent": "Check Balance", "count": 125},
-            {"intent": "Transfer Funds", "count": 80},
-            {"intent": "Loan Enquiry", "count": 65},
-        ]
+        "monthly_queries": monthly,
+        "query_labels": labels,
+        "top_intents": stats.top_intents(5),
+        "active_users": len(stats.by_user)
     }
     return jsonify(analytics_data)
 
+# ---------------- ROUTER STATS ----------------
+@app.route("/admin/router_stats")
+def admin_router_stats():
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(assistant.router_metrics.snapshot())
+
+# ---------------- PREDICTION CACHE STATS ----------------
+@app.route("/admin/cache_stats")
+def admin_cache_stats():
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(assistant.prediction_cache.stats())
+
+# ---------------- METRICS & PROFILING ----------------
+@app.route("/metrics")
+def metrics():
+    """Prometheus text format, summed over all worker processes (admin only:
+    the intent counts mirror the query log)."""
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    return Response(REGISTRY.render(METRICS_DIR), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """POST ``requests`` (0 stops) and ``mode`` (cpu or memory) to profile the
+    next /chatbot requests served by this worker; GET returns the report."""
+    if session.get("user") != "user1":
+        return jsonify({"error": "Unauthorized"}), 403
+    if request.method == "POST":
+        data = request.get_json(silent=True) or request.form
+        try:
+            count = int(data.get("requests", 0))
+            if count > 0:
+                profiler.arm(count, data.get("mode", "cpu"))
+            else:
+                profiler.disarm()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(profiler.status())
+
 # ---------------- SETTINGS ----------------
 @app.route("/admin/settings", methods=["GET","POST"])
 def admin_settings():
@@ -295,36 +593,49 @@ def admin_settings():
     if request.method=="GET":
         return jsonify(get_current_settings())
     else:
+        # Form fields or a JSON object; only live settings are accepted
+        data = request.get_json(silent=True) or request.form
+        changes = {name: data[name] for name in LIVE_DEFAULTS if data.get(name) not in (None, "")}
+        if not changes:
+            return jsonify({"success":False,"message":"No settings to update."})
         try:
-            new_threshold = float(request.form.get("confidence_threshold"))
-            settings = get_current_settings()
-            settings["confidence_threshold"] = new_threshold
-            with open(SETTINGS_FILE,"w",encoding="utf-8") as f:
-                json.dump(settings,f,indent=4)
+            # Applied to this worker at once; the others pick it up from the file
+            live_settings.update(changes)
             return jsonify({"success":True,"message":"Settings updated successfully."})
-        except ValueError:
-            return jsonify({"success":False,"message":"Invalid value for confidence threshold."})
+        except ValueError as e:
+            return jsonify({"success":False,"message":str(e)})
 
 # ---------------- EXPORT CSV ----------------
 @app.route("/admin/export_csv")
 def export_csv():
     if session.get("user") != "user1":
         return redirect(url_for("login"))
-    logs = get_query_logs()
-    output = [["Date","User","Query","Intent Tag"]]
-    for log in logs:
-        output.append([log.get("timestamp","")[:16].replace("T"," "),log.get("user","Anonymous"),log.get("query","N/A"),log.get("intent_tag","N/A")])
-    # Use CSV module
-    import io
-    si = io.StringIO()
-    writer = csv.writer(si)
-    writer.writerows(output)
-    response = make_response(si.getvalue())
+    filters = query_filters()
+
+    def generate(chunk_rows=500):
+        # Stream the log in chunks so memory stays flat whatever its size
+        si = io.StringIO()
+        writer = csv.writer(si)
+        writer.writerow(["Date","User","Query","Intent Tag"])
+        rows = 1
+        for log in query_log.iter_entries():
+            if not matches_filters(log, **filters):
+                continue
+            writer.writerow([log.get("timestamp","")[:16].replace("T"," "),log.get("user","Anonymous"),log.get("query","N/A"),log.get("intent_tag","N/A")])
+            rows += 1
+            if rows >= chunk_rows:
+                yield si.getvalue()
+                si.seek(0)
+                si.truncate(0)
+                rows = 0
+        yield si.getvalue()
+
+    response = Response(stream_with_context(generate()), mimetype="text/csv")
     response.headers["Content-Disposition"] = "attachment; filename=recent_queries.csv"
-    response.headers["Content-type"] = "text/csv"
     return response
 
 # ---------------- RUN APP ----------------
+# Development server. For production use gunicorn: gunicorn -c gunicorn.conf.py
 if __name__=="__main__":
     port = int(os.environ.get("PORT",5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    create_app().run(host="0.0.0.0", port=port, debug=True, use_reloader=False)
@@ -0,0 +1,307 @@
+"""Async serving mode: the Flask app behind an ASGI gateway.
+
+/chatbot is served on the event loop. The session store is read and
+written on a small I/O thread pool, ``handle_input`` (prediction, fuzzy and
+semantic scoring, ledger lookups) runs on a bounded CPU pool, and the query
+log append only queues the entry for its writer thread. Every other route
+is the Flask app itself, run through a WSGI bridge on thread pools of its
+own: bulk streams (CSV export, batch classification) on one, the rest on
+another, so exports, admin pages and retrain requests never hold a thread
+the chat needs. Bulk streams are also paced: after each chunk the bulk
+thread rests in proportion to the time the chunk took (``bulk_duty_cycle``),
+which leaves the GIL and the CPU to the chat in between.
+
+Each lane admits a bounded number of requests and queues a bounded number
+behind them. A request that finds the queue full, or waits longer than
+``queue_timeout``, is shed with a 503 and ``Retry-After`` instead of piling
+up until every request times out.
+
+Production:   WEB_MODE=async gunicorn -c gunicorn.conf.py
+Development:  uvicorn --factory asgi_app:create_asgi_app --port 5000
+"""
+import asyncio
+import contextvars
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+from werkzeug.exceptions import HTTPException
+
+import app as web
+from config import tunable
+from metrics import INTENTS, REGISTRY, REQUEST_SECONDS, STAGE_SECONDS
+from session_store import ChatState
+
+# --- CONFIGURATION ---
+# The GIL runs most of handle_input one thread at a time; more CPU threads only queue inside the pool
+CHAT_CPU_THREADS = tunable("chat_cpu_threads", 2)
+CHAT_IO_THREADS = tunable("chat_io_threads", 4)  # session store reads and writes
+CHAT_CONCURRENCY = tunable("chat_concurrency", 16)  # /chatbot requests in flight per worker
+CHAT_QUEUE = tunable("chat_queue", 64)  # /chatbot requests waiting for admission per worker
+WEB_THREADS = tunable("web_threads", 4)  # every other route, as for the gthread workers
+WEB_QUEUE = tunable("web_queue", 32)
+BULK_THREADS = tunable("bulk_threads", 1)  # long CPU-heavy streams, one at a time by default
+BULK_QUEUE = tunable("bulk_queue", 8)
+QUEUE_TIMEOUT = tunable("queue_timeout", 2.0)  # seconds a request may wait for admission
+BULK_QUEUE_TIMEOUT = tunable("bulk_queue_timeout", 60.0)  # an export waits for the one before it
+BULK_DUTY_CYCLE = tunable("bulk_duty_cycle", 0.5)  # share of wall time a bulk stream may compute (1 = unpaced)
+BULK_PATHS = ("/admin/export_csv", "/chatbot/batch")
+
+BUSY_REPLY = "I'm a little busy right now. Please try again in a moment."
+
+SHED = REGISTRY.counter(
+    "bankbot_shed_total", "Requests turned away with a 503 because their lane was full", ("lane",))
+_STAGE_SESSION_LOAD, _STAGE_LOG_QUERY, _STAGE_SESSION_SAVE = (
+    STAGE_SECONDS.labels(stage) for stage in ("session_load", "log_query", "session_save"))
+
+
+# ---------------- ADMISSION ----------------
+class Admission:
+    """At most ``limit`` requests running and ``queue_size`` waiting.
+
+    Only touched from the event loop, so the counters need no lock.
+    """
+
+    def __init__(self, lane, limit, queue_size, timeout):
+        self.lane = lane
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(limit)
+        self._shed = SHED.labels(lane)
+
+    async def acquire(self):
+        """True once admitted; False if the request is shed."""
+        if self._slots.locked() and self.waiting >= self.queue_size:
+            self._shed.inc()
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._shed.inc()
+            return False
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return True
+
+    def release(self):
+        self.running -= 1
+        self._slots.release()
+
+
+# ---------------- ASGI <-> WSGI ----------------
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def wsgi_environ(scope, body):
+    """PEP 3333 environ for an ASGI http ``scope`` with the whole ``body``."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _headers(pairs):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in pairs]
+
+
+async def send_response(send, response):
+    """Send a complete (non-streaming) Flask/Werkzeug response."""
+    await send({"type": "http.response.start", "status": response.status_code,
+                "headers": _headers(response.headers.items())})
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def send_busy(send, lane):
+    if lane == "chat":
+        status, body, kind = 503, json.dumps({"reply": BUSY_REPLY}).encode(), "application/json"
+    else:
+        status, body, kind = 503, b"Server busy, please retry shortly.\n", "text/plain; charset=utf-8"
+    await send({"type": "http.response.start", "status": status,
+                "headers": _headers([("Content-Type", kind), ("Content-Length", str(len(body))), ("Retry-After", "1")])})
+    await send({"type": "http.response.body", "body": body})
+
+
+# ---------------- GATEWAY ----------------
+class AsyncGateway:
+    """ASGI application: /chatbot on the event loop, the rest via WSGI."""
+
+    def __init__(self, flask_app, cpu_threads=CHAT_CPU_THREADS, io_threads=CHAT_IO_THREADS,
+                 web_threads=WEB_THREADS, bulk_threads=BULK_THREADS, chat_concurrency=CHAT_CONCURRENCY,
+                 chat_queue=CHAT_QUEUE, web_queue=WEB_QUEUE, bulk_queue=BULK_QUEUE,
+                 queue_timeout=QUEUE_TIMEOUT, bulk_queue_timeout=BULK_QUEUE_TIMEOUT,
+                 bulk_duty_cycle=BULK_DUTY_CYCLE):
+        self.flask_app = flask_app
+        self.duty_cycles = {"web": 1.0, "bulk": min(max(bulk_duty_cycle, 0.05), 1.0)}
+        # Pools start their threads on first use, i.e. in the worker after the fork
+        self.cpu_pool = ThreadPoolExecutor(cpu_threads, thread_name_prefix="chat-cpu")
+        self.io_pool = ThreadPoolExecutor(io_threads, thread_name_prefix="chat-io")
+        self.pools = {
+            "web": ThreadPoolExecutor(web_threads, thread_name_prefix="web"),
+            "bulk": ThreadPoolExecutor(bulk_threads, thread_name_prefix="bulk"),
+        }
+        self.lanes = {
+            "chat": Admission("chat", chat_concurrency, chat_queue, queue_timeout),
+            "web": Admission("web", web_threads, web_queue, queue_timeout),
+            "bulk": Admission("bulk", bulk_threads, bulk_queue, bulk_queue_timeout),
+        }
+        lanes = self.lanes
+        REGISTRY.callback("bankbot_lane_running", "Requests running per lane",
+                          lambda: {(name, ): lane.running for name, lane in lanes.items()}, labelnames=("lane",))
+        REGISTRY.callback("bankbot_lane_waiting", "Requests waiting for admission per lane",
+                          lambda: {(name, ): lane.waiting for name, lane in lanes.items()}, labelnames=("lane",))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        lane = self.lane(scope)
+        admission = self.lanes[lane]
+        if not await admission.acquire():
+            return await send_busy(send, lane)
+        try:
+            body = await read_body(receive)
+            if body is None:
+                return
+            environ = wsgi_environ(scope, body)
+            if lane == "chat":
+                await self._chat(environ, send)
+            else:
+                await self._wsgi(environ, send, self.pools[lane], self.duty_cycles[lane])
+        finally:
+            admission.release()
+
+    def lane(self, scope):
+        path = scope["path"]
+        if path == "/chatbot" and scope["method"] == "POST":
+            return "chat"
+        return "bulk" if path in BULK_PATHS else "web"
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for pool in (self.cpu_pool, self.io_pool, *self.pools.values()):
+                    pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---------------- CHAT ----------------
+    async def _chat(self, environ, send):
+        # Flask's request context lives in context variables, so it is this task's own across awaits
+        with self.flask_app.request_context(environ):
+            try:
+                username, message, sid = web.chat_request()
+                if not username:
+                    response = jsonify({"reply": "Please login first."})
+                else:
+                    response = jsonify({"reply": await self.chat_turn(username, message, sid)})
+            except HTTPException as e:
+                response = e.get_response()
+            response = self.flask_app.process_response(response)
+        await send_response(send, response)
+
+    async def chat_turn(self, username, message, sid):
+        """``app.chat_turn`` with the blocking steps awaited on the pools."""
+        loop = asyncio.get_running_loop()
+        clock = time.perf_counter
+        start = clock()
+        session_state = await loop.run_in_executor(self.io_pool, web.chat_sessions.get, sid) or ChatState()
+        loaded = clock()
+        _STAGE_SESSION_LOAD.observe(loaded - start)
+
+        reply, tag, new_session_state = await loop.run_in_executor(
+            self.cpu_pool, web.profiler.run, web.answer, message, session_state)
+        handled = clock()
+        web.log_user_query(username, message, tag)
+        logged = clock()
+        _STAGE_LOG_QUERY.observe(logged - handled)
+        INTENTS.inc(tag)
+
+        await loop.run_in_executor(self.io_pool, web.chat_sessions.put, sid, new_session_state)
+        end = clock()
+        _STAGE_SESSION_SAVE.observe(end - logged)
+        REQUEST_SECONDS.observe(end - start)
+        return reply
+
+    # ---------------- EVERYTHING ELSE ----------------
+    async def _wsgi(self, environ, send, pool, duty_cycle=1.0):
+        """Run the Flask app on ``pool`` and stream its body chunk by chunk,
+        resting between chunks so it computes ``duty_cycle`` of the time."""
+        loop = asyncio.get_running_loop()
+        # One context for every step, so stream_with_context pops what it pushed
+        context = contextvars.copy_context()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        def call(fn, *args):
+            return loop.run_in_executor(pool, context.run, fn, *args)
+
+        result = await call(self.flask_app, environ, start_response)
+        try:
+            chunks = iter(result)
+            chunk = await call(next, chunks, None)
+            status, headers = started
+            await send({"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                        "headers": _headers(headers)})
+            rest = (1 - duty_cycle) / duty_cycle
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                start = time.perf_counter()
+                chunk = await call(next, chunks, None)
+                if rest:
+                    await asyncio.sleep((time.perf_counter() - start) * rest)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await call(result.close)
+
+
+def create_asgi_app(start_background=True):
+    """``app.create_app`` wrapped in an AsyncGateway (same pre-fork contract)."""
+    return AsyncGateway(web.create_app(start_background))
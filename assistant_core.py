@@ -1,159 +1,301 @@
 import json
+import os
 import pickle
 import re
-import random
-from fuzzywuzzy import fuzz
+import sys
+import threading
+import time
+import numpy as np
+from compact_model import compact_path, export_pipeline, export_source, file_digest, load_compact
+from config import Settings
+from dialogue import DialogueRegistry, Turn
+from fuzzy_index import FuzzyIndex
+from ledger import Ledger
+from metrics import ROUTES, STAGE_SECONDS
+from prediction_cache import PredictionCache
+from rule_router import ACCOUNT_NUMBER, RuleRouter, RouterMetrics, normalize
+from semantic_index import SemanticIndex, semantic_path
+from spending_analytics import SpendingAnalytics
 
 INTENTS_PATH = "intents.json"
 MODEL_PATH = "intent_model.pkl"
+ACCOUNT_RE = re.compile(rf"\b({ACCOUNT_NUMBER})\b")
+
+# Bound once: observing a pre-resolved series skips the label lookup
+_STAGE_EXTRACT, _STAGE_ROUTE, _STAGE_PREDICT, _STAGE_FUZZY, _STAGE_SEMANTIC, _STAGE_DISPATCH = (
+    STAGE_SECONDS.labels(stage) for stage in ("extract", "route", "predict", "fuzzy", "semantic", "dispatch"))
+
+def truncate(text, limit):
+    """Cut ``text`` to at most ``limit`` characters, at a word if one is near."""
+    if not limit or len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+def read_model(path):
+    """Load a model, preferring its compact ``.npz`` export (see
+    compact_model.py), which needs no sklearn, over the pickle.
+
+    The export is used only if it was made from this very pickle (same
+    content digest); a stale one is reported, and replaced by a fresh
+    export, or removed if the model cannot be exported.
+    """
+    if path.endswith(".npz"):
+        return load_compact(path)
+    compact = compact_path(path)
+    stale = os.path.exists(compact)
+    if stale:
+        digest = file_digest(path)
+        if export_source(compact) == digest:
+            return load_compact(compact)
+        print(f"Warning: {compact} was not exported from {path}; loading the pickle instead", file=sys.stderr)
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+    if stale:
+        try:
+            if export_pipeline(model, compact, digest):
+                print(f"Re-exported {compact}", file=sys.stderr)
+            else:
+                os.remove(compact)
+        except OSError as e:
+            print(f"Warning: could not replace {compact}: {e}", file=sys.stderr)
+    return model
+
+def read_semantic(path, intents):
+    """The pattern vectors saved with a model, synced with the current
+    catalogue, or ``None`` if the model has none."""
+    vectors = semantic_path(path)
+    if not os.path.exists(vectors):
+        return None
+    return SemanticIndex.load(vectors).synced(intents)
+
+
+class ModelState:
+    """One model version with everything derived from it.
+
+    AssistantCore publishes a new ModelState with a single reference
+    assignment, so a request that grabbed ``assistant.state`` keeps a
+    consistent model, intent map and fuzzy index even during a hot-swap.
+    """
+    __slots__ = ("version", "catalogue", "model", "intents", "intent_map", "fuzzy_index", "semantic", "router", "dialogue")
+
+    def __init__(self, model, intents, version=None, catalogue=0, semantic=None):
+        self.version = version
+        self.catalogue = catalogue
+        self.model = model
+        self.intents = intents
+        self.intent_map = {it["tag"]: it for it in intents}
+        self.fuzzy_index = FuzzyIndex(intents)
+        self.semantic = semantic
+        self.router = RuleRouter(intents)
+        self.dialogue = DialogueRegistry(intents)
+
+    def patched(self, changed, catalogue):
+        """The same model with the ``changed`` intents (tag -> intent, or
+        ``None`` if deleted) swapped in. Only their router, fuzzy and
+        handler entries are rebuilt; the classifier learns them at the next
+        retrain, until then the router and fuzzy fallback can answer."""
+        intents = []
+        for intent in self.intents:
+            intent = changed.get(intent["tag"], intent)
+            if intent is not None:
+                intents.append(intent)
+        intents += [intent for tag, intent in changed.items() if intent is not None and tag not in self.intent_map]
+        state = ModelState.__new__(ModelState)
+        state.version, state.catalogue, state.model = self.version, catalogue, self.model
+        state.intents = intents
+        state.intent_map = {it["tag"]: it for it in intents}
+        state.fuzzy_index = self.fuzzy_index.patched(changed)
+        state.semantic = self.semantic.patched(changed) if self.semantic is not None else None
+        state.router = self.router.patched(changed)
+        state.dialogue = self.dialogue.patched(changed)
+        return state
+
 
 class AssistantCore:
-    def __init__(self):
-        # Load intents
-        with open(INTENTS_PATH, "r", encoding="utf-8") as f:
-            self.intents = json.load(f)["intents"]
-
-        # Load model
-        with open(MODEL_PATH, "rb") as f:
-            self.model = pickle.load(f)
-
-        self.intent_map = {it["tag"]: it for it in self.intents}
-        self.accounts = {}  # will be populated from app.py
-
-    def load_model(self, path=MODEL_PATH):
-        with open(path, "rb") as f:
-            self.model = pickle.load(f)
-        with open(INTENTS_PATH, "r", encoding="utf-8") as f:
-            self.intents = json.load(f)["intents"]
-        self.intent_map = {it["tag"]: it for it in self.intents}
-
-    def predict_intent(self, text):
-        tag = self.model.predict([text])[0]
-        prob = 0.0
-        if hasattr(self.model, "predict_proba"):
-            try:
-                prob = max(self.model.predict_proba([text])[0])
-            except:
-                prob = 0.0
-        return tag, float(prob)
-
-    def get_intent_responses(self, tag):
-        return self.intent_map.get(tag, {}).get("responses", [])
+    def __init__(self, model_path=MODEL_PATH, cache_size=None, ledger=None, settings=None, intent_store=None,
+                 intents_path=None):
+        # Thresholds, cutoffs and cache sizes; app.py pushes new snapshots through configure()
+        self.settings = settings if settings is not None else Settings.load()
+        self.prediction_cache = PredictionCache(
+            self.settings.prediction_cache_size if cache_size is None else cache_size)
+        self._load_lock = threading.Lock()
+        # The intent catalogue: the IntentStore (app.py, batch_classify.py), or a
+        # JSON file for tools that want a fixed catalogue (e.g. INTENTS_PATH)
+        if intent_store is None and intents_path is None:
+            raise ValueError("AssistantCore needs an intent_store or an intents_path")
+        self.intent_store = intent_store
+        self.intents_path = intents_path
+        # Load model, intents and the fuzzy index
+        self.load_model(model_path)
+        # Accounts and transactions; app.py passes the shared SQLite ledger
+        self.ledger = ledger if ledger is not None else Ledger(":memory:")
+        self.spending = SpendingAnalytics(self.ledger, self.settings.spending_cache_size)
+        self.router_metrics = RouterMetrics()
+
+    def configure(self, settings):
+        """Switch to a new ``Settings`` snapshot; caches are resized only
+        when their size changed."""
+        previous, self.settings = self.settings, settings
+        if settings.prediction_cache_size != previous.prediction_cache_size:
+            self.prediction_cache.resize(settings.prediction_cache_size)
+        if settings.spending_cache_size != previous.spending_cache_size:
+            self.spending.resize(settings.spending_cache_size)
+
+    def load_model(self, path=MODEL_PATH, version=None):
+        # Readers never lock: they take one reference to self.state. The lock
+        # only keeps concurrent reloads (retrain, watcher) from interleaving.
+        with self._load_lock:
+            model = read_model(path)
+            if self.intent_store is not None:
+                # Version first: an edit landing in between is simply applied again
+                catalogue = self.intent_store.version()
+                intents = self.intent_store.intents()
+            else:
+                catalogue = 0
+                with open(self.intents_path, "r", encoding="utf-8") as f:
+                    intents = json.load(f)["intents"]
+            # Build everything first, then swap it in with one assignment
+            self.state = ModelState(model, intents, version or os.path.basename(path), catalogue,
+                                    read_semantic(path, intents))
+            self.prediction_cache.invalidate()
+
+    def apply_intent_changes(self, changes):
+        """IntentStore listener: patch the current state with the edited
+        intents. Predictions depend only on the model, so the cache stays."""
+        with self._load_lock:
+            state = self.state
+            changes = [c for c in changes if c.version > state.catalogue]
+            if not changes:
+                return
+            changed = {c.tag: self.intent_store.get(c.tag) for c in changes}
+            self.state = state.patched(changed, changes[-1].version)
+
+    @property
+    def model(self):
+        return self.state.model
+
+    @property
+    def intents(self):
+        return self.state.intents
+
+    @property
+    def intent_map(self):
+        return self.state.intent_map
+
+    @property
+    def fuzzy_index(self):
+        return self.state.fuzzy_index
+
+    def predict_intent(self, text, top_k=3, state=None):
+        return self.predict_intents([text], top_k=top_k, state=state)[0]
+
+    def predict_intents(self, texts, top_k=3, state=None):
+        """Score many messages with a single vectorize + predict_proba pass.
+
+        Returns one ``(tag, confidence, top)`` tuple per text, where ``top``
+        is the ``top_k`` best ``(tag, probability)`` pairs. Label and
+        confidence come from the same probability row. Results are cached
+        per model version and normalized text; only misses are scored.
+        """
+        state = state or self.state
+        keys = [(state.version, top_k, normalize(t)) for t in texts]
+        results = [self.prediction_cache.get(key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            scored = self._score(state.model, [keys[i][2] for i in missing], top_k)
+            for i, result in zip(missing, scored):
+                results[i] = result
+                self.prediction_cache.put(keys[i], result)
+        return results
+
+    def _score(self, model, texts, top_k):
+        if not texts:
+            return []
+        if not hasattr(model, "predict_proba"):
+            return [(tag, 0.0, [(tag, 0.0)]) for tag in model.predict(texts)]
+        probs = model.predict_proba(texts)
+        classes = model.classes_
+        k = min(top_k, probs.shape[1])
+        order = np.argsort(-probs, axis=1)[:, :k]
+        results = []
+        for row, idx in zip(probs, order):
+            top = [(str(classes[i]), float(row[i])) for i in idx]
+            results.append((top[0][0], top[0][1], top))
+        return results
+
+    def get_intent_responses(self, tag, state=None):
+        return (state or self.state).intent_map.get(tag, {}).get("responses", [])
 
     def extract_account_number(self, text):
-        match = re.search(r"\b(\d{6,12})\b", text)
+        match = ACCOUNT_RE.search(text)
         return match.group(1) if match else None
 
-    def fallback_by_fuzzy(self, text):
-        best, best_score = None, 0
-        for intent in self.intents:
-            for pattern in intent.get("patterns", []):
-                if "{" in pattern:
-                    continue
-                score = fuzz.partial_ratio(text, pattern.lower())
-                if score > best_score:
-                    best_score = score
-                    best = intent["tag"]
-        return best if best_score > 60 else None
+    def fallback_by_fuzzy(self, text, state=None, cutoff=None):
+        if cutoff is None:
+            cutoff = self.settings.fuzzy_cutoff
+        tag, _ = (state or self.state).fuzzy_index.best_match(text, cutoff)
+        return tag
+
+    def fallback_by_semantic(self, text, state=None, threshold=None):
+        """Tag of the nearest pattern by meaning, for what fuzzy matching missed."""
+        index = (state or self.state).semantic
+        if index is None:
+            return None
+        if threshold is None:
+            threshold = self.settings.semantic_threshold
+        tag, _ = index.best_match(text, threshold)
+        return tag
 
     def handle_input(self, text, session):
+        state, settings = self.state, self.settings
+        clock = time.perf_counter
+        start = clock()
         text_clean = text.lower().strip()
-        session.setdefault("slots", {})
-
-        acct_in_text = self.extract_account_number(text)
-
-        def with_tick(msg, tag):
-            return f"{msg}\n✅ {tag}" if tag != "weather" else msg
+        turn = Turn(text, text_clean, session, self.extract_account_number(text), self)
+        extracted = clock()
+        _STAGE_EXTRACT.observe(extracted - start)
 
         # Awaiting account input
-        if session.get("awaiting_account_input") and acct_in_text:
-            acct = acct_in_text
-            acct_info = self.accounts.get(acct)
-            if acct_info:
-                session["account_no"] = acct
-                session.pop("awaiting_account_input", None)
-                original_tag = session.pop("awaiting_intent", "check_balance")
-                if original_tag == "check_balance":
-                    return f"Your balance is ₹{acct_info['balance']:.2f}", original_tag, session
-                elif original_tag == "recent_transactions":
-                    txs = acct_info.get("transactions", [])
-                    lines = [f"{t['date']}: {t['type']} {'+' if t['amount']>0 else '-'}₹{abs(t['amount']):.2f}" for t in txs]
-                    return with_tick("\n".join(lines), original_tag), original_tag, session
-            else:
-                return with_tick("Please provide a valid account number.", "check_balance"), "check_balance", session
-
-        tag, conf = self.predict_intent(text_clean)
-        if conf < 0.45:
-            fuzzy = self.fallback_by_fuzzy(text_clean)
-            tag = fuzzy if fuzzy else "fallback"
-
-        # --- Handle intents ---
-        if tag=="check_balance":
-            acct = str(session.get("account_no") or acct_in_text) if (session.get("account_no") or acct_in_text) else None
-            acct_info = self.accounts.get(acct) if acct else None
-            if acct_info:
-                session["account_no"] = acct
-                return f"Your balance is ₹{acct_info['balance']:.2f}", tag, session
-            else:
-                session["awaiting_account_input"] = True
-                session["awaiting_intent"] = "check_balance"
-                return with_tick("Please provide your account number.", tag), tag, session
-
-        elif tag=="recent_transactions":
-            acct = str(session.get("account_no") or acct_in_text) if (session.get("account_no") or acct_in_text) else None
-            acct_info = self.accounts.get(acct) if acct else None
-            if acct_info:
-                txs = acct_info.get("transactions", [])
-                if not txs:
-                    return "No recent transactions.", tag, session
-                lines = [f"{t['date']}: {t['type']} {'+' if t['amount']>0 else '-'}₹{abs(t['amount']):.2f}" for t in txs]
-                return with_tick("\n".join(lines), tag), tag, session
-            else:
-                session["awaiting_account_input"] = True
-                session["awaiting_intent"] = "recent_transactions"
-                return with_tick("Please provide a valid account number.", tag), tag, session
-
-        elif tag=="card_services":
-            if "credit" in text_clean: return "Your Credit Card request has been initiated.", tag, session
-            if "debit" in text_clean: return "Your Debit Card request has been initiated.", tag, session
-            return with_tick("Do you want a Credit Card or a Debit Card?", tag), tag, session
-
-        elif tag=="weather":
-            resp = random.choice(self.get_intent_responses("weather") or ["I can’t fetch live weather here — try a weather app."])
-            return resp, tag, session
-
-        elif tag=="loan":
-            if "change loan" in text_clean or "new loan type" in text_clean:
-                session.pop("loan_type", None)
-                session["awaiting_loan_type"] = True
-                return with_tick("Sure! Which type of loan are you interested in? Personal or Home?", tag), tag, session
-            if session.get("awaiting_loan_type"):
-                loan_type = text_clean.strip().lower()
-                session["loan_type"] = loan_type.title()
-                session.pop("awaiting_loan_type", None)
-                return f"You selected {session['loan_type']}. I can guide you with the application process.", tag, session
-            if "loan_type" in session:
-                return f"You have already selected {session['loan_type']}. I can guide you with the application process.", tag, session
-            session["awaiting_loan_type"] = True
-            return with_tick("Which type of loan are you interested in? Personal or Home?", tag), tag, session
-
-        elif tag=="chitchat":
-            resp = random.choice(self.get_intent_responses("chitchat") or ["Hi there!"])
-            return resp, tag, session
-
-        elif tag=="greeting":
-            resp = random.choice(self.get_intent_responses("greeting") or ["Hello!"])
-            return with_tick(resp, tag), tag, session
-
-        elif tag=="thanks":
-            resp = random.choice(self.get_intent_responses("thanks") or ["You're welcome!"])
-            return resp, tag, session
-
-        elif tag=="goodbye":
-            resp = random.choice(self.get_intent_responses("goodbye") or ["Goodbye!"])
-            session["completed"] = True
-            return resp, tag, session
+        if session.awaiting_account_input and turn.account:
+            result = state.dialogue.resume_account(turn)
+            if result is not None:
+                _STAGE_DISPATCH.observe(clock() - extracted)
+                ROUTES.inc("resume")
+                reply, tag = result
+                return truncate(reply, settings.max_response_length), tag, session
 
+        # Fast path: exact phrases, placeholder patterns and awaited slots
+        route_start = clock()
+        tag, route = state.router.route(text_clean, session)
+        if tag is None:
+            tag = state.dialogue.pending_slot(session)
+            route = "slot" if tag else None
+        routed = clock()
+        _STAGE_ROUTE.observe(routed - route_start)
+        if tag is not None:
+            self.router_metrics.record_hit(route, routed - route_start)
         else:
-            resp = random.choice(self.get_intent_responses("fallback") or ["Sorry, I didn’t understand. Could you rephrase?"])
-            return resp, "fallback", session
+            tag, conf, _ = self.predict_intent(text_clean, state=state)
+            predicted = clock()
+            _STAGE_PREDICT.observe(predicted - routed)
+            route = "model"
+            if conf < settings.confidence_threshold:
+                tag, route = self.fallback_by_fuzzy(text_clean, state, settings.fuzzy_cutoff), "fuzzy"
+                matched = clock()
+                _STAGE_FUZZY.observe(matched - predicted)
+                if tag is None and state.semantic is not None:
+                    tag, route = self.fallback_by_semantic(text_clean, state, settings.semantic_threshold), "semantic"
+                    _STAGE_SEMANTIC.observe(clock() - matched)
+                if tag is None:
+                    tag, route = "fallback", "fallback"
+            self.router_metrics.record_miss(routed - route_start, clock() - routed)
+        ROUTES.inc(route)
+
+        dispatched = clock()
+        reply, tag = state.dialogue.dispatch(tag, turn)
+        _STAGE_DISPATCH.observe(clock() - dispatched)
+        return truncate(reply, settings.max_response_length), tag, session
@@ -0,0 +1,229 @@
+# batch_classify.py
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from assistant_core import truncate
+from dialogue import Turn
+from fuzzy_index import FuzzyIndex
+from session_store import ChatState
+
+DEFAULT_CHUNK_SIZE = 512
+POOL_MIN_FUZZY = 256  # fewer fuzzy fallbacks per chunk than this are matched in-process
+# Never fork: a web worker has threads (query log writer, watchers, exporter) that may hold locks
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_worker_index = None
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(intents, cutoff):
+    global _worker_index
+    _worker_index = FuzzyIndex(intents, cutoff)
+
+
+def _fuzzy_part(texts):
+    return [_worker_index.best_match(t)[0] for t in texts]
+
+
+def shared_pool(workers, state, cutoff):
+    """The process's fuzzy matching pool, started once and kept across
+    batches. Workers hold their own FuzzyIndex, so it is replaced only when
+    the model, the catalogue or the cutoff changes."""
+    global _pool, _pool_key
+    key = (workers, state.version, state.catalogue, cutoff)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None:
+                # A batch still mapping on the old pool finishes its parts first
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context(POOL_START_METHOD),
+                initializer=_init_worker, initargs=(state.intents, cutoff)
+            )
+            _pool_key = key
+        return _pool
+
+
+# ---------------- INPUT ----------------
+def parse_message(item):
+    """``(message, logged_tag)`` from a plain string, a query-log entry
+    (``{"query", "intent_tag"}``) or ``{"message", "tag"}``."""
+    if isinstance(item, str):
+        return item, None
+    if isinstance(item, dict):
+        text = item.get("message", item.get("query"))
+        if isinstance(text, str):
+            return text, item.get("tag", item.get("intent_tag"))
+    raise ValueError(f"Not a message: {item!r}")
+
+
+def iter_jsonl(lines):
+    """Messages from JSONL lines; a line that is not a JSON string or
+    object is taken as the message text itself."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+        yield parse_message(item if isinstance(item, (str, dict)) else line)
+
+
+def iter_file(path):
+    """A JSON array (e.g. the legacy user_queries_log.json) or JSONL/text."""
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            for item in json.load(f):
+                yield parse_message(item)
+        else:
+            yield from iter_jsonl(f)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------------- CLASSIFIER ----------------
+class BatchClassifier:
+    """Classify many independent messages the way ``handle_input`` would
+    at the start of a conversation.
+
+    Each chunk goes through the rule router, then one vectorized
+    ``predict_intents`` pass for the rest, then the fuzzy fallback for the
+    low-confidence ones (spread over the ``shared_pool`` when there are many
+    and ``workers`` > 1) and the semantic fallback for what it missed, and
+    finally the dialogue handler, whose tag is what the query log records.
+    Dispatch stays sequential: it is microseconds per message and reads the
+    ledger through the assistant, which worker processes do not have.
+    ``run`` yields one result per message, in input order.
+    """
+
+    def __init__(self, assistant, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, replies=False):
+        self.assistant = assistant
+        self.chunk_size = chunk_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.replies = replies
+
+    def run(self, messages):
+        """``messages`` yields ``(text, logged_tag)`` pairs."""
+        for chunk in chunked(messages, self.chunk_size):
+            yield from self.classify_chunk(chunk)
+
+    def classify_chunk(self, chunk):
+        assistant, state, settings = self.assistant, self.assistant.state, self.assistant.settings
+        sessions = [ChatState() for _ in chunk]
+        cleaned = [text.lower().strip() for text, _ in chunk]
+        results, pending = [], []
+        for i, (text_clean, session) in enumerate(zip(cleaned, sessions)):
+            tag, route = state.router.route(text_clean, session)
+            results.append({"message": chunk[i][0], "tag": tag, "confidence": 1.0, "route": route})
+            if tag is None:
+                pending.append(i)
+
+        fuzzy = []
+        for i, (tag, conf, _) in zip(pending, assistant.predict_intents([cleaned[i] for i in pending], state=state)):
+            results[i].update(tag=tag, confidence=round(conf, 4), route="model")
+            if conf < settings.confidence_threshold:
+                fuzzy.append(i)
+        unplaced = []
+        for i, tag in zip(fuzzy, self._fuzzy(state, settings.fuzzy_cutoff, [cleaned[i] for i in fuzzy])):
+            results[i].update(tag=tag or "fallback", route="fuzzy" if tag else "fallback")
+            if tag is None:
+                unplaced.append(i)
+        if unplaced and state.semantic is not None:
+            # One embedding pass and one matrix product for the whole chunk
+            matches = state.semantic.best_matches([cleaned[i] for i in unplaced], settings.semantic_threshold)
+            for i, (tag, _) in zip(unplaced, matches):
+                if tag is not None:
+                    results[i].update(tag=tag, route="semantic")
+
+        for (text, logged), text_clean, session, result in zip(chunk, cleaned, sessions, results):
+            turn = Turn(text, text_clean, session, assistant.extract_account_number(text), assistant)
+            reply, tag = state.dialogue.dispatch(result["tag"], turn)
+            result["tag"] = tag
+            if self.replies:
+                result["reply"] = truncate(reply, settings.max_response_length)
+            result["logged_tag"] = logged
+            result["changed"] = logged is not None and logged != tag
+        return results
+
+    def _fuzzy(self, state, cutoff, texts):
+        if len(texts) < POOL_MIN_FUZZY or self.workers <= 1:
+            return [state.fuzzy_index.best_match(t, cutoff)[0] for t in texts]
+        pool = shared_pool(self.workers, state, cutoff)
+        size = -(-len(texts) // self.workers)
+        matched = []
+        for part in pool.map(_fuzzy_part, [texts[i:i + size] for i in range(0, len(texts), size)]):
+            matched.extend(part)
+        return matched
+
+
+# ---------------- CLI ----------------
+def main():
+    from assistant_core import AssistantCore, MODEL_PATH
+    from config import tunable
+    from intent_store import DEFAULT_DB_PATH, open_store
+
+    parser = argparse.ArgumentParser(description="Classify messages in bulk, e.g. replay the query log against a model")
+    parser.add_argument("inputs", nargs="*", help="JSON array or JSONL/text files (default: stdin)")
+    parser.add_argument("--query-log", help="replay a query log directory (see query_log.py)")
+    parser.add_argument("--model", default=MODEL_PATH, help="model to evaluate (default: %(default)s)")
+    parser.add_argument("--intents", default=tunable("intents_db", DEFAULT_DB_PATH),
+                        help="intent store, or a .json catalogue (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="fuzzy fallback processes (default: CPU count)")
+    parser.add_argument("--replies", action="store_true", help="include the bot's reply")
+    parser.add_argument("--changed-only", action="store_true", help="only print messages whose tag changed")
+    args = parser.parse_args()
+
+    def messages():
+        if args.query_log:
+            from query_log import QueryLog
+            for entry in QueryLog(args.query_log, legacy_path=None, start_writer=False).iter_entries():
+                yield parse_message(entry)
+        for path in args.inputs:
+            yield from iter_file(path)
+        if not args.query_log and not args.inputs:
+            yield from iter_jsonl(sys.stdin)
+
+    if args.intents.endswith(".json"):
+        assistant = AssistantCore(args.model, intents_path=args.intents)
+    else:
+        # Same catalogue as the app: admin edits live in the store
+        assistant = AssistantCore(args.model, intent_store=open_store(args.intents))
+    classifier = BatchClassifier(assistant, args.chunk_size, args.workers, args.replies)
+    total = changed = 0
+    start = time.perf_counter()
+    for result in classifier.run(messages()):
+        total += 1
+        changed += result["changed"]
+        if result["changed"] or not args.changed_only:
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - start
+    print(f"{total} messages, {changed} changed tag, {elapsed:.2f} s "
+          f"({total / elapsed if elapsed else 0:.0f} msg/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
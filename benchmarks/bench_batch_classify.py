@@ -0,0 +1,56 @@
+"""Replaying a query log: one handle_input call per message vs BatchClassifier.
+
+The log is the repo's user_queries_log.json repeated with small variations
+(so the prediction cache does not answer everything) up to --messages.
+
+Run from anywhere:  python benchmarks/bench_batch_classify.py [--messages 20000] [--workers 1 2 4]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from assistant_core import INTENTS_PATH, AssistantCore  # noqa: E402
+from batch_classify import BatchClassifier, parse_message  # noqa: E402
+from session_store import ChatState  # noqa: E402
+
+
+def synthetic_log(n):
+    with open("user_queries_log.json", "r", encoding="utf-8") as f:
+        base = [parse_message(item) for item in json.load(f)]
+    messages = []
+    for i in range(n):
+        text, tag = base[i % len(base)]
+        messages.append((text if i < len(base) else f"{text} {i // len(base)}", tag))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    messages = synthetic_log(args.messages)
+
+    assistant = AssistantCore(cache_size=0, intents_path=INTENTS_PATH)
+    start = time.perf_counter()
+    sequential = [assistant.handle_input(text, ChatState())[1] for text, _ in messages]
+    seq_s = time.perf_counter() - start
+    print(f"{'handle_input loop':24} {seq_s:7.2f} s {len(messages) / seq_s:9.0f} msg/s")
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        tags = [r["tag"] for r in BatchClassifier(assistant, workers=workers).run(iter(messages))]
+        batch_s = time.perf_counter() - start
+        same = sum(a == b for a, b in zip(tags, sequential))
+        print(f"{f'batch, {workers} worker(s)':24} {batch_s:7.2f} s {len(messages) / batch_s:9.0f} msg/s "
+              f"  same tag as loop: {same}/{len(messages)}")
+
+
+if __name__ == "__main__":
+    main()
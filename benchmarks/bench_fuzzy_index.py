@@ -0,0 +1,97 @@
+"""Compare the linear fuzzy fallback with FuzzyIndex on a synthetic catalogue.
+
+Run from anywhere:  python benchmarks/bench_fuzzy_index.py [--patterns 12000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from fuzzywuzzy import fuzz
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from fuzzy_index import FuzzyIndex  # noqa: E402
+
+WORDS = ("account balance card credit debit loan home personal transfer money branch open close "
+         "statement limit payment bill recent transactions show check my the a please need want "
+         "locate nearby office hours holiday weather today interest rate apply block lost pin").split()
+
+
+def linear_fallback(intents, text):
+    # Implementation before the index: score every pattern on every call
+    best, best_score = None, 0
+    for intent in intents:
+        for pattern in intent.get("patterns", []):
+            if "{" in pattern:
+                continue
+            score = fuzz.partial_ratio(text, pattern.lower())
+            if score > best_score:
+                best_score = score
+                best = intent["tag"]
+    return best if best_score > 60 else None
+
+
+def synthetic_intents(n_patterns, per_intent, rng):
+    intents = []
+    for i in range(0, n_patterns, per_intent):
+        patterns = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))) for _ in range(per_intent)]
+        intents.append({"tag": f"intent_{i // per_intent}", "patterns": patterns, "responses": ["ok"]})
+    return intents
+
+
+def queries_from(intents, n, rng):
+    queries = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 5))]
+        queries.append(" ".join(words) + rng.choice(["", "s", " pls", "?"]))
+    return queries
+
+
+def check_and_time(intents, queries, label):
+    index_start = time.perf_counter()
+    index = FuzzyIndex(intents)
+    build = time.perf_counter() - index_start
+
+    start = time.perf_counter()
+    linear = [linear_fallback(intents, q) for q in queries]
+    linear_t = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    indexed = [index.best_match(q)[0] for q in queries]
+    index_t = (time.perf_counter() - start) / len(queries)
+
+    mismatches = [(q, a, b) for q, a, b in zip(queries, linear, indexed) if a != b]
+    print(f"{label}: {len(index)} patterns, index build {build * 1e3:.1f} ms")
+    print(f"  linear {linear_t * 1e3:8.3f} ms/query   indexed {index_t * 1e3:8.3f} ms/query   ({linear_t / index_t:.1f}x)")
+    print(f"  same tag on {len(queries) - len(mismatches)}/{len(queries)} queries")
+    for m in mismatches[:5]:
+        print("  MISMATCH", m)
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patterns", type=int, default=12000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with open("intents.json", "r", encoding="utf-8") as f:
+        intents = json.load(f)["intents"]
+    with open("user_queries_log.json", "r", encoding="utf-8") as f:
+        logged = [e["query"].lower().strip() for e in json.load(f)]
+    real_queries = [p.lower() for it in intents for p in it["patterns"]] + logged + queries_from(intents, 200, rng)
+    ok = check_and_time(intents, real_queries, "intents.json")
+
+    synthetic = synthetic_intents(args.patterns, 20, rng)
+    ok = check_and_time(synthetic, queries_from(synthetic, args.queries, rng), "synthetic") and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Intent model benchmark and regression check.
+
+Scores the serving pipeline and alternatives on held-out data:
+
+* ``patterns``: k-fold over the catalogue's unique patterns (each fold's
+  model never sees the patterns it is scored on; intents with a single
+  pattern are always trained on),
+* ``query_log``: a model fitted on the whole catalogue scored against the
+  tags logged for past queries, skipping queries that are catalogue
+  patterns and tags that no longer exist.
+
+For each candidate it reports the classifier's accuracy and macro-F1,
+the served accuracy (below the live confidence threshold the fuzzy
+matcher answers instead, as in handle_input), the share of messages
+below the threshold and the fallback rate (those the fuzzy matcher
+cannot place either), per-message
+p50/p99 latency, batch throughput, size on disk and load time. A model
+that can be exported to the compact format (compact_model.py) is timed
+the way it is served, from the ``.npz``.
+
+Results go to a JSON file. With ``--baseline`` the run fails (exit 1) if
+accuracy, macro-F1 or served accuracy dropped, or p99 latency grew, beyond
+the thresholds.
+
+Run from anywhere:  python benchmarks/bench_intent_models.py [--models tfidf_logreg char_logreg]
+                        [--baseline benchmarks/results/intent_models-....json]
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.metrics import accuracy_score, f1_score  # noqa: E402
+from sklearn.pipeline import Pipeline  # noqa: E402
+from sklearn.svm import LinearSVC  # noqa: E402
+
+from batch_classify import iter_file  # noqa: E402
+from compact_model import export_pipeline, load_compact  # noqa: E402
+from config import Settings  # noqa: E402
+from fuzzy_index import FuzzyIndex  # noqa: E402
+from incremental_model import IncrementalIntentModel  # noqa: E402
+from rule_router import normalize  # noqa: E402
+from train_intent_model import build_pipeline, load_intents  # noqa: E402
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+SKIP_LOGGED_TAGS = {"fallback", "error", "N/A"}
+
+
+# ---------------- CANDIDATES ----------------
+def char_logreg():
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True)),
+        ("clf", LogisticRegression(max_iter=1000, class_weight="balanced"))
+    ])
+
+
+def word_svc():
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(ngram_range=(1, 2), max_features=4000)),
+        ("clf", LinearSVC(class_weight="balanced"))
+    ])
+
+
+def hashing_logreg():
+    return Pipeline([
+        ("hash", HashingVectorizer(ngram_range=(1, 2), n_features=2 ** 18, alternate_sign=False, norm=None)),
+        ("tfidf", TfidfTransformer()),
+        ("clf", LogisticRegression(max_iter=1000, class_weight="balanced"))
+    ])
+
+
+# name -> (factory, copies of the corpus to fit on; train_save fits on three)
+CANDIDATES = {
+    "tfidf_logreg": (build_pipeline, 3),  # the serving pipeline (train_save)
+    "char_logreg": (char_logreg, 3),
+    "word_svc": (word_svc, 1),
+    "hashing_logreg": (hashing_logreg, 3),
+    "hashing_nb": (IncrementalIntentModel, 1),  # the incremental retrain mode
+}
+
+
+def fit(name, texts, labels):
+    factory, copies = CANDIDATES[name]
+    model = factory()
+    if isinstance(model, IncrementalIntentModel):
+        return model.partial_fit(texts, labels)
+    return model.fit(texts * copies, labels * copies)
+
+
+def confidences(model, texts):
+    """``(labels, confidence)``; a model without probabilities (LinearSVC)
+    gets a softmax of its decision function, which is only roughly
+    comparable with a calibrated confidence."""
+    if hasattr(model, "predict_proba"):
+        probs = model.predict_proba(texts)
+    else:
+        scores = model.decision_function(texts)
+        if scores.ndim == 1:
+            scores = np.column_stack([-scores, scores])
+        scores = scores - scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+    best = probs.argmax(axis=1)
+    return np.asarray(model.classes_)[best], probs[np.arange(len(texts)), best]
+
+
+# ---------------- EVALUATION SETS ----------------
+def pattern_folds(texts, labels, k, seed):
+    """Unique ``(text, tag)`` pairs dealt into ``k`` folds per tag."""
+    rng = random.Random(seed)
+    by_tag = {}
+    for text, tag in dict.fromkeys(zip(texts, labels)):
+        by_tag.setdefault(tag, []).append(text)
+    folds = [[] for _ in range(k)]
+    always_train = []
+    for tag, items in by_tag.items():
+        if len(items) < 2:
+            always_train += [(t, tag) for t in items]
+            continue
+        rng.shuffle(items)
+        for i, text in enumerate(items):
+            folds[i % k].append((text, tag))
+    return folds, always_train
+
+
+def query_log_set(path, texts, labels):
+    seen, known = {normalize(t) for t in texts}, set(labels)
+    pairs = []
+    for query, tag in iter_file(path):
+        if tag in SKIP_LOGGED_TAGS or tag not in known:
+            continue
+        query = query.lower().strip()
+        if query and normalize(query) not in seen:
+            pairs.append((query, tag))
+    return pairs
+
+
+def score(pairs, predicted, confidence, index_for, settings):
+    """Quality of ``predicted`` for ``(text, tag)`` pairs; ``index_for(pair)``
+    is the FuzzyIndex a low-confidence message would fall back to."""
+    truth = [tag for _, tag in pairs]
+    low = np.asarray(confidence) < settings.confidence_threshold
+    # What the user gets: below the threshold the fuzzy matcher decides, as in handle_input
+    served = [(index_for(pair).best_match(pair[0], settings.fuzzy_cutoff)[0] or "fallback") if is_low else tag
+              for pair, tag, is_low in zip(pairs, predicted, low)]
+    return {
+        "n": len(pairs),
+        "accuracy": accuracy_score(truth, predicted),
+        "macro_f1": f1_score(truth, predicted, average="macro", labels=sorted(set(truth)), zero_division=0),
+        "served_accuracy": accuracy_score(truth, served),
+        "low_confidence_rate": float(low.mean()),
+        "fallback_rate": served.count("fallback") / len(pairs),
+    }
+
+
+def fuzzy_index(pairs):
+    return FuzzyIndex([{"tag": tag, "patterns": [text]} for text, tag in pairs])
+
+
+# ---------------- SPEED & SIZE ----------------
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+
+def speed(model, texts, samples, batch_size):
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.decision_function
+    predict(texts[:1])  # warm up lazy state (e.g. IncrementalIntentModel._compile)
+    lat = []
+    for i in range(samples):
+        text = [texts[i % len(texts)]]
+        start = time.perf_counter()
+        predict(text)
+        lat.append(time.perf_counter() - start)
+    batch = (texts * (batch_size // len(texts) + 1))[:batch_size]
+    batch_s = timed(lambda: predict(batch), 3)
+    return {
+        "p50_ms": float(np.percentile(lat, 50) * 1e3),
+        "p99_ms": float(np.percentile(lat, 99) * 1e3),
+        "batch_msgs_per_s": batch_size / batch_s,
+    }
+
+
+def footprint(model, tmp):
+    blob = pickle.dumps(model)
+    out = {"pickle_bytes": len(blob), "pickle_load_ms": timed(lambda: pickle.loads(blob), 5) * 1e3}
+    npz = os.path.join(tmp, "model.npz")
+    if export_pipeline(model, npz):
+        out["compact_bytes"] = os.path.getsize(npz)
+        out["compact_load_ms"] = timed(lambda: load_compact(npz), 5) * 1e3
+        return out, load_compact(npz)
+    return out, model
+
+
+# ---------------- RUN ----------------
+def evaluate(name, texts, labels, args, settings, tmp):
+    folds, always_train = pattern_folds(texts, labels, args.folds, args.seed)
+    truth, predicted, confidence = [], [], []
+    start = time.perf_counter()
+    for i, held_out in enumerate(folds):
+        train = always_train + [pair for j, fold in enumerate(folds) if j != i for pair in fold]
+        model = fit(name, [t for t, _ in train], [tag for _, tag in train])
+        tags, conf = confidences(model, [t for t, _ in held_out])
+        truth += held_out
+        predicted += list(tags)
+        confidence += list(conf)
+    cv_s = time.perf_counter() - start
+    # A held-out pattern is fuzzy-matched against its fold's training patterns only
+    fold_of = {pair: i for i, fold in enumerate(folds) for pair in fold}
+    indexes = [fuzzy_index(always_train + [p for j, fold in enumerate(folds) if j != i for p in fold])
+               for i in range(len(folds))]
+    result = {"patterns": score(truth, predicted, confidence, lambda pair: indexes[fold_of[pair]], settings)}
+
+    start = time.perf_counter()
+    model = fit(name, texts, labels)
+    result["fit_s"] = time.perf_counter() - start
+    result["cv_s"] = cv_s
+    if args.query_log and os.path.exists(args.query_log):
+        pairs = query_log_set(args.query_log, texts, labels)
+        if pairs:
+            tags, conf = confidences(model, [t for t, _ in pairs])
+            full_index = fuzzy_index(zip(texts, labels))
+            result["query_log"] = score(pairs, list(tags), conf, lambda pair: full_index, settings)
+    sizes, served = footprint(model, tmp)
+    result.update(sizes)
+    result["served_as"] = "compact" if served is not model else "pickle"
+    result.update(speed(served, sorted(set(texts)), args.samples, args.batch_size))
+    return result
+
+
+def regressions(results, baseline, args):
+    failed = []
+    for name, now in results["models"].items():
+        before = baseline.get("models", {}).get(name)
+        if before is None:
+            continue
+        for metric in ("accuracy", "macro_f1", "served_accuracy"):
+            for dataset in ("patterns", "query_log"):
+                a, b = before.get(dataset, {}).get(metric), now.get(dataset, {}).get(metric)
+                if a is not None and b is not None and a - b > args.max_accuracy_drop:
+                    failed.append(f"{name}: {dataset} {metric} {a:.3f} -> {b:.3f}")
+        a, b = before.get("p99_ms"), now.get("p99_ms")
+        if a and b and b > a * (1 + args.max_latency_increase):
+            failed.append(f"{name}: p99 latency {a:.3f} ms -> {b:.3f} ms")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", choices=list(CANDIDATES), default=list(CANDIDATES))
+    parser.add_argument("--intents", default="intents.json", help="catalogue: intents.json or an intent store")
+    parser.add_argument("--query-log", default="user_queries_log.json", help="logged queries to score against ('' to skip)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--samples", type=int, default=2000, help="single-message predictions timed per model")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--out", help=f"results file (default: {RESULTS_DIR}/intent_models-<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.02, help="absolute, for accuracy and macro-F1")
+    parser.add_argument("--max-latency-increase", type=float, default=0.5, help="relative, for p99 latency")
+    args = parser.parse_args()
+
+    texts, labels = load_intents(args.intents)
+    settings = Settings.load()
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "catalogue": {"patterns": len(set(zip(texts, labels))), "intents": len(set(labels))},
+        "confidence_threshold": settings.confidence_threshold,
+        "fuzzy_cutoff": settings.fuzzy_cutoff,
+        "models": {},
+    }
+    print(f"{'model':15} {'acc':>6} {'F1':>6} {'served':>7} {'log acc':>8} {'low conf':>9} {'fallback':>9} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'batch/s':>9} {'size KB':>8} {'load ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.models:
+            r = results["models"][name] = evaluate(name, texts, labels, args, settings, tmp)
+            held, log = r["patterns"], r.get("query_log", {})
+            size = r.get("compact_bytes", r["pickle_bytes"]) / 1024
+            load = r.get("compact_load_ms", r["pickle_load_ms"])
+            print(f"{name:15} {held['accuracy']:6.3f} {held['macro_f1']:6.3f} {held['served_accuracy']:7.3f} "
+                  f"{log.get('served_accuracy', float('nan')):8.3f} "
+                  f"{held['low_confidence_rate']:9.1%} {held['fallback_rate']:9.1%} {r['p50_ms']:7.3f} {r['p99_ms']:7.3f} "
+                  f"{r['batch_msgs_per_s']:9.0f} {size:8.1f} {load:8.2f}  ({r['served_as']})")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"intent_models-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failed = regressions(results, json.load(f), args)
+        if failed:
+            print("REGRESSIONS:\n  " + "\n  ".join(failed))
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
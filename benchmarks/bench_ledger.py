@@ -0,0 +1,103 @@
+"""Account history reads: whole in-memory transaction lists vs the SQLite ledger.
+
+Builds a ledger with 1M synthetic transactions spread over a few accounts,
+then times what the chatbot and dashboard do per request before (format or
+json.dumps every transaction of the account) and after (read one page),
+plus the spending insights with and without the per-account cache.
+
+Run from anywhere:  python benchmarks/bench_ledger.py [--transactions 1000000] [--accounts 50]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dialogue import RECENT_TRANSACTIONS, TX_LINE  # noqa: E402
+from ledger import Ledger  # noqa: E402
+from spending_analytics import AccountInsights, SpendingAnalytics  # noqa: E402
+
+CATEGORIES = ["Grocery", "Salary", "Online Purchase", "Rent", "Utilities", "Dining", "Transfer", "ATM"]
+PAGE = 20
+
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, 5 * 365, n))
+    dates = (np.datetime64("2021-01-01") + days).astype(str)
+    kinds = rng.integers(0, len(CATEGORIES), n)
+    amounts = np.round(rng.gamma(2.0, 40.0, n), 2)
+    amounts = np.where(kinds == 1, amounts * 30, -amounts)
+    return [(d, CATEGORIES[k], float(a)) for d, k, a in zip(dates, kinds, amounts)]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    per_account = args.transactions // args.accounts
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.sqlite3")
+        ledger = Ledger(path)
+        start = time.perf_counter()
+        for i in range(args.accounts):
+            acct = str(100000000 + i)
+            ledger.open_account(acct, f"user{i}", f"User {i}", 1000.0)
+            ledger.add_transactions(acct, synthetic(per_account, seed=i))
+        load_s = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"loaded {per_account * args.accounts:,} transactions into {args.accounts} accounts "
+              f"in {load_s:.1f} s ({size_mb:.0f} MB)")
+
+        acct = str(100000000 + args.accounts // 2)
+        # What app.users held per account before: every transaction, newest first
+        history = [{"date": t["date"], "type": t["type"], "amount": t["amount"]}
+                   for t in ledger.last_transactions(acct, per_account)]
+        first_page = ledger.last_transactions(acct, PAGE)
+        month = history[len(history) // 2]["date"][:7]
+
+        def format_all():
+            return "\n".join(TX_LINE(t["date"], t["type"], "+" if t["amount"] > 0 else "-", abs(t["amount"])) for t in history)
+
+        rows = [
+            ("chatbot recent_transactions", lambda: format_all(),
+             lambda: ledger.last_transactions(acct, RECENT_TRANSACTIONS)),
+            ("dashboard transactions_json", lambda: json.dumps(history),
+             lambda: json.dumps(ledger.last_transactions(acct, PAGE))),
+            ("next page (cursor)", None,
+             lambda: ledger.last_transactions(acct, PAGE, before=first_page[-1]["id"])),
+            ("one month, date range", lambda: [t for t in history if t["date"].startswith(month)],
+             lambda: ledger.transactions_between(acct, month + "-01", month + "-31")),
+            ("balance at a date", None, lambda: ledger.balance_at(acct, month + "-15")),
+            ("category totals, one month", None,
+             lambda: ledger.category_totals(acct, month + "-01", month + "-31")),
+            ("category totals, all history", None, lambda: ledger.category_totals(acct)),
+            ("insights, computed", None, lambda: AccountInsights(ledger.history(acct)).report()),
+            ("insights, cached", None, lambda: spending.insights(acct).report()),
+        ]
+        spending = SpendingAnalytics(ledger)
+        print(f"\nper request, account with {len(history):,} transactions")
+        print(f"{'':32} {'before ms':>10} {'ledger ms':>10}")
+        for name, before, after in rows:
+            before_ms = f"{timed(before, max(1, args.repeat // 20)):10.3f}" if before else f"{'-':>10}"
+            print(f"{name:32} {before_ms} {timed(after, args.repeat):10.3f}")
+
+
+if __name__ == "__main__":
+    main()
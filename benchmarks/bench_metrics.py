@@ -0,0 +1,69 @@
+"""Cost of the /chatbot instrumentation: per-call metric updates, the
+per-request total, and rendering /metrics.
+
+Run from anywhere:  python benchmarks/bench_metrics.py [--calls 200000]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from metrics import Registry  # noqa: E402
+
+# What one classifier-path /chatbot request records (see handle_input and app.chat_turn)
+STAGES = ["session_load", "extract", "route", "predict", "dispatch", "log_query", "session_save"]
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    stages = registry.histogram("stage_seconds", "", ("stage",))
+    requests = registry.histogram("request_seconds", "")
+    intents = registry.counter("intents_total", "", ("intent",))
+    routes = registry.counter("routes_total", "", ("route",))
+    clock = time.perf_counter
+
+    bound = [stages.labels(stage) for stage in STAGES]
+    request_series = requests.labels()
+
+    clock_us = per_call(clock, args.calls)
+    observe_us = per_call(lambda: stages.observe(3.2e-5, "predict"), args.calls)
+    bound_us = per_call(lambda: bound[3].observe(3.2e-5), args.calls)
+    inc_us = per_call(lambda: intents.inc("check_balance"), args.calls)
+
+    def one_request():
+        start = last = clock()
+        for series in bound:
+            now = clock()
+            series.observe(now - last)
+            last = now
+        routes.inc("model")
+        intents.inc("check_balance")
+        request_series.observe(clock() - start)
+
+    request_us = per_call(one_request, args.calls // 10)
+    render_ms = per_call(registry.render, 200) / 1e3
+
+    print(f"perf_counter()         {clock_us:6.3f} us")
+    print(f"Histogram.observe      {observe_us:6.3f} us   (pre-bound series: {bound_us:.3f} us)")
+    print(f"Counter.inc            {inc_us:6.3f} us")
+    print(f"per request ({len(STAGES)} stages, 2 counters, total): {request_us:6.2f} us")
+    print(f"render /metrics        {render_ms:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare the old two-pass predict_intent with the single-pass/batch path.
+
+Run from anywhere:  python benchmarks/bench_predict_intent.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from assistant_core import INTENTS_PATH, AssistantCore  # noqa: E402
+from train_intent_model import load_intents  # noqa: E402
+
+
+def legacy_predict_intent(model, text):
+    # Implementation before the single-pass change: transform + score twice
+    tag = model.predict([text])[0]
+    prob = max(model.predict_proba([text])[0])
+    return tag, float(prob)
+
+
+def per_message(fn, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            fn(t)
+    return (time.perf_counter() - start) / (repeat * len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Measure the scoring path itself, not prediction-cache hits
+    assistant = AssistantCore(cache_size=0, intents_path=INTENTS_PATH)
+    texts, _ = load_intents("intents.json")
+
+    for t in texts:
+        legacy, new = legacy_predict_intent(assistant.model, t), assistant.predict_intent(t)
+        assert legacy[0] == new[0] and abs(legacy[1] - new[1]) < 1e-9, (t, legacy, new)
+
+    old_lat = per_message(lambda t: legacy_predict_intent(assistant.model, t), texts, args.repeat)
+    new_lat = per_message(assistant.predict_intent, texts, args.repeat)
+    print(f"per-message  legacy: {old_lat * 1e6:8.1f} us   single-pass: {new_lat * 1e6:8.1f} us   ({old_lat / new_lat:.2f}x)")
+
+    batch = (texts * (args.batch_size // len(texts) + 1))[:args.batch_size]
+    start = time.perf_counter()
+    for t in batch:
+        legacy_predict_intent(assistant.model, t)
+    old_tp = len(batch) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    assistant.predict_intents(batch)
+    new_tp = len(batch) / (time.perf_counter() - start)
+    print(f"throughput   legacy: {old_tp:8.0f} msg/s  predict_intents: {new_tp:8.0f} msg/s  ({new_tp / old_tp:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
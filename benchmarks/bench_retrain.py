@@ -0,0 +1,91 @@
+"""Retrain wall time vs corpus size, full refit vs incremental, plus held-out accuracy.
+
+Run from anywhere:  python benchmarks/bench_retrain.py [--sizes 500 2000 8000 32000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from incremental_model import IncrementalIntentModel  # noqa: E402
+from train_intent_model import build_pipeline  # noqa: E402
+
+FILLER = "please i want to my the a can you need show me how do for is what".split()
+
+
+def make_vocab(rng, n):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 8))) for _ in range(n)]
+
+
+def make_corpus(rng, n_patterns, n_intents, vocab):
+    keywords = {f"intent_{i}": rng.sample(vocab, 6) for i in range(n_intents)}
+    tags = list(keywords)
+
+    def sample(tag):
+        words = rng.sample(keywords[tag], 2) + [rng.choice(FILLER) for _ in range(rng.randint(1, 3))]
+        # some noise: a keyword borrowed from another intent
+        if rng.random() < 0.2:
+            words.append(rng.choice(keywords[rng.choice(tags)]))
+        rng.shuffle(words)
+        return " ".join(words)
+
+    labels = [tags[i % n_intents] for i in range(n_patterns)]
+    return [sample(t) for t in labels], labels, sample
+
+
+def full_refit(texts, labels):
+    # Same procedure as train_save: the corpus is tripled before fitting
+    model = build_pipeline()
+    model.fit(texts * 3, labels * 3)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000, 32000])
+    parser.add_argument("--intents", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    vocab = make_vocab(rng, 2000)
+
+    print(f"{'patterns':>9} {'full refit':>12} {'incr. add 1':>12} {'incr. new tag':>14} {'acc full':>9} {'acc incr':>9}")
+    for size in args.sizes:
+        texts, labels, sample = make_corpus(rng, size, args.intents, vocab)
+        held_tags = [f"intent_{i % args.intents}" for i in range(1000)]
+        held_texts = [sample(t) for t in held_tags]
+
+        start = time.perf_counter()
+        full = full_refit(texts, labels)
+        full_t = time.perf_counter() - start
+
+        incr = IncrementalIntentModel().partial_fit(texts, labels)
+        incr.predict_proba(["warm up"])
+
+        # An admin adds one pattern to an existing intent ...
+        start = time.perf_counter()
+        incr.partial_fit([sample(labels[0])], [labels[0]])
+        incr.predict_proba(["compile"])
+        add_t = time.perf_counter() - start
+
+        # ... or a brand-new intent with a few patterns
+        start = time.perf_counter()
+        incr.partial_fit(["find atm near me", "where is the atm", "atm nearby"], ["atm_locator"] * 3)
+        incr.predict_proba(["compile"])
+        new_t = time.perf_counter() - start
+
+        acc_full = float(np.mean(full.predict(held_texts) == np.array(held_tags)))
+        acc_incr = float(np.mean(incr.predict(held_texts) == np.array(held_tags)))
+        print(f"{size:>9} {full_t * 1e3:>10.1f}ms {add_t * 1e3:>10.1f}ms {new_t * 1e3:>12.1f}ms {acc_full:>9.3f} {acc_incr:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Semantic fallback: how many fuzzy misses it answers, how often it is
+right, and what a lookup costs.
+
+* ``patterns``: k-fold over the catalogue's patterns (as in
+  bench_intent_models.py). Each held-out pattern that the serving model is
+  unsure of goes to the fuzzy matcher and then to a SemanticIndex built on
+  its fold's training patterns. Served accuracy and fallback rate are
+  reported without the semantic stage and for each threshold.
+* ``query_log``: the logged queries replayed through
+  AssistantCore.handle_input (fresh session each) with the semantic stage
+  off and at the live threshold, counting routes.
+* latency: p50/p99 of one ``best_match`` on the catalogue, and the
+  similarity product for a catalogue ``--scale`` times larger.
+
+Run from anywhere:  python benchmarks/bench_semantic_fallback.py [--thresholds 0.5 0.6 0.7]
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from assistant_core import AssistantCore  # noqa: E402
+from bench_intent_models import confidences, fit, fuzzy_index, pattern_folds, query_log_set  # noqa: E402
+from batch_classify import iter_file  # noqa: E402
+from config import Settings  # noqa: E402
+from intent_store import open_store  # noqa: E402
+from semantic_index import SemanticIndex  # noqa: E402
+from session_store import ChatState  # noqa: E402
+from train_intent_model import read_catalogue, training_data  # noqa: E402
+
+OFF = 1.01  # above any cosine similarity
+
+
+def catalogue(pairs):
+    return [{"tag": tag, "patterns": [text]} for text, tag in pairs]
+
+
+def held_out(intents, args, settings):
+    """Per held-out pattern: truth, the classifier's answer if confident,
+    the fuzzy answer, and the semantic ``(tag, similarity)``."""
+    texts, labels = training_data(intents)
+    folds, always_train = pattern_folds(texts, labels, args.folds, args.seed)
+    rows = []
+    for i, fold in enumerate(folds):
+        train = always_train + [pair for j, other in enumerate(folds) if j != i for pair in other]
+        model = fit("tfidf_logreg", [t for t, _ in train], [tag for _, tag in train])
+        fuzzy, semantic = fuzzy_index(train), SemanticIndex.build(catalogue(train))
+        tags, conf = confidences(model, [t for t, _ in fold])
+        nearest = semantic.best_matches([t for t, _ in fold], 0.0)
+        for (text, truth), tag, c, near in zip(fold, tags, conf, nearest):
+            confident = tag if c >= settings.confidence_threshold else None
+            fuzzy_tag = None if confident else fuzzy.best_match(text, settings.fuzzy_cutoff)[0]
+            rows.append((truth, confident, fuzzy_tag, near))
+    return rows
+
+
+def served(rows, threshold):
+    answers = []
+    for truth, confident, fuzzy_tag, (tag, similarity) in rows:
+        answer = confident or fuzzy_tag or (tag if similarity >= threshold else None) or "fallback"
+        answers.append((truth, answer))
+    return {
+        "accuracy": sum(t == a for t, a in answers) / len(answers),
+        "fallback_rate": sum(a == "fallback" for _, a in answers) / len(answers),
+        "semantic_precision": _precision(rows, threshold),
+    }
+
+
+def _precision(rows, threshold):
+    hits = [truth == tag for truth, confident, fuzzy_tag, (tag, similarity) in rows
+            if not confident and not fuzzy_tag and similarity >= threshold]
+    return sum(hits) / len(hits) if hits else None
+
+
+def replay(queries, threshold, catalogue):
+    settings = Settings.load()._replace(semantic_threshold=threshold)
+    if catalogue.endswith(".json"):
+        assistant = AssistantCore(cache_size=0, settings=settings, intents_path=catalogue)
+    else:
+        assistant = AssistantCore(cache_size=0, settings=settings, intent_store=open_store(catalogue))
+    routes = collections.Counter()
+    original = assistant.fallback_by_semantic
+    # Count what the semantic stage answered (handle_input only reports the final tag)
+    def counted(*a, **kw):
+        tag = original(*a, **kw)
+        routes["semantic" if tag else "semantic_miss"] += 1
+        return tag
+    assistant.fallback_by_semantic = counted
+    for query in queries:
+        _, tag, _ = assistant.handle_input(query, ChatState())
+        routes["fallback" if tag == "fallback" else "answered"] += 1
+    return routes
+
+
+def latency(index, texts, samples, scale):
+    lat = []
+    for i in range(samples):
+        start = time.perf_counter()
+        index.best_match(texts[i % len(texts)], 0.6)
+        lat.append(time.perf_counter() - start)
+    query = index.embed(texts[:1])[0]
+    big = np.tile(np.asarray(index.vectors), (scale, 1))
+    start = time.perf_counter()
+    for _ in range(200):
+        big @ query
+    return np.percentile(lat, 50) * 1e6, np.percentile(lat, 99) * 1e6, len(big), (time.perf_counter() - start) / 200 * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intents", default="intents.json", help="catalogue: intents.json or an intent store")
+    parser.add_argument("--query-log", default="user_queries_log.json", help="logged queries to replay ('' to skip)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--scale", type=int, default=100, help="catalogue multiple for the similarity product")
+    args = parser.parse_args()
+
+    settings = Settings.load()
+    intents = read_catalogue(args.intents)
+    rows = held_out(intents, args, settings)
+    print(f"patterns: {len(rows)} held out (confidence threshold {settings.confidence_threshold}, "
+          f"fuzzy cutoff {settings.fuzzy_cutoff})")
+    base = served(rows, OFF)
+    print(f"  fuzzy only          accuracy {base['accuracy']:.3f}   fallback {base['fallback_rate']:.3f}")
+    for threshold in args.thresholds:
+        r = served(rows, threshold)
+        precision = "-" if r["semantic_precision"] is None else f"{r['semantic_precision']:.3f}"
+        print(f"  semantic >= {threshold:<5}   accuracy {r['accuracy']:.3f}   fallback {r['fallback_rate']:.3f}"
+              f"   semantic precision {precision}")
+
+    if args.query_log and os.path.exists(args.query_log):
+        texts, labels = training_data(intents)
+        queries = [q for q, _ in query_log_set(args.query_log, texts, labels)]
+        queries += [q for q, tag in iter_file(args.query_log) if tag == "fallback"]
+        print(f"query_log: {len(queries)} queries replayed")
+        for threshold in (OFF, settings.semantic_threshold):
+            routes = replay(queries, threshold, args.intents)
+            label = "semantic off" if threshold == OFF else f"semantic >= {threshold}"
+            print(f"  {label:<18}  fallback {routes['fallback']:4d}   semantic answers {routes['semantic']:4d}")
+
+    index = SemanticIndex.build(intents)
+    p50, p99, rows_scaled, matvec_us = latency(index, sorted(set(training_data(intents)[0])), args.samples, args.scale)
+    print(f"best_match ({len(index)} patterns, {index.projection.shape[1]} dims): p50 {p50:.1f} us   p99 {p99:.1f} us")
+    print(f"similarity product at {rows_scaled} patterns: {matvec_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
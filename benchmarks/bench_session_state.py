@@ -0,0 +1,64 @@
+"""Per-turn session cost and cookie size: cookie-held chat_state vs server-side store.
+
+Run from anywhere:  python benchmarks/bench_session_state.py [--turns 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from session_store import ChatState, MemorySessionStore, SQLiteSessionStore  # noqa: E402
+
+# A mid-conversation state as the old handle_input left it in the cookie
+LEGACY_STATE = {
+    "slots": {},
+    "account_no": "458293746",
+    "loan_type": "Home",
+    "completed": True,
+}
+
+
+def per_turn(fn, turns):
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn()
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.secret_key = "bench"
+    serializer = app.session_interface.get_signing_serializer(app)
+
+    before = {"user": "user1", "chat_state": LEGACY_STATE}
+    after = {"user": "user1", "sid": "Xk2v9QeT1mZaB7pL"}
+    cookie_before, cookie_after = serializer.dumps(before), serializer.dumps(after)
+
+    # Before: every turn re-loads, re-serializes and re-signs the whole cookie
+    old_us = per_turn(lambda: serializer.loads(serializer.dumps(before)), args.turns)
+    # After: the cookie is unchanged, so Flask neither re-signs nor re-sends it
+    state = ChatState(account_no="458293746", loan_type="Home", completed=True)
+    memory = MemorySessionStore()
+    mem_us = per_turn(lambda: memory.put("sid", memory.get("sid") or state), args.turns)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(os.path.join(tmp, "sessions.sqlite3"))
+        store.put("sid", state)
+        sql_us = per_turn(lambda: store.put("sid", store.get("sid")), args.turns // 10)
+
+    print(f"cookie size       before: {len(cookie_before):4d} bytes   after: {len(cookie_after):4d} bytes")
+    print(f"state, per turn   cookie (sign+verify): {old_us:6.1f} us   memory store: {mem_us:6.2f} us   sqlite store: {sql_us:6.1f} us")
+    print(f"stored state      legacy JSON: {len(str(LEGACY_STATE))} chars   ChatState.dumps(): {len(state.dumps())} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Cold start: import + model load + first prediction, pickled pipeline vs compact .npz.
+
+Each measurement is a fresh interpreter. "pickle" loads a copy of
+intent_model.pkl with no .npz beside it (unpickling imports sklearn);
+"compact" loads intent_model.npz through the pure-NumPy scorer.
+
+Run from anywhere:  python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from assistant_core import INTENTS_PATH, AssistantCore
+imported = time.perf_counter()
+assistant = AssistantCore(sys.argv[1], intents_path=INTENTS_PATH)
+loaded = time.perf_counter()
+assistant.predict_intent("i want to check my account balance")
+first = time.perf_counter()
+print(json.dumps({"import": imported - start, "load": loaded - imported, "first": first - loaded,
+                  "total": first - start, "sklearn": "sklearn" in sys.modules}))
+"""
+
+APP_PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+app.create_app(start_background=False)
+print(json.dumps({"total": time.perf_counter() - start}))
+"""
+
+
+def probe(code, *args):
+    out = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickled = os.path.join(tmp, "intent_model.pkl")
+        shutil.copy(os.path.join(ROOT, "intent_model.pkl"), pickled)
+        modes = {"pickle": pickled, "compact": os.path.join(ROOT, "intent_model.npz")}
+
+        print(f"{'model':8} {'import ms':>10} {'load ms':>9} {'1st pred ms':>12} {'total ms':>9}  sklearn imported")
+        for name, path in modes.items():
+            runs = [probe(PROBE, path) for _ in range(args.runs)]
+            med = {k: statistics.median(r[k] for r in runs) * 1e3 for k in ("import", "load", "first", "total")}
+            print(f"{name:8} {med['import']:10.1f} {med['load']:9.1f} {med['first']:12.2f} {med['total']:9.1f}  {runs[0]['sklearn']}")
+
+    app_ms = statistics.median(probe(APP_PROBE)["total"] for _ in range(args.runs)) * 1e3
+    print(f"\nimport app + create_app(): {app_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Stdlib load test for /chatbot against a local gunicorn server.
+
+Starts ``gunicorn -c gunicorn.conf.py`` once per serving mode and worker
+count, logs in, hammers /chatbot from a thread pool and reports req/s,
+p50/p99/p99.9 latency and the requests shed with a 503. With ``--admin``
+each run is repeated while admin traffic competes with the chat: clients
+downloading the CSV export of a ``--log-entries`` query log in a loop, and
+an intent added every second, each of which queues a background retrain.
+The server writes its query log, session store, ledger, intent store,
+models and metrics to a temporary directory.
+
+    python benchmarks/load_test.py [--modes sync async] [--workers 1 4 16] [--requests 2000]
+                                   [--concurrency 32] [--admin]
+"""
+import argparse
+import collections
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from query_log import QueryLog  # noqa: E402
+
+MESSAGES = ["hi", "Check Balance", "458293746", "my recent transactions", "I want a loan",
+            "credit card", "what's the weather", "Locate SkyBank office nearby", "thanks", "bye"]
+
+
+def login(host, port):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    body = urllib.parse.urlencode({"username": "user1", "password": "pass123"})
+    conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse()
+    resp.read()
+    cookie = resp.getheader("Set-Cookie", "").split(";", 1)[0]
+    conn.close()
+    if not cookie:
+        raise RuntimeError("login failed: no session cookie")
+    return cookie
+
+
+def wait_ready(host, port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def run_load(host, port, cookie, total, concurrency, path="/chatbot", body_fn=None):
+    latencies, errors, shed = [], [0], [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+    local = threading.local()
+    body_fn = body_fn or (lambda i: '{"message": "%s"}' % MESSAGES[i % len(MESSAGES)])
+
+    def one(_):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(host, port, timeout=30)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                conn.request("POST", path, body_fn(i), {"Content-Type": "application/json", "Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                status = resp.status
+            except (OSError, http.client.HTTPException):
+                status = None
+                conn.close()
+                conn = local.conn = http.client.HTTPConnection(host, port, timeout=30)
+            elapsed = time.perf_counter() - start
+            if status == 503:
+                # Shed: back off as told, like a well-behaved client
+                time.sleep(float(resp.getheader("Retry-After", 1)))
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                elif status == 503:
+                    shed[0] += 1
+                else:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(concurrency)))
+    wall = time.perf_counter() - start
+    return latencies, errors[0], shed[0], wall
+
+
+def admin_load(host, port, cookie, stop, export_clients, counts):
+    """Start the competing admin traffic; it runs until ``stop`` is set."""
+    def exports():
+        conn = http.client.HTTPConnection(host, port, timeout=120)
+        while not stop.is_set():
+            try:
+                conn.request("GET", "/admin/export_csv", headers={"Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                counts["exports" if resp.status == 200 else "admin_errors"] += 1
+            except (OSError, http.client.HTTPException):
+                counts["admin_errors"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=120)
+
+    def intents():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        i = 0
+        while not stop.is_set():
+            body = urllib.parse.urlencode({"intent": f"load_test_{i}", "patterns": f"load test pattern number {i}",
+                                           "responses": "Load test reply."})
+            try:
+                conn.request("POST", "/add_intent", body,
+                             {"Content-Type": "application/x-www-form-urlencoded", "Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                counts["retrains" if resp.status == 202 else "admin_errors"] += 1
+            except (OSError, http.client.HTTPException):
+                counts["admin_errors"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            i += 1
+            stop.wait(1.0)
+
+    threads = [threading.Thread(target=exports, daemon=True) for _ in range(export_clients)]
+    threads.append(threading.Thread(target=intents, daemon=True))
+    for t in threads:
+        t.start()
+    return threads
+
+
+def seed_query_log(log_dir, entries):
+    log = QueryLog(log_dir, legacy_path=None, start_writer=False)
+    tags = ["greeting", "check_balance", "loan", "card_services", "fallback"]
+    for i in range(entries):
+        log.append({"user": "user1", "query": MESSAGES[i % len(MESSAGES)], "intent_tag": tags[i % len(tags)],
+                    "timestamp": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T12:00:00"})
+        if i % 10000 == 9999:
+            log.flush()
+    log.flush()
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def start_server(workers, port, log_dir, extra_env=None, mode="sync"):
+    env = dict(os.environ, PORT=str(port), HOST="127.0.0.1", WEB_WORKERS=str(workers), WEB_MODE=mode,
+               QUERY_LOG_DIR=log_dir, SESSION_DB=os.path.join(log_dir, "sessions.sqlite3"),
+               LEDGER_DB=os.path.join(log_dir, "ledger.sqlite3"), METRICS_DIR=os.path.join(log_dir, "metrics"),
+               INTENTS_DB=os.path.join(log_dir, "intents.sqlite3"), MODELS_DIR=os.path.join(log_dir, "models"),
+               WEB_ACCESSLOG="", **(extra_env or {}))
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--admin", action="store_true", help="repeat each run under CSV exports and retrains")
+    parser.add_argument("--export-clients", type=int, default=2)
+    parser.add_argument("--log-entries", type=int, default=200000, help="query log size for the CSV export")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+    host = "127.0.0.1"
+
+    print(f"{'mode':>5} {'workers':>7} {'admin':>5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} "
+          f"{'shed':>5} {'errors':>7} {'exports':>7} {'retrains':>8}")
+    for mode in args.modes:
+        for workers in args.workers:
+            log_dir = tempfile.mkdtemp(prefix="loadtest-log-")
+            if args.admin:
+                seed_query_log(log_dir, args.log_entries)
+            proc = start_server(workers, args.port, log_dir, mode=mode)
+            try:
+                wait_ready(host, args.port, proc)
+                cookie = login(host, args.port)
+                run_load(host, args.port, cookie, 100, args.concurrency)  # warm-up
+                for admin in ([False, True] if args.admin else [False]):
+                    counts = collections.Counter()
+                    stop = threading.Event()
+                    threads = admin_load(host, args.port, cookie, stop, args.export_clients, counts) if admin else []
+                    if admin:
+                        time.sleep(2)  # let the exports and the first retrain get going
+                    latencies, errors, shed, wall = run_load(host, args.port, cookie, args.requests, args.concurrency)
+                    stop.set()
+                    for t in threads:
+                        t.join(timeout=120)
+                    print(f"{mode:>5} {workers:>7} {'yes' if admin else 'no':>5} {len(latencies) / wall:>9.1f} "
+                          f"{percentile(latencies, 50) * 1e3:>8.2f} {percentile(latencies, 99) * 1e3:>8.2f} "
+                          f"{percentile(latencies, 99.9) * 1e3:>9.2f} {shed:>5} {errors + counts['admin_errors']:>7} "
+                          f"{counts['exports']:>7} {counts['retrains']:>8}")
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+                shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
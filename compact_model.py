@@ -0,0 +1,181 @@
+import hashlib
+import os
+import re
+import zipfile
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def compact_path(model_path):
+    """Where the compact export of ``model_path`` lives: ``x.pkl`` -> ``x.npz``."""
+    return os.path.splitext(model_path)[0] + ".npz"
+
+
+def file_digest(path):
+    """SHA-256 of the file at ``path``."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_source(path):
+    """Digest of the pickle the export at ``path`` was made from ("" if unknown)."""
+    arrays = mmap_npz(path)
+    return str(arrays["source"]) if "source" in arrays else ""
+
+
+def export_pipeline(pipeline, path, source=""):
+    """Write the TF-IDF + LogisticRegression pipeline as plain arrays.
+
+    The archive is uncompressed so ``load_compact`` can memory-map every
+    array in place; returns ``False`` (and writes nothing) for models it
+    cannot represent, which are then served from their pickle. ``source``
+    is the ``file_digest`` of the pickle, checked before the export is used
+    in its place.
+    """
+    steps = getattr(pipeline, "named_steps", {})
+    tfidf, clf = steps.get("tfidf"), steps.get("clf")
+    if not hasattr(tfidf, "vocabulary_") or not hasattr(clf, "coef_"):
+        return False
+    # One-vs-rest probabilities are not a softmax; leave those to the pickle
+    multi_class = getattr(clf, "multi_class", "auto")
+    if len(clf.classes_) > 2 and (multi_class == "ovr" or (multi_class == "auto" and clf.solver == "liblinear")):
+        return False
+    params = tfidf.get_params()
+    if (params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"]
+            or params["stop_words"] or params["strip_accents"] or params["binary"]):
+        return False
+    terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get)
+    arrays = {
+        "format": np.array(FORMAT_VERSION),
+        "source": np.array(source),
+        "terms": np.array(terms, dtype=str),
+        "idf": tfidf.idf_ if params["use_idf"] else np.ones(len(terms)),
+        # Feature-major so a document's terms gather contiguous rows
+        "weights": np.ascontiguousarray(clf.coef_.T),
+        "intercept": clf.intercept_,
+        "classes": np.array([str(c) for c in clf.classes_], dtype=str),
+        "token_pattern": np.array(params["token_pattern"]),
+        "ngram_range": np.array(params["ngram_range"]),
+        "lowercase": np.array(params["lowercase"]),
+        "sublinear_tf": np.array(params["sublinear_tf"]),
+        "norm": np.array(params["norm"] or ""),
+    }
+    # Write atomically so readers never see a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return True
+
+
+def mmap_npz(path):
+    """Map each ``.npy`` member of an uncompressed ``.npz`` straight from the file."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: compressed member {info.filename}")
+            # Skip the local file header to reach the .npy bytes
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran, dtype = read_header(f)
+            name = info.filename[:-4]
+            if dtype.hasobject:
+                raise ValueError(f"{path}: object array {name}")
+            if not shape or 0 in shape:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran else "C")
+    return arrays
+
+
+def load_compact(path):
+    return CompactIntentModel(mmap_npz(path))
+
+
+class CompactIntentModel:
+    """Pure-NumPy scorer for an exported TF-IDF + LogisticRegression model.
+
+    Reproduces ``TfidfVectorizer`` (word n-grams, smoothed idf, l2 norm)
+    and the multinomial ``predict_proba``, so serving needs neither sklearn
+    nor the pickled pipeline. Exposes ``classes_``, ``predict`` and
+    ``predict_proba`` like the pipeline.
+    """
+
+    def __init__(self, arrays):
+        if int(arrays["format"]) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model format {int(arrays['format'])}")
+        self.vocabulary = {term: i for i, term in enumerate(arrays["terms"].tolist())}
+        self.idf = arrays["idf"]
+        self.weights = arrays["weights"]
+        self.intercept = np.asarray(arrays["intercept"])
+        self.classes_ = np.asarray(arrays["classes"])
+        self.token_re = re.compile(str(arrays["token_pattern"]))
+        self.ngram_range = tuple(int(n) for n in arrays["ngram_range"])
+        self.lowercase = bool(arrays["lowercase"])
+        self.sublinear_tf = bool(arrays["sublinear_tf"])
+        self.norm = str(arrays["norm"])
+
+    def _features(self, text):
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        lo, hi = self.ngram_range
+        counts = {}
+        vocabulary = self.vocabulary
+        for n in range(lo, min(hi, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                j = vocabulary.get(tokens[i] if n == 1 else " ".join(tokens[i:i + n]))
+                if j is not None:
+                    counts[j] = counts.get(j, 0) + 1
+        return counts
+
+    def decision_function(self, texts):
+        indices, values, starts = [], [], []
+        for text in texts:
+            counts = self._features(text)
+            starts.append(len(indices))
+            indices.extend(counts)
+            values.extend(counts.values())
+        scores = np.tile(self.intercept, (len(texts), 1))
+        if not indices:
+            return scores
+        idx = np.asarray(indices)
+        tf = np.asarray(values, dtype=np.float64)
+        if self.sublinear_tf:
+            tf = np.log(tf) + 1
+        tfidf = tf * self.idf[idx]
+        # Per-document l2 norm, then one weighted gather of coefficient rows
+        sizes = np.diff(starts + [len(indices)])
+        docs = np.repeat(np.arange(len(texts)), sizes)
+        if self.norm == "l2":
+            norms = np.sqrt(np.bincount(docs, tfidf * tfidf, minlength=len(texts)))
+            tfidf = tfidf / norms[docs]
+        elif self.norm == "l1":
+            norms = np.bincount(docs, np.abs(tfidf), minlength=len(texts))
+            tfidf = tfidf / norms[docs]
+        present = sizes > 0
+        scores[present] += np.add.reduceat(self.weights[idx] * tfidf[:, None], np.asarray(starts)[present], axis=0)
+        return scores
+
+    def predict_proba(self, texts):
+        scores = self.decision_function(texts)
+        if scores.shape[1] == 1:
+            p = 1 / (1 + np.exp(-scores[:, 0]))
+            return np.column_stack([1 - p, p])
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, texts):
+        return self.classes_[np.argmax(self.predict_proba(texts), axis=1)]
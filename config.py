@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+from types import MappingProxyType
+
+SETTINGS_FILE = "settings.json"
+
+
+def load_settings(path=SETTINGS_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return settings if isinstance(settings, dict) else {}
+
+
+def tunable(name, default, cast=None, settings=None):
+    """Resolve a tunable: the ``NAME`` environment variable wins over the
+    ``name`` key of settings.json, which wins over ``default``."""
+    cast = cast or type(default)
+    value = os.environ.get(name.upper())
+    if value is None:
+        if settings is None:
+            settings = load_settings()
+        value = settings.get(name, default)
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# ---------------- LIVE SETTINGS ----------------
+# Settings the running app picks up without a restart; 0 disables the limit
+# for max_response_length and the cache for prediction_cache_size
+LIVE_DEFAULTS = {
+    "confidence_threshold": 0.45,  # below this the fuzzy fallback decides
+    "fuzzy_cutoff": 60,  # fuzzy matches must score above this (0-100)
+    "semantic_threshold": 0.6,  # cosine similarity for the nearest-pattern fallback (above 1 disables it)
+    "prediction_cache_size": 4096,
+    "spending_cache_size": 256,  # accounts whose spending insights stay cached
+    "max_response_length": 500,  # characters per chatbot reply
+}
+LIVE_RANGES = {
+    "confidence_threshold": (0.0, 1.0),
+    "fuzzy_cutoff": (0, 100),
+    "semantic_threshold": (0.0, 1.01),
+    "prediction_cache_size": (0, None),
+    "spending_cache_size": (1, None),
+    "max_response_length": (0, None),
+}
+
+
+def check_setting(name, value):
+    """``value`` cast to the setting's type; ValueError if unknown or out of range."""
+    if name not in LIVE_DEFAULTS:
+        raise ValueError(f"Unknown setting: {name}")
+    cast = type(LIVE_DEFAULTS[name])
+    try:
+        value = cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value!r}") from None
+    low, high = LIVE_RANGES[name]
+    if value < low:
+        raise ValueError(f"{name} must be at least {low}")
+    if high is not None and value > high:
+        raise ValueError(f"{name} must be at most {high}")
+    return value
+
+
+class Settings(namedtuple("Settings", tuple(LIVE_DEFAULTS) + ("raw", "version"))):
+    """Immutable snapshot of the live settings.
+
+    The assistant takes one reference per request, like its ModelState, so
+    a request never sees half of an update. ``raw`` is a read-only view of
+    settings.json as loaded, including keys that are not live settings.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, raw, version=0):
+        values = {}
+        for name, default in LIVE_DEFAULTS.items():
+            try:
+                values[name] = check_setting(name, tunable(name, default, settings=raw))
+            except ValueError:
+                values[name] = default
+        return cls(raw=MappingProxyType(dict(raw)), version=version, **values)
+
+    @classmethod
+    def load(cls, path=SETTINGS_FILE):
+        return cls.from_dict(load_settings(path))
+
+    def as_dict(self):
+        out = dict(self.raw)
+        out.update((name, getattr(self, name)) for name in LIVE_DEFAULTS)
+        return out
+
+
+class LiveSettings:
+    """settings.json loaded once and handed out as ``Settings`` snapshots.
+
+    ``current`` is a plain attribute, so the hot path never touches the
+    disk. The file is re-read only when its mtime or size changes: ``check``
+    is polled by a background thread (``start``), which is how the other
+    worker processes see an update, and ``update`` writes the file and
+    publishes in-process at once. Listeners registered with ``subscribe``
+    are called with every new snapshot. Environment variables still win
+    over the file, as for ``tunable``.
+    """
+
+    def __init__(self, path=SETTINGS_FILE, interval=2.0):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._stamp = self._stat()
+        self.current = Settings.from_dict(load_settings(path), version=1)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def subscribe(self, fn):
+        """Call ``fn(settings)`` now and again with every new snapshot."""
+        self._listeners.append(fn)
+        fn(self.current)
+
+    def check(self):
+        """Reload if the file changed since it was last read."""
+        stamp = self._stat()
+        if stamp == self._stamp:
+            return False
+        with self._lock:
+            self._stamp = stamp
+            if stamp is None:
+                raw = {}
+            else:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        raw = json.load(f)
+                except (OSError, ValueError):
+                    # Mid-write or hand-edited badly: keep serving the last good snapshot
+                    return False
+                if not isinstance(raw, dict):
+                    return False
+            self._publish(raw)
+        return True
+
+    def update(self, changes):
+        """Validate ``changes`` (name -> value), save them and publish the
+        new snapshot, which is returned. Raises ValueError on a bad value."""
+        values = {name: check_setting(name, value) for name, value in changes.items()}
+        with self._lock:
+            raw = load_settings(self.path)
+            raw.update(values)
+            # Write atomically so a watcher never reads half a file
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(raw, f, indent=4)
+            os.replace(tmp_path, self.path)
+            self._stamp = self._stat()
+            return self._publish(raw)
+
+    def _publish(self, raw):
+        settings = Settings.from_dict(raw, self.current.version + 1)
+        self.current = settings
+        for fn in self._listeners:
+            try:
+                fn(settings)
+            except Exception:
+                traceback.print_exc()
+        return settings
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="settings-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,305 @@
+import random
+import re
+
+from rule_router import PLACEHOLDERS
+from spending_analytics import parse_month
+
+FALLBACK_TAG = "fallback"
+AWAITING_SLOT = "_awaiting"
+
+TX_LINE = "{}: {} {}₹{:.2f}".format
+BALANCE = "Your balance is ₹{:.2f}".format
+RECENT_TRANSACTIONS = 5
+
+_TEMPLATE_FIELD = re.compile(r"\{(\w+)\}")
+
+
+def with_tick(msg, tag):
+    return f"{msg}\n✅ {tag}"
+
+
+class Turn:
+    """One user message plus everything a handler may need."""
+    __slots__ = ("text", "text_clean", "session", "account", "assistant")
+
+    def __init__(self, text, text_clean, session, account, assistant):
+        self.text = text
+        self.text_clean = text_clean
+        self.session = session
+        self.account = account
+        self.assistant = assistant
+
+
+# ---------------- HANDLERS ----------------
+class Handler:
+    """Base class: ``handle(turn)`` returns ``(reply, tag)``."""
+
+    def __init__(self, intent):
+        self.tag = intent["tag"]
+        self.responses = intent.get("responses", [])
+
+    def handle(self, turn):
+        raise NotImplementedError
+
+
+class RespondHandler(Handler):
+    """Reply with one of the intent's responses. Replies (with the optional
+    ✅ tag line) are built once here, not on every turn."""
+
+    def __init__(self, intent, default=None, tick=False):
+        super().__init__(intent)
+        replies = self.responses or default or []
+        self.replies = [with_tick(r, self.tag) if tick else r for r in replies]
+
+    def handle(self, turn):
+        return random.choice(self.replies), self.tag
+
+
+class GoodbyeHandler(RespondHandler):
+    def handle(self, turn):
+        turn.session.completed = True
+        return super().handle(turn)
+
+
+class FallbackHandler(RespondHandler):
+    def __init__(self, intent):
+        super().__init__(intent, default=["Sorry, I didn’t understand. Could you rephrase?"])
+        self.tag = FALLBACK_TAG
+
+
+class AccountHandler(Handler):
+    """Shared account resolution for the intents that need an account."""
+
+    prompt = "Please provide a valid account number."
+
+    def handle(self, turn):
+        session = turn.session
+        acct = str(session.account_no or turn.account) if (session.account_no or turn.account) else None
+        acct_info = turn.assistant.ledger.get_account(acct) if acct else None
+        if acct_info:
+            session.account_no = acct
+            return self.reply(turn, acct_info), self.tag
+        session.awaiting_account_input = True
+        session.awaiting_intent = self.tag
+        return with_tick(self.prompt, self.tag), self.tag
+
+    def reply(self, turn, acct_info):
+        raise NotImplementedError
+
+
+class BalanceHandler(AccountHandler):
+    prompt = "Please provide your account number."
+
+    def reply(self, turn, acct_info):
+        return BALANCE(acct_info["balance"])
+
+
+class TransactionsHandler(AccountHandler):
+    def reply(self, turn, acct_info, empty="No recent transactions."):
+        # Only the page the chat shows is read from the ledger
+        txs = turn.assistant.ledger.last_transactions(acct_info["account_no"], RECENT_TRANSACTIONS)
+        if not txs:
+            return empty
+        lines = [TX_LINE(t["date"], t["type"], "+" if t["amount"] > 0 else "-", abs(t["amount"])) for t in txs]
+        return with_tick("\n".join(lines), self.tag)
+
+
+class SpendingHandler(AccountHandler):
+    """"How much did I spend on groceries last month": one category, or a
+    month summary when no category is named. Defaults to this month."""
+
+    def reply(self, turn, acct_info):
+        insights = turn.assistant.spending.insights(acct_info["account_no"])
+        month = parse_month(turn.text_clean) or parse_month("this month")
+        label = month.strftime("%B %Y")
+        category = insights.match_category(turn.text_clean)
+        if category:
+            return f"You spent ₹{insights.spent(month, category):.2f} on {category} in {label}."
+        lines = [f"In {label} you spent ₹{insights.spent(month):.2f} and received ₹{insights.income(month):.2f}."]
+        top = insights.top_categories(month)
+        if top:
+            lines.append("Top categories: " + ", ".join(f"{name} ₹{value:.2f}" for name, value in top) + ".")
+        for r in insights.month_anomalies(month).itertuples():
+            lines.append(f"Unusual: {r.date} {r.type} ₹{-r.amount:.2f}")
+        return with_tick("\n".join(lines), self.tag)
+
+
+class AccountNumberHandler(RespondHandler):
+    """A bare account number outside any pending lookup: remember it."""
+
+    def handle(self, turn):
+        if turn.account and turn.account in turn.assistant.ledger:
+            turn.session.account_no = turn.account
+            return super().handle(turn)
+        return with_tick("Please provide a valid account number.", self.tag), self.tag
+
+
+class CardServicesHandler(Handler):
+    def __init__(self, intent):
+        super().__init__(intent)
+        self.ask = with_tick("Do you want a Credit Card or a Debit Card?", self.tag)
+
+    def handle(self, turn):
+        if "credit" in turn.text_clean:
+            return "Your Credit Card request has been initiated.", self.tag
+        if "debit" in turn.text_clean:
+            return "Your Debit Card request has been initiated.", self.tag
+        return self.ask, self.tag
+
+
+class LoanHandler(Handler):
+    def __init__(self, intent):
+        super().__init__(intent)
+        self.ask = with_tick("Which type of loan are you interested in? Personal or Home?", self.tag)
+        self.ask_again = with_tick("Sure! Which type of loan are you interested in? Personal or Home?", self.tag)
+
+    def handle(self, turn):
+        session, text_clean = turn.session, turn.text_clean
+        if "change loan" in text_clean or "new loan type" in text_clean:
+            session.loan_type = None
+            session.awaiting_loan_type = True
+            return self.ask_again, self.tag
+        if session.awaiting_loan_type:
+            session.loan_type = text_clean.strip().lower().title()
+            session.awaiting_loan_type = False
+            return f"You selected {session.loan_type}. I can guide you with the application process.", self.tag
+        if session.loan_type is not None:
+            return f"You have already selected {session.loan_type}. I can guide you with the application process.", self.tag
+        session.awaiting_loan_type = True
+        return self.ask, self.tag
+
+
+class SlotFillingHandler(Handler):
+    """Generic slot filling declared in intents.json::
+
+        {"tag": "...", "handler": "slot", "required_slots": ["city"],
+         "prompts": {"city": "Which city?"},
+         "responses": ["Our {city} branch opens at 9 AM."]}
+
+    Slots named like a known placeholder (``account_number``, ``amount``,
+    ``card_type``) are picked out of the message; any other slot is asked
+    for and filled by the user's next message.
+    """
+
+    def __init__(self, intent):
+        super().__init__(intent)
+        self.slots = intent.get("required_slots") or intent.get("slots") or []
+        prompts = intent.get("prompts", {})
+        self.prompts = {s: with_tick(prompts.get(s, f"Please provide your {s.replace('_', ' ')}."), self.tag) for s in self.slots}
+        self.extractors = {s: re.compile(rf"\b({PLACEHOLDERS[s]})\b") for s in self.slots if s in PLACEHOLDERS}
+        # Pre-split templates: only fields are substituted per turn
+        self.templates = [(r, _TEMPLATE_FIELD.findall(r)) for r in self.responses or ["Done."]]
+
+    def handle(self, turn):
+        slots = turn.session.slots
+        filled = slots.setdefault(self.tag, {})
+        awaiting = slots.pop(AWAITING_SLOT, None)
+        if awaiting and awaiting[0] == self.tag:
+            filled[awaiting[1]] = turn.text.strip()
+        for name, pattern in self.extractors.items():
+            m = pattern.search(turn.text_clean)
+            if m and name not in filled:
+                filled[name] = m.group(1)
+        for name in self.slots:
+            if name not in filled:
+                slots[AWAITING_SLOT] = [self.tag, name]
+                return self.prompts[name], self.tag
+        template, fields = random.choice(self.templates)
+        values = slots.pop(self.tag)
+        reply = template.format(**{f: values.get(f, "") for f in fields}) if fields else template
+        return reply, self.tag
+
+
+BUILTIN_HANDLERS = {
+    "check_balance": BalanceHandler,
+    "recent_transactions": TransactionsHandler,
+    "spending_insights": SpendingHandler,
+    "provide_account_number": AccountNumberHandler,
+    "card_services": CardServicesHandler,
+    "loan": LoanHandler,
+    "weather": lambda it: RespondHandler(it, default=["I can’t fetch live weather here — try a weather app."]),
+    "chitchat": lambda it: RespondHandler(it, default=["Hi there!"]),
+    "greeting": lambda it: RespondHandler(it, default=["Hello!"], tick=True),
+    "thanks": lambda it: RespondHandler(it, default=["You're welcome!"]),
+    "goodbye": lambda it: GoodbyeHandler(it, default=["Goodbye!"]),
+    FALLBACK_TAG: FallbackHandler,
+}
+
+DECLARED_HANDLERS = {
+    "respond": RespondHandler,
+    "slot": SlotFillingHandler,
+}
+
+
+# ---------------- REGISTRY ----------------
+def _make_handler(intent):
+    declared = intent.get("handler")
+    if declared in DECLARED_HANDLERS:
+        factory = DECLARED_HANDLERS[declared]
+    else:
+        factory = BUILTIN_HANDLERS.get(intent["tag"], RespondHandler)
+    handler = factory(intent)
+    # An intent without responses has nothing generic to say
+    if factory is RespondHandler and not handler.replies:
+        return None
+    return handler
+
+
+class DialogueRegistry:
+    """Tag -> handler table built from the intent catalogue.
+
+    An intent may declare ``"handler": "respond"`` or ``"slot"``; otherwise
+    the built-in handler for its tag is used, and any other intent (e.g. one
+    added through /add_intent) simply replies from its responses.
+    """
+
+    def __init__(self, intents):
+        self.handlers = {}
+        for intent in intents:
+            handler = _make_handler(intent)
+            if handler is not None:
+                self.handlers[intent["tag"]] = handler
+        self._finish()
+
+    def _finish(self):
+        if FALLBACK_TAG not in self.handlers:
+            self.handlers[FALLBACK_TAG] = FallbackHandler({"tag": FALLBACK_TAG})
+        self.fallback = self.handlers[FALLBACK_TAG]
+
+    def patched(self, changed):
+        """A copy with new handlers for the ``changed`` intents (tag ->
+        intent, or ``None`` if deleted); the others are shared."""
+        registry = DialogueRegistry.__new__(DialogueRegistry)
+        registry.handlers = dict(self.handlers)
+        for tag, intent in changed.items():
+            handler = _make_handler(intent) if intent is not None else None
+            if handler is None:
+                registry.handlers.pop(tag, None)
+            else:
+                registry.handlers[tag] = handler
+        registry._finish()
+        return registry
+
+    def dispatch(self, tag, turn):
+        return self.handlers.get(tag, self.fallback).handle(turn)
+
+    def pending_slot(self, session):
+        """Tag of a declared slot-filling intent waiting for an answer."""
+        awaiting = session.slots.get(AWAITING_SLOT)
+        return awaiting[0] if awaiting and awaiting[0] in self.handlers else None
+
+    def resume_account(self, turn):
+        """Finish a balance/transactions lookup that was waiting for an
+        account number. Returns ``None`` to continue with normal routing."""
+        session = turn.session
+        acct_info = turn.assistant.ledger.get_account(turn.account)
+        if not acct_info:
+            return with_tick("Please provide a valid account number.", "check_balance"), "check_balance"
+        session.account_no = turn.account
+        session.awaiting_account_input = False
+        original_tag = session.awaiting_intent or "check_balance"
+        session.awaiting_intent = None
+        handler = self.handlers.get(original_tag)
+        if isinstance(handler, AccountHandler):
+            return handler.reply(turn, acct_info), original_tag
+        return None
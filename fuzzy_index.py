@@ -0,0 +1,107 @@
+import numpy as np
+from fuzzywuzzy import fuzz
+
+FUZZY_CUTOFF = 60
+
+
+class FuzzyIndex:
+    """Pre-normalized pattern index for the fuzzy intent fallback.
+
+    Gives the same answer as scoring ``fuzz.partial_ratio`` against every
+    pattern, but prunes with a character-count upper bound first: a window
+    can never share more characters with the query than the two strings
+    have in common, so ``200 * common / (len(shorter) + common)`` bounds the
+    score. Patterns are scored in decreasing bound order and the scan stops
+    as soon as no remaining bound can beat the best score (or the cutoff).
+    """
+
+    def __init__(self, intents, cutoff=FUZZY_CUTOFF):
+        self.cutoff = cutoff
+        self.patterns, self.tags, self.alphabet = [], [], {}
+        self.counts = np.zeros((0, 0), dtype=np.int32)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self._append(intents)
+
+    def _append(self, intents):
+        seen = set(self.patterns)
+        patterns, tags = [], []
+        for intent in intents:
+            for pattern in intent.get("patterns", []):
+                if "{" in pattern:
+                    continue
+                p = pattern.lower()
+                # Only the first tag of a duplicated pattern can ever win
+                if p in seen or not p:
+                    continue
+                seen.add(p)
+                patterns.append(p)
+                tags.append(intent["tag"])
+
+        for p in patterns:
+            for ch in p:
+                self.alphabet.setdefault(ch, len(self.alphabet))
+        start = len(self.patterns)
+        counts = np.zeros((start + len(patterns), len(self.alphabet)), dtype=np.int32)
+        counts[:start, :self.counts.shape[1]] = self.counts
+        for i, p in enumerate(patterns, start):
+            for ch in p:
+                counts[i, self.alphabet[ch]] += 1
+        self.counts = counts
+        self.lengths = np.concatenate([self.lengths, np.array([len(p) for p in patterns], dtype=np.int32)])
+        self.patterns += patterns
+        self.tags += tags
+
+    def patched(self, changed):
+        """A copy with the patterns of the ``changed`` intents (tag -> intent,
+        or ``None`` if deleted) replaced. Other rows are reused as they are;
+        the changed intents' patterns go last."""
+        keep = [i for i, tag in enumerate(self.tags) if tag not in changed]
+        index = FuzzyIndex.__new__(FuzzyIndex)
+        index.cutoff = self.cutoff
+        index.patterns = [self.patterns[i] for i in keep]
+        index.tags = [self.tags[i] for i in keep]
+        index.alphabet = dict(self.alphabet)
+        index.counts = self.counts[keep]
+        index.lengths = self.lengths[keep]
+        index._append([intent for intent in changed.values() if intent is not None])
+        return index
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def upper_bounds(self, text):
+        query = {}
+        for ch in text:
+            col = self.alphabet.get(ch)
+            if col is not None:
+                query[col] = query.get(col, 0) + 1
+        if not query or not len(self.patterns):
+            return np.zeros(len(self.patterns))
+        cols = np.fromiter(query.keys(), dtype=np.int64)
+        need = np.fromiter(query.values(), dtype=np.int32)
+        common = np.minimum(self.counts[:, cols], need).sum(axis=1)
+        shorter = np.minimum(self.lengths, len(text))
+        # Round the same way fuzzywuzzy rounds its scores, plus one for float noise
+        return np.floor(200.0 * common / np.maximum(shorter + common, 1) + 0.5) + 1
+
+    def best_match(self, text, cutoff=None):
+        """Return ``(tag, score)`` for the best pattern, or ``(None, score)``
+        when nothing scores above the cutoff (``self.cutoff`` by default)."""
+        if cutoff is None:
+            cutoff = self.cutoff
+        if not text or not self.patterns:
+            return None, 0
+        bounds = self.upper_bounds(text)
+        candidates = np.flatnonzero(bounds > cutoff)
+        # Highest bound first; ties keep catalogue order like the linear scan
+        candidates = candidates[np.argsort(-bounds[candidates], kind="stable")]
+        best, best_score = None, 0
+        for i in candidates:
+            if bounds[i] < best_score:
+                break
+            score = fuzz.partial_ratio(text, self.patterns[i])
+            if score > best_score or (score == best_score and best is not None and i < best):
+                best, best_score = i, score
+        if best is None or best_score <= cutoff:
+            return None, best_score
+        return self.tags[best], best_score
@@ -0,0 +1,45 @@
+# gunicorn.conf.py — production serving: gunicorn -c gunicorn.conf.py
+#
+# The app is preloaded in the master (model unpickled once, pages shared
+# copy-on-write by the forked workers); background threads are started per
+# worker in post_fork. Tunables come from the environment (upper-case) or
+# settings.json, see config.tunable.
+import gc
+import multiprocessing
+import os
+
+from config import tunable
+
+# "sync": Flask on gthread workers. "async": the ASGI gateway in asgi_app.py
+# on uvicorn workers (needs uvicorn and uvicorn-worker)
+web_mode = tunable("web_mode", "sync")
+if web_mode == "async":
+    wsgi_app = "asgi_app:create_asgi_app(start_background=False)"
+else:
+    wsgi_app = "app:create_app(start_background=False)"
+preload_app = True
+
+bind = f"{tunable('host', '0.0.0.0')}:{tunable('port', 5000)}"
+workers = tunable("web_workers", min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = "uvicorn_worker.UvicornWorker" if web_mode == "async" else "gthread"
+threads = tunable("web_threads", 4)  # async: threads for the non-chat routes
+timeout = tunable("web_timeout", 60)
+keepalive = 5
+max_requests = tunable("web_max_requests", 0)
+max_requests_jitter = 50
+accesslog = tunable("web_accesslog", "") or None  # "-" for stdout
+
+# Chat state must be visible to every worker
+if workers > 1:
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach, so GC
+    # passes in the workers do not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_services()
@@ -0,0 +1,125 @@
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+N_FEATURES = 2 ** 18
+ALPHA = 0.5
+
+
+class IncrementalIntentModel:
+    """Hashed-feature multinomial naive Bayes that learns one pattern at a time.
+
+    HashingVectorizer is stateless, so new patterns need no vocabulary refit,
+    and the model is a set of per-class feature counts: adding (or removing)
+    a pattern touches only its own class and a brand-new tag is just a new
+    row. Exposes ``classes_``, ``predict`` and ``predict_proba`` so it can be
+    served by AssistantCore like the sklearn pipeline.
+    """
+
+    def __init__(self, n_features=N_FEATURES, alpha=ALPHA):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.vectorizer = HashingVectorizer(
+            ngram_range=(1, 2), n_features=n_features, alternate_sign=False, norm=None
+        )
+        self.counts = {}     # tag -> Counter(feature -> count)
+        self.totals = {}     # tag -> total feature count
+        self.patterns = {}   # tag -> Counter(pattern -> times learned)
+        self.classes_ = np.array([], dtype=object)
+        self._weights = None
+        self._norms = None
+        self._dirty = set()
+
+    # ---------------- LEARNING ----------------
+    def partial_fit(self, texts, labels):
+        self._update(texts, labels, 1)
+        return self
+
+    def forget(self, texts, labels):
+        """Remove previously learned patterns (used when intents are edited)."""
+        self._update(texts, labels, -1)
+        return self
+
+    def _update(self, texts, labels, sign):
+        if not texts:
+            return
+        X = self.vectorizer.transform(texts).tocsr()
+        for row, text, tag in zip(range(X.shape[0]), texts, labels):
+            start, end = X.indptr[row], X.indptr[row + 1]
+            counts = self.counts.setdefault(tag, Counter())
+            for col, val in zip(X.indices[start:end], X.data[start:end]):
+                counts[col] += sign * val
+                if counts[col] <= 0:
+                    del counts[col]
+            self.totals[tag] = sum(counts.values())
+            seen = self.patterns.setdefault(tag, Counter())
+            seen[text] += sign
+            if seen[text] <= 0:
+                del seen[text]
+            if not seen:
+                del self.patterns[tag], self.counts[tag], self.totals[tag]
+            self._dirty.add(tag)
+
+    def sync(self, texts, labels):
+        """Learn what is new and forget what is gone compared with the
+        given corpus. Returns ``(added, removed)`` pattern counts."""
+        wanted = Counter(zip(texts, labels))
+        have = Counter({(t, tag): n for tag, seen in self.patterns.items() for t, n in seen.items()})
+        added, removed = wanted - have, have - wanted
+        if removed:
+            pairs = list(removed.elements())
+            self.forget([t for t, _ in pairs], [tag for _, tag in pairs])
+        if added:
+            pairs = list(added.elements())
+            self.partial_fit([t for t, _ in pairs], [tag for _, tag in pairs])
+        return sum(added.values()), sum(removed.values())
+
+    # ---------------- SCORING ----------------
+    def _compile(self):
+        """Rebuild the scoring matrix. Only the rows of changed classes are
+        recomputed; the rest are reused from the previous build."""
+        if not self._dirty and self._weights is not None:
+            return
+        tags = sorted(self.counts)
+        old_rows = {}
+        if self._weights is not None:
+            for i, tag in enumerate(self.classes_):
+                if tag in self.counts and tag not in self._dirty:
+                    old_rows[tag] = (self._weights.getrow(i), self._norms[i])
+        rows, norms = [], []
+        for tag in tags:
+            if tag in old_rows:
+                row, norm = old_rows[tag]
+            else:
+                counts = self.counts[tag]
+                cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                vals = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+                # log(count + alpha) - log(alpha): zero for unseen features, so the matrix stays sparse
+                row = sparse.csr_matrix((np.log1p(vals / self.alpha), (np.zeros_like(cols), cols)), shape=(1, self.n_features))
+                norm = np.log(self.totals[tag] + self.alpha * self.n_features)
+            rows.append(row)
+            norms.append(norm)
+        self.classes_ = np.array(tags, dtype=object)
+        self._weights = sparse.vstack(rows).tocsr() if rows else None
+        self._norms = np.array(norms)
+        self._dirty = set()
+
+    def predict_proba(self, texts):
+        self._compile()
+        if self._weights is None:
+            raise RuntimeError("IncrementalIntentModel has not learned any intents yet")
+        X = self.vectorizer.transform(texts)
+        # Uniform class prior, like class_weight="balanced" in the full pipeline
+        jll = (X @ self._weights.T).toarray() - np.asarray(X.sum(axis=1)) * self._norms
+        jll -= jll.max(axis=1, keepdims=True)
+        probs = np.exp(jll)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, texts):
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+    def __getstate__(self):
+        self._compile()
+        return self.__dict__
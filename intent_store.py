@@ -0,0 +1,405 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime
+
+from rule_router import normalize
+
+DEFAULT_DB_PATH = "intents.sqlite3"
+SEED_PATH = "intents.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intents (
+    tag TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    doc TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS patterns (
+    key TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (key, tag)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag TEXT NOT NULL,
+    op TEXT NOT NULL,
+    at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+IntentChange = namedtuple("IntentChange", "version op tag")
+
+
+def _digest(doc):
+    return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+
+def _dedup(items, key=lambda s: s):
+    """``items`` stripped, without blanks or repeats (first spelling wins)."""
+    out, seen = [], set()
+    for item in items:
+        item = item.strip()
+        k = key(item)
+        if item and k and k not in seen:
+            seen.add(k)
+            out.append(item)
+    return out
+
+
+class IntentStore:
+    """The intent catalogue in SQLite, one row per intent.
+
+    Edits touch only the intent they change: its JSON document, its rows
+    in the ``patterns`` index (normalized pattern -> tag, which is how a
+    pattern already owned by another intent is refused) and one row of the
+    ``changes`` log. The log's autoincrement id is the catalogue version
+    and each intent carries the version of its last change.
+
+    Listeners registered with ``subscribe`` get the ``IntentChange``s after
+    every local edit, and ``check`` (polled by ``start``'s thread) delivers
+    edits made by other processes, so each worker rebuilds only the intents
+    that changed. The store is the source of truth: intents.json seeds an
+    empty store, and ``import_file`` applies later edits of the file only
+    to intents nobody has changed through the store. One connection per
+    thread, as in ledger.Ledger.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, interval=2.0):
+        self.path = path
+        self.interval = interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._conn()
+        self._seen = self.version()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection must not cross a fork
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---------------- READING ----------------
+    def intents(self):
+        """The whole catalogue, in catalogue order."""
+        return [json.loads(doc) for doc, in self._conn().execute("SELECT doc FROM intents ORDER BY position")]
+
+    def get(self, tag):
+        row = self._conn().execute("SELECT doc FROM intents WHERE tag = ?", (tag,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, tag):
+        return self._conn().execute("SELECT 1 FROM intents WHERE tag = ?", (tag,)).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+
+    def version(self):
+        return self._conn().execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+
+    def summary(self):
+        """``(tag, version, patterns, responses)`` per intent, for the admin page."""
+        out = []
+        for tag, version, doc in self._conn().execute("SELECT tag, version, doc FROM intents ORDER BY position"):
+            intent = json.loads(doc)
+            out.append({"tag": tag, "version": version, "patterns": len(intent.get("patterns", [])),
+                        "responses": len(intent.get("responses", []))})
+        return out
+
+    def changes_since(self, version):
+        return [IntentChange(*row) for row in self._conn().execute(
+            "SELECT version, op, tag FROM changes WHERE version > ? ORDER BY version", (version,))]
+
+    # ---------------- EDITING ----------------
+    def add_intent(self, tag, patterns, responses, **fields):
+        """Add a new intent; ``fields`` are extra keys such as ``handler``.
+        Raises ValueError if the tag exists or a pattern belongs to another intent."""
+        tag = tag.strip()
+        if not tag:
+            raise ValueError("An intent needs a tag.")
+        intent = dict(tag=tag, patterns=_dedup(patterns, normalize), responses=_dedup(responses), **fields)
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM intents WHERE tag = ?", (tag,)).fetchone():
+                raise ValueError(f"Intent '{tag}' already exists.")
+            self._check_conflicts(conn, tag, intent["patterns"])
+            position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM intents").fetchone()[0]
+            self._put(conn, intent, "add", position)
+        return intent
+
+    def update_intent(self, tag, **fields):
+        """Replace some fields of an intent (``patterns``, ``responses``, ``handler``...)."""
+        for name in ("patterns", "responses"):
+            if name in fields and not (isinstance(fields[name], list) and all(isinstance(v, str) for v in fields[name])):
+                raise ValueError(f"{name} must be a list of strings.")
+        with self._write() as conn:
+            intent = self._get(conn, tag)
+            if "patterns" in fields:
+                fields["patterns"] = _dedup(fields["patterns"], normalize)
+                self._check_conflicts(conn, tag, fields["patterns"])
+            if "responses" in fields:
+                fields["responses"] = _dedup(fields["responses"])
+            intent.update(fields, tag=tag)
+            self._put(conn, intent, "update")
+        return intent
+
+    def delete_intent(self, tag):
+        with self._write() as conn:
+            self._get(conn, tag)
+            conn.execute("DELETE FROM intents WHERE tag = ?", (tag,))
+            conn.execute("DELETE FROM patterns WHERE tag = ?", (tag,))
+            self._log(conn, tag, "delete")
+
+    def add_patterns(self, tag, patterns):
+        """Add patterns to an intent, skipping ones it already has. Returns those added."""
+        with self._write() as conn:
+            intent = self._get(conn, tag)
+            have = {normalize(p) for p in intent.get("patterns", [])}
+            added = [p for p in _dedup(patterns, normalize) if normalize(p) not in have]
+            if added:
+                self._check_conflicts(conn, tag, added)
+                intent["patterns"] = intent.get("patterns", []) + added
+                self._put(conn, intent, "add_patterns")
+        return added
+
+    def remove_patterns(self, tag, patterns):
+        """Remove patterns (compared normalized). Returns how many went."""
+        drop = {normalize(p) for p in patterns}
+        with self._write() as conn:
+            intent = self._get(conn, tag)
+            kept = [p for p in intent.get("patterns", []) if normalize(p) not in drop]
+            removed = len(intent.get("patterns", [])) - len(kept)
+            if removed:
+                intent["patterns"] = kept
+                self._put(conn, intent, "remove_patterns")
+        return removed
+
+    def add_responses(self, tag, responses):
+        with self._write() as conn:
+            intent = self._get(conn, tag)
+            have = set(intent.get("responses", []))
+            added = [r for r in _dedup(responses) if r not in have]
+            if added:
+                intent["responses"] = intent.get("responses", []) + added
+                self._put(conn, intent, "add_responses")
+        return added
+
+    def import_intents(self, intents, prune=False):
+        """Write the intents whose document differs from the stored one, in
+        the given order (new tags go last). ``prune`` deletes the tags not
+        listed. Cross-intent duplicate patterns are kept, as the router and
+        fuzzy index already settle them. Returns the number of changes."""
+        with self._write() as conn:
+            return self._import(conn, intents, prune)
+
+    def import_file(self, path=SEED_PATH, force=False):
+        """Apply the edits made to the seed file ``path`` since it was last
+        imported (checked when its mtime changes, or with ``force``).
+
+        ``meta`` keeps a hash of each tag's last imported seed document. A
+        seed intent is written only if the store never had it, or if its
+        stored document is still that last import. Intents edited or
+        deleted through the store are left alone."""
+        try:
+            stamp = str(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return 0
+        key = f"import:{os.path.abspath(path)}"
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if not force and row and row[0] == stamp:
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            seed = json.load(f).get("intents", [])
+        with self._write() as conn:
+            stored = dict(conn.execute("SELECT tag, doc FROM intents"))
+            imported = {k[len("seed:"):]: v for k, v in conn.execute("SELECT key, value FROM meta WHERE key LIKE 'seed:%'")}
+            apply, digests, listed = [], {}, set()
+            for intent in seed:
+                tag = intent["tag"]
+                if tag in listed:
+                    continue
+                listed.add(tag)
+                doc = json.dumps(intent, ensure_ascii=False)
+                digest, last, current = _digest(doc), imported.get(tag), stored.get(tag)
+                if digest == last:
+                    continue
+                if current == doc:
+                    digests[tag] = digest  # already in the store as the file has it
+                elif (current is None and last is None) or (current is not None and _digest(current) == last):
+                    apply.append(intent)
+                    digests[tag] = digest
+            changed = self._import(conn, apply)
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [(f"seed:{tag}", digest) for tag, digest in digests.items()] + [(key, stamp)])
+        return changed
+
+    def export_file(self, path=SEED_PATH):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"intents": self.intents()}, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    # ---------------- INTERNALS ----------------
+    def _write(self):
+        return _WriteTransaction(self)
+
+    def _import(self, conn, intents, prune=False):
+        changed = 0
+        stored = {tag: (doc, pos) for tag, doc, pos in conn.execute("SELECT tag, doc, position FROM intents")}
+        position = max((pos for _, pos in stored.values()), default=-1) + 1
+        listed = set()
+        for intent in intents:
+            tag = intent["tag"]
+            # Only the first of a repeated tag counts, as the intent map always did
+            if tag in listed:
+                continue
+            listed.add(tag)
+            doc = json.dumps(intent, ensure_ascii=False)
+            old = stored.get(tag)
+            if old is not None and old[0] == doc:
+                continue
+            self._put(conn, intent, "add" if old is None else "update", position if old is None else old[1])
+            stored[tag] = (doc, position if old is None else old[1])
+            position += old is None
+            changed += 1
+        if prune:
+            for tag in set(stored) - listed:
+                conn.execute("DELETE FROM intents WHERE tag = ?", (tag,))
+                conn.execute("DELETE FROM patterns WHERE tag = ?", (tag,))
+                self._log(conn, tag, "delete")
+                changed += 1
+        return changed
+
+    def _get(self, conn, tag):
+        row = conn.execute("SELECT doc FROM intents WHERE tag = ?", (tag,)).fetchone()
+        if row is None:
+            raise KeyError(tag)
+        return json.loads(row[0])
+
+    def _check_conflicts(self, conn, tag, patterns):
+        taken = []
+        for p in patterns:
+            row = conn.execute("SELECT tag FROM patterns WHERE key = ? AND tag != ? LIMIT 1", (normalize(p), tag)).fetchone()
+            if row:
+                taken.append(f"'{p}' ({row[0]})")
+        if taken:
+            raise ValueError("Patterns already used by another intent: " + ", ".join(taken))
+
+    def _put(self, conn, intent, op, position=None):
+        tag = intent["tag"]
+        version = self._log(conn, tag, op)
+        doc = json.dumps(intent, ensure_ascii=False)
+        if position is None:
+            conn.execute("UPDATE intents SET doc = ?, version = ? WHERE tag = ?", (doc, version, tag))
+        else:
+            conn.execute("INSERT OR REPLACE INTO intents (tag, position, doc, version) VALUES (?, ?, ?, ?)",
+                         (tag, position, doc, version))
+        conn.execute("DELETE FROM patterns WHERE tag = ?", (tag,))
+        conn.executemany("INSERT OR IGNORE INTO patterns (key, tag) VALUES (?, ?)",
+                         [(normalize(p), tag) for p in intent.get("patterns", []) if normalize(p)])
+
+    def _log(self, conn, tag, op):
+        return conn.execute("INSERT INTO changes (tag, op, at) VALUES (?, ?, ?)",
+                            (tag, op, datetime.now().isoformat(timespec="seconds"))).lastrowid
+
+    # ---------------- CHANGE EVENTS ----------------
+    def subscribe(self, fn):
+        """Call ``fn(changes)`` with each batch of new ``IntentChange``s."""
+        self._listeners.append(fn)
+
+    def check(self):
+        """Deliver the changes logged since the last call (from any process)."""
+        with self._lock:
+            changes = self.changes_since(self._seen)
+            if not changes:
+                return []
+            self._seen = changes[-1].version
+            for fn in self._listeners:
+                try:
+                    fn(changes)
+                except Exception:
+                    traceback.print_exc()
+        return changes
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="intent-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                traceback.print_exc()
+
+
+class _WriteTransaction:
+    """``with store._write() as conn``: one IMMEDIATE transaction, then the
+    listeners hear about it."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.conn = self.store._conn()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.conn.execute("ROLLBACK")
+            return False
+        self.conn.execute("COMMIT")
+        self.store.check()
+        return False
+
+
+def open_store(path=DEFAULT_DB_PATH, seed_path=SEED_PATH):
+    """The store at ``path``, seeded from ``seed_path`` (see ``import_file``)."""
+    store = IntentStore(path)
+    store.import_file(seed_path)
+    return store
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Import or export the intent catalogue")
+    parser.add_argument("command", choices=["import", "export", "list"])
+    parser.add_argument("file", nargs="?", default=SEED_PATH)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--prune", action="store_true", help="import: delete intents missing from the file")
+    args = parser.parse_args()
+    store = IntentStore(args.db)
+    if args.command == "import":
+        with open(args.file, "r", encoding="utf-8") as f:
+            print(f"{store.import_intents(json.load(f).get('intents', []), prune=args.prune)} intents changed")
+    elif args.command == "export":
+        store.export_file(args.file)
+        print(f"Wrote {len(store)} intents to {args.file}")
+    else:
+        for row in store.summary():
+            print(f"{row['tag']:28} v{row['version']:<6} {row['patterns']:4} patterns {row['responses']:3} responses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = "ledger.sqlite3"
+
+ACCOUNT_FIELDS = ("account_no", "username", "full_name", "balance", "loan", "debit_limit", "credit_limit")
+TX_FIELDS = ("id", "date", "type", "amount", "balance")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_no TEXT PRIMARY KEY,
+    username TEXT,
+    full_name TEXT,
+    balance REAL NOT NULL DEFAULT 0,
+    loan REAL NOT NULL DEFAULT 0,
+    debit_limit REAL NOT NULL DEFAULT 0,
+    credit_limit REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    account_no TEXT NOT NULL,
+    date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    balance REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (account_no, date);
+"""
+
+
+class Ledger:
+    """Accounts and their transactions in a SQLite file.
+
+    Transactions are indexed by ``(account_no, date)`` (the rowid breaks
+    ties), so "last N" and date-range reads touch only the rows they
+    return. Each row carries the running balance after it was posted, so a
+    page of history shows balances without summing what came before it.
+    One connection per thread, as in session_store.SQLiteSessionStore.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._conn()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection must not cross a fork
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---------------- ACCOUNTS ----------------
+    def get_account(self, account_no):
+        row = self._conn().execute(
+            f"SELECT {', '.join(ACCOUNT_FIELDS)} FROM accounts WHERE account_no = ?", (str(account_no),)
+        ).fetchone()
+        return dict(zip(ACCOUNT_FIELDS, row)) if row else None
+
+    def __contains__(self, account_no):
+        return self._conn().execute(
+            "SELECT 1 FROM accounts WHERE account_no = ?", (str(account_no),)
+        ).fetchone() is not None
+
+    def version(self, account_no):
+        """Bumped by every posting; lets caches of derived data (see
+        spending_analytics.py) notice new transactions, in any process."""
+        row = self._conn().execute("SELECT version FROM accounts WHERE account_no = ?", (str(account_no),)).fetchone()
+        return row[0] if row else None
+
+    def open_account(self, account_no, username=None, full_name=None, balance=0.0,
+                     loan=0, debit_limit=0, credit_limit=0):
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO accounts ({', '.join(ACCOUNT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(account_no), username, full_name, balance, loan, debit_limit, credit_limit)
+        )
+
+    def seed(self, users):
+        """Open the accounts in ``users`` (app.users) that are not stored yet,
+        with their transactions. Existing accounts are left as they are."""
+        for username, user in users.items():
+            acct = user.get("account_no")
+            if not acct or acct in self:
+                continue
+            txs = user.get("transactions", [])
+            # Work back from the current balance to the one before the history
+            opening = user.get("balance", 0.0) - sum(t["amount"] for t in txs)
+            self.open_account(acct, username, user.get("full_name"), round(opening, 2),
+                              user.get("loan", 0), user.get("debit_limit", 0), user.get("credit_limit", 0))
+            self.add_transactions(acct, [(t["date"], t["type"], t["amount"]) for t in txs])
+
+    # ---------------- POSTING ----------------
+    def add_transactions(self, account_no, rows):
+        """Post ``(date, type, amount)`` rows in one write transaction and
+        update the account balance. Returns the new balance.
+
+        Rows are posted in date order. A row dated before the account's
+        latest transaction re-computes the running balances from its date
+        on; appending in date order never touches older rows.
+        """
+        rows = sorted(rows, key=lambda r: r[0])
+        account_no = str(account_no)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT balance FROM accounts WHERE account_no = ?", (account_no,)).fetchone()
+            if row is None:
+                raise KeyError(account_no)
+            balance = row[0]
+            if not rows:
+                conn.execute("COMMIT")
+                return balance
+            last = conn.execute(
+                "SELECT date FROM transactions WHERE account_no = ? ORDER BY date DESC, id DESC LIMIT 1", (account_no,)
+            ).fetchone()
+            posted = []
+            for date, kind, amount in rows:
+                balance = round(balance + amount, 2)
+                posted.append((account_no, date, kind, amount, balance))
+            conn.executemany(
+                "INSERT INTO transactions (account_no, date, type, amount, balance) VALUES (?, ?, ?, ?, ?)", posted
+            )
+            if last is not None and rows[0][0] < last[0]:
+                self._rebalance(conn, account_no, rows[0][0], balance)
+            conn.execute("UPDATE accounts SET balance = ?, version = version + 1 WHERE account_no = ?", (balance, account_no))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return balance
+
+    def add_transaction(self, account_no, date, kind, amount):
+        return self.add_transactions(account_no, [(date, kind, amount)])
+
+    def _rebalance(self, conn, account_no, since, closing):
+        before = conn.execute(
+            "SELECT balance FROM transactions WHERE account_no = ? AND date < ? ORDER BY date DESC, id DESC LIMIT 1",
+            (account_no, since)
+        ).fetchone()
+        if before is None:
+            # Nothing earlier: the opening balance is the closing one less every amount
+            total = conn.execute("SELECT SUM(amount) FROM transactions WHERE account_no = ?", (account_no,)).fetchone()[0]
+            balance = round(closing - total, 2)
+        else:
+            balance = before[0]
+        updates = []
+        for tx_id, amount in conn.execute(
+            "SELECT id, amount FROM transactions WHERE account_no = ? AND date >= ? ORDER BY date, id",
+            (account_no, since)
+        ):
+            balance = round(balance + amount, 2)
+            updates.append((balance, tx_id))
+        conn.executemany("UPDATE transactions SET balance = ? WHERE id = ?", updates)
+
+    # ---------------- QUERIES ----------------
+    def last_transactions(self, account_no, n=10, before=None):
+        """The ``n`` newest transactions, newest first. ``before`` is the
+        ``id`` of the last row of the previous page (its ``cursor``)."""
+        sql = f"SELECT {', '.join(TX_FIELDS)} FROM transactions WHERE account_no = ?"
+        params = [str(account_no)]
+        if before is not None:
+            sql += " AND (date, id) < (SELECT date, id FROM transactions WHERE id = ?)"
+            params.append(before)
+        sql += " ORDER BY date DESC, id DESC LIMIT ?"
+        params.append(n)
+        return [dict(zip(TX_FIELDS, r)) for r in self._conn().execute(sql, params)]
+
+    def transactions_between(self, account_no, date_from=None, date_to=None, limit=None):
+        """Transactions dated ``date_from``..``date_to`` (inclusive ISO
+        dates, either may be open), oldest first."""
+        where, params = self._range(account_no, date_from, date_to)
+        sql = f"SELECT {', '.join(TX_FIELDS)} FROM transactions WHERE {where} ORDER BY date, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(zip(TX_FIELDS, r)) for r in self._conn().execute(sql, params)]
+
+    def balance_at(self, account_no, date):
+        """Balance at the end of ``date``, from the running balance snapshot
+        of the last transaction on or before it."""
+        row = self._conn().execute(
+            "SELECT balance FROM transactions WHERE account_no = ? AND date <= ? ORDER BY date DESC, id DESC LIMIT 1",
+            (str(account_no), date[:10] + "\uffff")
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        first = self._conn().execute(
+            "SELECT amount, balance FROM transactions WHERE account_no = ? ORDER BY date, id LIMIT 1", (str(account_no),)
+        ).fetchone()
+        if first is not None:
+            return round(first[1] - first[0], 2)
+        account = self.get_account(account_no)
+        return account["balance"] if account else None
+
+    def category_totals(self, account_no, date_from=None, date_to=None):
+        """``{type: {"count", "total"}}`` over a date range, largest spend first."""
+        where, params = self._range(account_no, date_from, date_to)
+        rows = self._conn().execute(
+            f"SELECT type, COUNT(*), ROUND(SUM(amount), 2) FROM transactions WHERE {where} "
+            "GROUP BY type ORDER BY SUM(amount)", params
+        )
+        return {kind: {"count": count, "total": total} for kind, count, total in rows}
+
+    def history(self, account_no, date_from=None, date_to=None):
+        """``(date, type, amount, balance)`` tuples, oldest first: the
+        column-friendly form for bulk analysis."""
+        where, params = self._range(account_no, date_from, date_to)
+        return self._conn().execute(
+            f"SELECT date, type, amount, balance FROM transactions WHERE {where} ORDER BY date, id", params
+        ).fetchall()
+
+    def transaction_count(self, account_no):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM transactions WHERE account_no = ?", (str(account_no),)
+        ).fetchone()[0]
+
+    @staticmethod
+    def _range(account_no, date_from, date_to):
+        where, params = ["account_no = ?"], [str(account_no)]
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            # Inclusive of the whole day when dates carry a time part
+            where.append("date <= ?")
+            params.append(date_to[:10] + "\uffff")
+        return " AND ".join(where), params
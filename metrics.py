@@ -0,0 +1,390 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import traceback
+from bisect import bisect_left
+
+# Seconds; spans a dict lookup (~1 us) to a slow request
+DEFAULT_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3,
+                   5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------------- METRIC TYPES ----------------
+class _Series:
+    """One labelled series. Each thread counts into its own list, so
+    updates take no lock; readers add the lists up."""
+    __slots__ = ("size", "_local", "_parts", "_lock")
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._parts = []
+        self._lock = threading.Lock()
+
+    def _part(self):
+        part = self._local.part = [0] * self.size
+        with self._lock:
+            self._parts.append(part)
+        return part
+
+    def total(self):
+        with self._lock:
+            parts = [list(p) for p in self._parts]
+        return [sum(column) for column in zip(*parts)] if parts else [0] * self.size
+
+
+class _CounterSeries(_Series):
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        try:
+            part = self._local.part
+        except AttributeError:
+            part = self._part()
+        part[0] += amount
+
+
+class _HistogramSeries(_Series):
+    __slots__ = ("buckets",)
+
+    def __init__(self, buckets):
+        super().__init__(len(buckets) + 2)  # bucket counts, overflow, sum
+        self.buckets = buckets
+
+    def observe(self, value):
+        try:
+            part = self._local.part
+        except AttributeError:
+            part = self._part()
+        part[bisect_left(self.buckets, value)] += 1
+        part[-1] += value
+
+
+class _Metric:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The series for ``values``; hot paths keep it to skip the lookup."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_series())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries(1)
+
+    def inc(self, *labels, amount=1):
+        self.labels(*labels).inc(amount)
+
+    def series(self):
+        return [[list(k), child.total()[0]] for k, child in self._items()]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; ``observe`` is a bisect and two list
+    increments in the calling thread's own counts."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value, *labels):
+        self.labels(*labels).observe(value)
+
+    def series(self):
+        out = []
+        for k, child in self._items():
+            total = child.total()
+            out.append([list(k), total[:-1], total[-1]])
+        return out
+
+
+class Callback:
+    """A counter or gauge read from elsewhere (e.g. cache stats) at export time."""
+
+    def __init__(self, name, help, kind, fn, labelnames=()):
+        self.name, self.help, self.kind, self.labelnames = name, help, kind, tuple(labelnames)
+        self.fn = fn
+
+    def series(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [[list(k), v] for k, v in values.items()]
+
+
+# ---------------- REGISTRY ----------------
+class Registry:
+    """Process-local metrics with Prometheus text export.
+
+    Each worker process ``dump``s its values to ``<directory>/<pid>.json``
+    (``MetricsExporter`` does it in the background) and ``render`` adds up
+    every file with the live values of the current process, so whichever
+    worker serves /metrics reports the totals of all of them.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, kind="gauge", labelnames=()):
+        return self._add(Callback(name, help, kind, fn, labelnames))
+
+    def snapshot(self):
+        snap = {}
+        for name, metric in self.metrics.items():
+            try:
+                series = metric.series()
+            except Exception:
+                traceback.print_exc()
+                continue
+            snap[name] = {"kind": metric.kind, "help": metric.help, "labelnames": list(metric.labelnames),
+                          "buckets": list(getattr(metric, "buckets", ())), "series": series}
+        return snap
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def render(self, directory=None):
+        merged = self.snapshot()
+        if directory and os.path.isdir(directory):
+            own = f"{os.getpid()}.json"
+            for name in os.listdir(directory):
+                if not name.endswith(".json") or name == own:
+                    continue
+                try:
+                    with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                        _merge(merged, json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return _render(merged)
+
+
+def _merge(into, snap):
+    for name, metric in snap.items():
+        target = into.setdefault(name, dict(metric, series=[]))
+        index = {tuple(s[0]): s for s in target["series"]}
+        for s in metric["series"]:
+            mine = index.get(tuple(s[0]))
+            if mine is None:
+                target["series"].append(s)
+                index[tuple(s[0])] = s
+            elif metric["kind"] == "histogram":
+                mine[1] = [a + b for a, b in zip(mine[1], s[1])]
+                mine[2] += s[2]
+            else:
+                mine[1] += s[1]
+
+
+def _render(snap):
+    out = []
+    for name, metric in sorted(snap.items()):
+        out.append(f"# HELP {name} {metric['help']}")
+        out.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labelnames"]
+        for s in sorted(metric["series"], key=lambda s: s[0]):
+            if metric["kind"] != "histogram":
+                out.append(f"{name}{_labels(names, s[0])} {_number(s[1])}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], s[1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                out.append(f"{name}_bucket{_labels(names + ['le'], s[0] + [le])} {cumulative}")
+            out.append(f"{name}_sum{_labels(names, s[0])} {_number(float(s[2]))}")
+            out.append(f"{name}_count{_labels(names, s[0])} {cumulative}")
+    return "\n".join(out) + "\n"
+
+
+class MetricsExporter:
+    """Dump the registry every ``interval`` seconds on a background thread."""
+
+    def __init__(self, registry, directory, interval=5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._thread = None
+
+    def clear(self):
+        """Forget other processes' files (call once, before workers start)."""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.registry.dump(self.directory)
+            except Exception:
+                traceback.print_exc()
+
+
+# ---------------- PROFILER ----------------
+class RequestProfiler:
+    """Profile the next ``n`` requests, armed from the admin page.
+
+    ``mode="cpu"`` runs each sampled request under cProfile (one at a time;
+    a request arriving while another is being profiled is not sampled) and
+    ``mode="memory"`` traces allocations with tracemalloc from arming until
+    the n-th request ends. The report is kept for ``status``. Disarmed, a
+    request pays for one attribute check.
+    """
+
+    def __init__(self, top=30):
+        self.top = top
+        self.active = False
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self.mode = None
+        self.remaining = 0
+        self.sampled = 0
+        self.report = None
+        self.finished = None
+        self._profile = None
+        self._baseline = None
+
+    def arm(self, requests, mode="cpu"):
+        if mode not in ("cpu", "memory"):
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        with self._lock:
+            self._stop()
+            self.mode, self.remaining, self.sampled = mode, requests, 0
+            self.report, self.finished = None, None
+            if mode == "cpu":
+                self._profile = cProfile.Profile()
+            else:
+                tracemalloc.start(10)
+                self._baseline = tracemalloc.take_snapshot()
+            self.active = requests > 0
+
+    def disarm(self):
+        with self._lock:
+            self._finish()
+
+    def run(self, fn, *args):
+        """Call ``fn(*args)``, profiling it if the profiler is armed."""
+        if not self.active:
+            return fn(*args)
+        profile = self._profile
+        if profile is not None:
+            if not self._busy.acquire(blocking=False):
+                return fn(*args)
+            try:
+                return profile.runcall(fn, *args)
+            finally:
+                self._busy.release()
+                self._count()
+        try:
+            return fn(*args)
+        finally:
+            self._count()
+
+    def _count(self):
+        with self._lock:
+            if not self.active:
+                return
+            self.sampled += 1
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self._finish()
+
+    def _finish(self):
+        if self.mode == "cpu" and self._profile is not None:
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            self.report = out.getvalue()
+        elif self.mode == "memory" and tracemalloc.is_tracing():
+            stats = tracemalloc.take_snapshot().compare_to(self._baseline, "lineno")
+            self.report = "\n".join(str(s) for s in stats[:self.top])
+        if self.active or self._profile is not None or self._baseline is not None:
+            self.finished = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._stop()
+
+    def _stop(self):
+        self.active = False
+        self._profile = None
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "mode": self.mode,
+                "remaining": max(self.remaining, 0) if self.active else 0,
+                "sampled": self.sampled,
+                "finished": self.finished,
+                "report": self.report
+            }
+
+
+# ---------------- HOT-PATH METRICS ----------------
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "bankbot_stage_seconds", "Time spent in each /chatbot stage", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "bankbot_chat_request_seconds", "Time spent handling a /chatbot request")
+INTENTS = REGISTRY.counter(
+    "bankbot_intents_total", "Replies by intent tag", ("intent",))
+ROUTES = REGISTRY.counter(
+    "bankbot_routes_total", "How the intent was decided (phrase, pattern, slot, model, fuzzy, semantic, fallback)", ("route",))
+ERRORS = REGISTRY.counter(
+    "bankbot_errors_total", "Requests that failed with an exception", ("endpoint",))
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+SNAPSHOT_FILE = "aggregates.json"
+FAILED_TAGS = ("fallback", "error")
+
+
+class QueryAggregates:
+    """Running counters over the query log.
+
+    ``refresh`` tails the log from the last consumed position, so each call
+    costs O(new entries) and every worker process converges on the same
+    numbers. Snapshots (counters plus log position) are persisted every
+    ``snapshot_interval`` seconds so a restart resumes instead of rescanning.
+    """
+
+    def __init__(self, query_log, snapshot_path=None, recent_size=50, snapshot_interval=30.0):
+        self.query_log = query_log
+        self.snapshot_path = snapshot_path or os.path.join(query_log.directory, SNAPSHOT_FILE)
+        self.recent_size = recent_size
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._last_snapshot = 0.0
+        self.reset()
+        self.load_snapshot()
+
+    def reset(self):
+        self.position = None
+        self.total = 0
+        self.failed = Counter()
+        self.by_intent = Counter()
+        self.by_month = Counter()
+        self.by_day = Counter()
+        self.by_user = Counter()
+        self.recent = deque(maxlen=self.recent_size)
+
+    def add(self, entry):
+        tag = entry.get("intent_tag", "N/A")
+        day = entry.get("timestamp", "")[:10]
+        self.total += 1
+        self.by_intent[tag] += 1
+        if tag in FAILED_TAGS:
+            self.failed[tag] += 1
+        if day:
+            self.by_day[day] += 1
+            self.by_month[day[:7]] += 1
+        self.by_user[entry.get("user", "Anonymous")] += 1
+        self.recent.append(entry)
+
+    def refresh(self):
+        with self._lock:
+            entries, self.position = self.query_log.read_from(self.position)
+            for entry in entries:
+                self.add(entry)
+            if entries and time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+                self.save_snapshot()
+        return self
+
+    # ---------------- SNAPSHOTS ----------------
+    def save_snapshot(self):
+        snapshot = {
+            "position": self.position,
+            "total": self.total,
+            "failed": self.failed,
+            "by_intent": self.by_intent,
+            "by_month": self.by_month,
+            "by_day": self.by_day,
+            "by_user": self.by_user,
+            "recent": list(self.recent)
+        }
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp, self.snapshot_path)
+        self._last_snapshot = time.monotonic()
+
+    def load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.position = snapshot["position"]
+            self.total = snapshot["total"]
+            self.failed = Counter(snapshot["failed"])
+            self.by_intent = Counter(snapshot["by_intent"])
+            self.by_month = Counter(snapshot["by_month"])
+            self.by_day = Counter(snapshot["by_day"])
+            self.by_user = Counter(snapshot["by_user"])
+            self.recent.extend(snapshot["recent"])
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self.reset()
+
+    # ---------------- VIEWS ----------------
+    def success_rate(self):
+        if not self.total:
+            return 0
+        return round((self.total - sum(self.failed.values())) / self.total * 100, 1)
+
+    def fallback_rate(self):
+        return round(self.failed["fallback"] / self.total * 100, 1) if self.total else 0
+
+    def error_rate(self):
+        return round(self.failed["error"] / self.total * 100, 1) if self.total else 0
+
+    def recent_queries(self, n=10):
+        return list(self.recent)[-n:][::-1]
+
+    def top_intents(self, n=5):
+        ranked = [(tag, c) for tag, c in self.by_intent.most_common() if tag not in FAILED_TAGS]
+        return [{"intent": tag.replace("_", " ").title(), "count": c} for tag, c in ranked[:n]]
+
+    def monthly_series(self, months=6, today=None):
+        """Query counts for the last ``months`` calendar months, oldest first."""
+        today = today or datetime.now()
+        year, month = today.year, today.month
+        keys = []
+        for _ in range(months):
+            keys.append((year, month))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        keys.reverse()
+        labels = [datetime(y, m, 1).strftime("%b") for y, m in keys]
+        counts = [self.by_month[f"{y:04d}-{m:02d}"] for y, m in keys]
+        return labels, counts
@@ -0,0 +1,91 @@
+import threading
+from array import array
+
+import numpy as np
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class QueryIndex:
+    """Columnar in-memory index over the query log for paged browsing.
+
+    For every logged entry it keeps only its location in the log and
+    interned user/tag ids plus the day as ``YYYYMMDD``, in typed arrays
+    (about 24 bytes per entry). Filters run as numpy masks over these
+    columns; only the entries of the requested page are read from disk.
+
+    The cursor is the ordinal of an entry in the log: a page holds the
+    newest matches strictly before it, and ``next_cursor`` continues from
+    the oldest entry returned.
+    """
+
+    def __init__(self, query_log):
+        self.query_log = query_log
+        self._lock = threading.Lock()
+        self.position = None
+        self.segments = array("I")
+        self.offsets = array("Q")
+        self.users = array("I")
+        self.tags = array("I")
+        self.days = array("I")
+        self.user_ids, self.tag_ids = {}, {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def refresh(self):
+        with self._lock:
+            records, self.position = self.query_log.scan_from(self.position)
+            for seg_num, offset, entry in records:
+                self.segments.append(seg_num)
+                self.offsets.append(offset)
+                self.users.append(_intern(self.user_ids, entry.get("user", "Anonymous")))
+                self.tags.append(_intern(self.tag_ids, entry.get("intent_tag", "N/A")))
+                self.days.append(_day(entry.get("timestamp", "")))
+        return self
+
+    def page(self, cursor=None, limit=DEFAULT_PAGE_SIZE, user=None, tag=None, date_from=None, date_to=None):
+        """Return ``(entries, next_cursor)``, newest first."""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        with self._lock:
+            end = len(self.offsets) if cursor is None else max(0, min(int(cursor), len(self.offsets)))
+            if not end:
+                return [], None
+            mask = np.ones(end, dtype=bool)
+            if user is not None:
+                uid = self.user_ids.get(user)
+                if uid is None:
+                    return [], None
+                mask &= np.frombuffer(self.users, dtype=np.uint32)[:end] == uid
+            if tag is not None:
+                tid = self.tag_ids.get(tag)
+                if tid is None:
+                    return [], None
+                mask &= np.frombuffer(self.tags, dtype=np.uint32)[:end] == tid
+            if date_from or date_to:
+                days = np.frombuffer(self.days, dtype=np.uint32)[:end]
+                if date_from:
+                    mask &= days >= _day(date_from)
+                if date_to:
+                    mask &= days <= _day(date_to)
+                # Drop the view now: arrays cannot grow while a buffer is exported
+                del days
+            hits = np.flatnonzero(mask)[-limit:][::-1]
+            locations = [(self.segments[i], self.offsets[i]) for i in hits]
+            more = len(hits) == limit and bool(mask[:hits[-1]].any())
+        entries = self.query_log.read_at(locations)
+        next_cursor = int(hits[-1]) if more else None
+        return [dict(e, id=int(i)) for i, e in zip(hits, entries) if e is not None], next_cursor
+
+
+def _intern(ids, value):
+    found = ids.get(value)
+    if found is None:
+        found = ids[value] = len(ids)
+    return found
+
+
+def _day(timestamp):
+    digits = timestamp[:10].replace("-", "")
+    return int(digits) if len(digits) == 8 and digits.isdigit() else 0
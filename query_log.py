@@ -0,0 +1,342 @@
+import atexit
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): one writing process per directory
+    fcntl = None
+
+QUERY_LOG_DIR = "query_log"
+LEGACY_LOG_FILE = "user_queries_log.json"
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_RE = re.compile(r"^segment-(\d{6})\.jsonl(\.gz)?$")
+MIGRATION_MARKER = ".migrated"
+LOCK_FILE = ".lock"
+
+
+class QueryLog:
+    """Append-only, line-delimited query log.
+
+    Entries are buffered in memory and written by a background thread in
+    batches (when ``batch_size`` entries are pending or every
+    ``flush_interval`` seconds). Segments rotate at ``segment_max_bytes``;
+    closed segments are compacted to gzip. Several worker processes can
+    share one directory: each batch is a single ``O_APPEND`` write, and
+    picking the segment, writing, rotating and compacting all happen under
+    an exclusive ``flock`` on the directory's lock file, so no process
+    appends to a segment another one is compacting.
+    """
+
+    def __init__(self, directory=QUERY_LOG_DIR, legacy_path=LEGACY_LOG_FILE,
+                 batch_size=64, flush_interval=1.0,
+                 segment_max_bytes=8 * 1024 * 1024, start_writer=True):
+        self.directory = directory
+        self.legacy_path = legacy_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_max_bytes = segment_max_bytes
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._closed = False
+        self._writer = None
+        self._exit_hook = False
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.migrate_legacy()
+        if start_writer:
+            self.start()
+
+    def start(self):
+        """Start the writer thread (again, in a freshly forked worker)."""
+        if self._writer is not None and self._writer.is_alive():
+            return
+        self._closed = False
+        self._writer = threading.Thread(target=self._run_writer, name="query-log-writer", daemon=True)
+        self._writer.start()
+        if not self._exit_hook:
+            atexit.register(self.close)
+            self._exit_hook = True
+
+    # ---------------- WRITING ----------------
+    def append(self, entry):
+        """Queue one entry; never touches the disk on the caller's thread."""
+        with self._cond:
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Write all pending entries now (used by readers and on shutdown)."""
+        self._drain()
+
+    def close(self):
+        if not self._closed and self._writer is not None:
+            with self._cond:
+                self._closed = True
+                self._cond.notify()
+            if self._writer is not threading.current_thread():
+                self._writer.join(timeout=5)
+        self.flush()
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def _drain(self):
+        # Taking a batch and writing it share one lock, so a flush() can never
+        # write newer entries before the writer thread writes older ones
+        with self._drain_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in batch).encode("utf-8")
+        with self._locked():
+            path = self._active_segment()
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size >= self.segment_max_bytes:
+                self._rotate()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the directory lock: the thread lock in this process, and an
+        exclusive flock against the others."""
+        with self._io_lock:
+            if fcntl is None:
+                yield
+                return
+            # Opened per use: a descriptor inherited across fork would share the lock
+            fd = os.open(os.path.join(self.directory, LOCK_FILE), os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    # ---------------- SEGMENTS ----------------
+    def _segments(self):
+        """Return ``(number, path)`` for every segment, oldest first."""
+        found = {}
+        for name in os.listdir(self.directory):
+            m = SEGMENT_RE.match(name)
+            if m:
+                num = int(m.group(1))
+                # A plain segment wins over a gzip one mid-compaction
+                if num not in found or not m.group(2):
+                    found[num] = os.path.join(self.directory, name)
+        return sorted(found.items())
+
+    def _segment_path(self, num, compressed=False):
+        suffix = ".jsonl.gz" if compressed else ".jsonl"
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{num:06d}{suffix}")
+
+    def _active_segment(self):
+        segments = self._segments()
+        if not segments:
+            return self._segment_path(1)
+        num, path = segments[-1]
+        if path.endswith(".gz"):
+            return self._segment_path(num + 1)
+        return path
+
+    def _rotate(self):
+        # Called with the directory lock held
+        segments = self._segments()
+        num = segments[-1][0] if segments else 0
+        open(self._segment_path(num + 1), "a").close()
+        self._compact()
+
+    def compact(self):
+        """Gzip closed segments. Content is kept byte-for-byte so that
+        ``read_from`` positions stay valid across compaction."""
+        with self._locked():
+            self._compact()
+
+    def _compact(self):
+        segments = self._segments()
+        for num, path in segments[:-1]:
+            if path.endswith(".gz"):
+                continue
+            target = self._segment_path(num, compressed=True)
+            tmp = target + ".tmp"
+            with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, target)
+            os.remove(path)
+
+    # ---------------- MIGRATION ----------------
+    def migrate_legacy(self):
+        """Import the old JSON-array log once into the first segment."""
+        marker = os.path.join(self.directory, MIGRATION_MARKER)
+        if os.path.exists(marker) or not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except json.JSONDecodeError:
+            legacy = []
+        if not isinstance(legacy, list):
+            legacy = []
+        with self._locked():
+            if os.path.exists(marker):
+                return
+            if legacy and not self._segments():
+                self._write_lines(self._segment_path(1), legacy)
+            with open(marker, "w", encoding="utf-8") as f:
+                f.write(f"{self.legacy_path} {len(legacy)}\n")
+
+    def _write_lines(self, path, entries):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+    # ---------------- READING ----------------
+    def iter_entries(self, reverse=False):
+        """Yield every logged entry, oldest first (or newest first)."""
+        self.flush()
+        segments = self._segments()
+        if reverse:
+            for _, path in reversed(segments):
+                yield from reversed(list(_read_segment(path)))
+        else:
+            for _, path in segments:
+                yield from _read_segment(path)
+
+    def tail(self, n):
+        """Return the last ``n`` entries, oldest first."""
+        out = []
+        for entry in self.iter_entries(reverse=True):
+            if len(out) >= n:
+                break
+            out.append(entry)
+        return out[::-1]
+
+    def count(self):
+        return sum(1 for _ in self.iter_entries())
+
+    def read_from(self, position=None):
+        """Return ``(entries, position)`` for everything logged after ``position``.
+
+        ``position`` is the ``[segment, byte offset]`` pair returned by the
+        previous call (``None`` reads from the start), so consumers can tail
+        the log incrementally, including entries written by other processes.
+        """
+        records, position = self.scan_from(position)
+        return [entry for _, _, entry in records], position
+
+    def scan_from(self, position=None):
+        """Like ``read_from`` but returns ``(segment, offset, entry)`` records,
+        so indexes can fetch single entries later with ``read_at``."""
+        self.flush()
+        num, offset = position or (0, 0)
+        records = []
+        segments = [s for s in self._segments() if s[0] >= num]
+        for i, (seg_num, path) in enumerate(segments):
+            start = offset if seg_num == num else 0
+            data = _read_bytes(path, start)
+            if i == len(segments) - 1:
+                # The active segment may end in a line another process is still writing
+                data = data[:data.rfind(b"\n") + 1]
+            pos = 0
+            while pos < len(data):
+                end = data.find(b"\n", pos)
+                end = len(data) if end < 0 else end + 1
+                entry = _parse_line(data[pos:end].decode("utf-8", errors="replace"))
+                if entry is not None:
+                    records.append((seg_num, start + pos, entry))
+                pos = end
+            num, offset = seg_num, start + len(data)
+        return records, [num, offset]
+
+    def read_at(self, locations):
+        """Fetch the entries at ``(segment, offset)`` locations, in the given order."""
+        paths = dict(self._segments())
+        by_segment = {}
+        for i, (seg_num, offset) in enumerate(locations):
+            by_segment.setdefault(seg_num, []).append((offset, i))
+        out = [None] * len(locations)
+        for seg_num, wanted in by_segment.items():
+            path = paths.get(seg_num)
+            if path is None:
+                continue
+            for (offset, i), line in zip(sorted(wanted), _read_lines_at(path, sorted(o for o, _ in wanted))):
+                out[i] = _parse_line(line)
+        return out
+
+def _parse_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _read_segment(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                entry = _parse_line(line)
+                if entry is not None:
+                    yield entry
+    except FileNotFoundError:
+        # Compacted between listing and reading: read the gzip copy instead
+        if not path.endswith(".gz") and os.path.exists(path + ".gz"):
+            yield from _read_segment(path + ".gz")
+
+
+def _read_bytes(path, start):
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rb") as f:
+            f.seek(start)
+            return f.read()
+    except FileNotFoundError:
+        if not path.endswith(".gz") and os.path.exists(path + ".gz"):
+            return _read_bytes(path + ".gz", start)
+        return b""
+
+
+def _read_lines_at(path, offsets):
+    """Read one line at each ascending byte offset, opening the file once."""
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rb") as f:
+            lines = []
+            for offset in offsets:
+                f.seek(offset)
+                lines.append(f.readline().decode("utf-8", errors="replace"))
+            return lines
+    except FileNotFoundError:
+        if not path.endswith(".gz") and os.path.exists(path + ".gz"):
+            return _read_lines_at(path + ".gz", offsets)
+        return [""] * len(offsets)
@@ -0,0 +1,203 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from compact_model import compact_path
+from semantic_index import semantic_path
+
+MODELS_DIR = "models"
+TRAIN_NICENESS = 10  # the trainer yields the CPU to the web workers on the same host
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_intent_model.py")
+CURRENT_POINTER = "CURRENT"
+KEEP_VERSIONS = 3
+
+
+def current_model_path(models_dir=MODELS_DIR, default=None):
+    """Path of the newest published model version, or ``default``."""
+    pointer = os.path.join(models_dir, CURRENT_POINTER)
+    try:
+        with open(pointer, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return default
+    path = os.path.join(models_dir, name)
+    return path if name and os.path.exists(path) else default
+
+
+class RetrainService:
+    """Background model retraining with coalescing.
+
+    ``submit`` only records a job and returns immediately. A single worker
+    thread waits ``debounce`` seconds so bursts of intent edits collapse
+    into one run, trains in a separate process, writes the model under a
+    versioned name, publishes it through the ``CURRENT`` pointer and calls
+    ``on_model_ready(path, version)``.
+    """
+
+    def __init__(self, on_model_ready, models_dir=MODELS_DIR, debounce=2.0, history=20,
+                 mode="full", full_refit_every=0, start=True, intents_path=None):
+        self.on_model_ready = on_model_ready
+        self.models_dir = models_dir
+        self.intents_path = intents_path  # catalogue to train on (the trainer's default if None)
+        self.debounce = debounce
+        self.history = history
+        # "incremental" updates a hashed naive Bayes model with only the
+        # changed patterns; every ``full_refit_every`` runs (0 = never) a full
+        # TF-IDF + LogisticRegression refit is done instead.
+        self.mode = mode
+        self.full_refit_every = full_refit_every
+        self._runs = 0
+
+        self._cond = threading.Condition()
+        self._jobs = []
+        self._next_id = 1
+        self._running = None
+        self._last_version = None
+        self._last_error = None
+        self._worker = None
+
+        os.makedirs(self.models_dir, exist_ok=True)
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the worker thread (again, in a freshly forked worker)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._run, name="retrain-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, reason=""):
+        with self._cond:
+            job = {
+                "id": self._next_id,
+                "reason": reason,
+                "status": "queued",
+                "submitted": datetime.now().isoformat(),
+                "run": None
+            }
+            self._next_id += 1
+            self._jobs.append(job)
+            del self._jobs[:-self.history]
+            self._cond.notify()
+            return dict(job)
+
+    def status(self, job_id=None):
+        with self._cond:
+            if job_id is not None:
+                job = next((j for j in self._jobs if j["id"] == job_id), None)
+                return dict(job) if job else None
+            queued = sum(1 for j in self._jobs if j["status"] == "queued")
+            return {
+                "state": "training" if self._running else ("pending" if queued else "idle"),
+                "queued": queued,
+                "running": dict(self._running) if self._running else None,
+                "current_version": self._last_version,
+                "last_error": self._last_error,
+                "jobs": [dict(j) for j in reversed(self._jobs)]
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not any(j["status"] == "queued" for j in self._jobs):
+                    self._cond.wait()
+            # Let a burst of edits settle before taking the batch
+            time.sleep(self.debounce)
+            with self._cond:
+                batch = [j for j in self._jobs if j["status"] == "queued"]
+                version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+                mode = self._next_mode()
+                self._running = {"version": version, "mode": mode, "jobs": [j["id"] for j in batch], "started": datetime.now().isoformat()}
+                for j in batch:
+                    j["status"] = "training"
+                    j["run"] = version
+                    j["mode"] = mode
+            status, error = "done", None
+            start = time.monotonic()
+            try:
+                path = self._train(version, mode)
+                self.on_model_ready(path, version)
+                self._publish(path)
+            except Exception:
+                status, error = "failed", traceback.format_exc(limit=3)
+                traceback.print_exc()
+            with self._cond:
+                for j in batch:
+                    j["status"] = status
+                    j["duration"] = round(time.monotonic() - start, 2)
+                self._running = None
+                if status == "done":
+                    self._last_version = version
+                self._last_error = error
+
+    def _next_mode(self):
+        self._runs += 1
+        if self.mode == "incremental" and not (self.full_refit_every and self._runs % self.full_refit_every == 0):
+            return "incremental"
+        return "full"
+
+    def _train(self, version, mode="full"):
+        # A fresh interpreter: no forked web-worker threads, and the training
+        # stack (and its memory) never lives in the serving process
+        path = os.path.join(self.models_dir, f"intent_model-{version}.pkl")
+        cmd = [sys.executable, TRAIN_SCRIPT, path, "--mode", mode, "--nice", str(TRAIN_NICENESS)]
+        if self.intents_path:
+            cmd += ["--intents", self.intents_path]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0 or not os.path.exists(path):
+            raise RuntimeError(f"Training failed:\n{result.stderr[-2000:]}")
+        return path
+
+    def _publish(self, path):
+        pointer = os.path.join(self.models_dir, CURRENT_POINTER)
+        tmp = f"{pointer}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(path))
+        os.replace(tmp, pointer)
+        versions = sorted(n for n in os.listdir(self.models_dir) if n.startswith("intent_model-") and n.endswith(".pkl"))
+        for name in versions[:-KEEP_VERSIONS]:
+            os.remove(os.path.join(self.models_dir, name))
+            for derived in (compact_path, semantic_path):
+                extra = derived(os.path.join(self.models_dir, name))
+                if os.path.exists(extra):
+                    os.remove(extra)
+
+
+class ModelWatcher:
+    """Reload the assistant when another process publishes a new model.
+
+    Each web worker runs one of these; it polls the ``CURRENT`` pointer every
+    ``interval`` seconds on its own thread, so requests never pay for it.
+    """
+
+    def __init__(self, assistant, models_dir=MODELS_DIR, interval=2.0):
+        self.assistant = assistant
+        self.models_dir = models_dir
+        self.interval = interval
+        self._thread = None
+
+    def check(self):
+        path = current_model_path(self.models_dir)
+        if path and os.path.basename(path) != self.assistant.state.version:
+            self.assistant.load_model(path)
+            return True
+        return False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,147 @@
+import re
+import threading
+
+ACCOUNT_NUMBER = r"\d{6,12}"
+LOAN_TYPES = r"(?:personal|home|car|education|gold|business)(?: loan)?"
+
+# What each {placeholder} in an intents.json pattern may match
+PLACEHOLDERS = {
+    "account_number": ACCOUNT_NUMBER,
+    "amount": r"\d+(?:\.\d+)?",
+    "card_type": r"credit|debit",
+}
+DEFAULT_PLACEHOLDER = r".+?"
+
+_SPACES = re.compile(r"\s+")
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def normalize(text):
+    return _SPACES.sub(" ", text.lower()).strip().rstrip("?!.").strip()
+
+
+class RuleRouter:
+    """Resolve the obvious messages before the classifier runs.
+
+    Built from the intent catalogue: plain patterns go into a dict keyed by
+    their normalized text, and patterns with ``{placeholders}`` plus the
+    loan-type slot are compiled into one alternation regex with a named
+    group per rule. ``route`` returns ``(tag, kind)`` or ``(None, None)``.
+    ``patched`` applies catalogue edits without re-reading the rest.
+    """
+
+    def __init__(self, intents):
+        self.owners = {}  # normalized phrase -> tags listing it, in catalogue order
+        self.templates = {}  # tag -> regexes of its placeholder patterns, in catalogue order
+        self._add(intents)
+        self._compile()
+
+    def _add(self, intents):
+        for intent in intents:
+            tag = intent["tag"]
+            for pattern in intent.get("patterns", []):
+                if "{" in pattern:
+                    self.templates.setdefault(tag, []).append(_pattern_regex(pattern))
+                    continue
+                key = normalize(pattern)
+                if not key:
+                    continue
+                tags = self.owners.setdefault(key, [])
+                if tag not in tags:
+                    tags.append(tag)
+
+    def _compile(self, previous=None):
+        # A phrase listed under two intents is left to the classifier
+        self.phrases = {key: tags[0] for key, tags in self.owners.items() if len(tags) == 1}
+        if previous is not None and list(previous.templates.items()) == list(self.templates.items()):
+            self.group_tags, self.rules = previous.group_tags, previous.rules
+            return
+        alternatives, self.group_tags = [], {}
+        for tag, regexes in self.templates.items():
+            for regex in regexes:
+                group = f"p{len(self.group_tags)}"
+                self.group_tags[group] = tag
+                alternatives.append(f"(?P<{group}>{regex})")
+        alternatives.append(f"(?P<loan_type>{LOAN_TYPES})")
+        self.rules = re.compile("|".join(alternatives))
+
+    def patched(self, changed):
+        """A copy with the patterns of the ``changed`` intents (tag -> intent,
+        or ``None`` if deleted) replaced; the regex is only recompiled when
+        a placeholder pattern changed."""
+        router = RuleRouter.__new__(RuleRouter)
+        router.owners = {}
+        for key, tags in self.owners.items():
+            tags = [t for t in tags if t not in changed]
+            if tags:
+                router.owners[key] = tags
+        # An edited intent keeps its place in the alternation; new ones go last
+        router.templates = {tag: ([] if tag in changed else regexes) for tag, regexes in self.templates.items()}
+        router._add([intent for intent in changed.values() if intent is not None])
+        router.templates = {tag: regexes for tag, regexes in router.templates.items() if regexes}
+        router._compile(previous=self)
+        return router
+
+    def route(self, text, session):
+        key = normalize(text)
+        tag = self.phrases.get(key)
+        if tag is not None:
+            return tag, "phrase"
+        m = self.rules.fullmatch(key)
+        if m is None:
+            return None, None
+        if m.lastgroup == "loan_type":
+            return ("loan", "slot") if session.awaiting_loan_type else (None, None)
+        return self.group_tags[m.lastgroup], "pattern"
+
+
+def _pattern_regex(pattern):
+    parts, pos = [], 0
+    key = normalize(pattern)
+    for m in _PLACEHOLDER.finditer(key):
+        parts.append(re.escape(key[pos:m.start()]))
+        parts.append(f"(?:{PLACEHOLDERS.get(m.group(1), DEFAULT_PLACEHOLDER)})")
+        pos = m.end()
+    parts.append(re.escape(key[pos:]))
+    return "".join(parts)
+
+
+class RouterMetrics:
+    """Hit/miss counters for the rule router.
+
+    ``latency_saved`` estimates the time the hits would have spent in the
+    classifier path, using the running average cost of the misses.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = 0
+        self.route_seconds = 0.0
+        self.classify_seconds = 0.0
+
+    def record_hit(self, kind, route_seconds):
+        with self._lock:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            self.route_seconds += route_seconds
+
+    def record_miss(self, route_seconds, classify_seconds):
+        with self._lock:
+            self.misses += 1
+            self.route_seconds += route_seconds
+            self.classify_seconds += classify_seconds
+
+    def snapshot(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            avg_classify = self.classify_seconds / self.misses if self.misses else 0.0
+            avg_route = self.route_seconds / total if total else 0.0
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": round(hits / total * 100, 1) if total else 0,
+                "avg_route_us": round(avg_route * 1e6, 2),
+                "avg_classify_us": round(avg_classify * 1e6, 2),
+                "latency_saved_ms": round(hits * (avg_classify - avg_route) * 1e3, 2)
+            }
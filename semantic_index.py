@@ -0,0 +1,222 @@
+import argparse
+import os
+import re
+
+import numpy as np
+
+from compact_model import mmap_npz
+
+FORMAT_VERSION = 1
+DIMENSIONS = 128
+NGRAM_RANGE = (2, 4)
+PLACEHOLDER_RE = re.compile(r"\{\w+\}")
+_SPACES = re.compile(r"\s\s+")
+
+
+def semantic_path(model_path):
+    """Where the pattern vectors of ``model_path`` live: ``x.pkl`` -> ``x.vectors.npz``."""
+    return os.path.splitext(model_path)[0] + ".vectors.npz"
+
+
+def pattern_rows(intents):
+    """``(texts, tags)`` of the catalogue's patterns, cleaned like the
+    training data (placeholders removed, lower case), without repeats."""
+    rows = {}
+    for intent in intents:
+        for pattern in intent.get("patterns", []):
+            text = PLACEHOLDER_RE.sub("", pattern).strip().lower()
+            if text:
+                rows.setdefault((text, intent["tag"]), None)
+    return [t for t, _ in rows], [tag for _, tag in rows]
+
+
+def char_ngrams(text, lo, hi):
+    """Same n-grams as TfidfVectorizer(analyzer="char_wb"): per word, padded
+    with a space on each side; a word shorter than n counts once."""
+    ngrams = []
+    for w in _SPACES.sub(" ", text).split():
+        w = f" {w} "
+        for n in range(lo, hi + 1):
+            offset = 0
+            ngrams.append(w[:n])
+            while offset + n < len(w):
+                offset += 1
+                ngrams.append(w[offset:offset + n])
+            if offset == 0:
+                break
+    return ngrams
+
+
+class SemanticIndex:
+    """Nearest-pattern retriever for messages the classifier is unsure of.
+
+    Patterns are embedded with character n-gram TF-IDF reduced by a
+    truncated SVD (LSA), fitted at train time, and kept as unit rows of a
+    dense ``vectors`` matrix. A message is embedded the same way with plain
+    NumPy (n-gram lookups, one weighted gather of projection rows) and
+    answered with one matrix-vector product: the tag of the most similar
+    pattern, if the cosine similarity reaches the threshold.
+
+    Saved as an uncompressed ``.npz`` and memory-mapped on load, like the
+    compact model. ``patched`` folds edited intents into the existing space
+    without refitting; new n-grams count from the next full build.
+    """
+
+    def __init__(self, arrays):
+        if int(arrays["format"]) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported semantic index format {int(arrays['format'])}")
+        self.vocabulary = {term: i for i, term in enumerate(arrays["terms"].tolist())}
+        self.idf = arrays["idf"]
+        self.projection = arrays["projection"]  # n-gram -> dimensions
+        self.ngram_range = tuple(int(n) for n in arrays["ngram_range"])
+        self.texts = arrays["texts"].tolist()
+        self.tags = arrays["tags"].tolist()
+        self.vectors = arrays["vectors"]
+
+    @classmethod
+    def build(cls, intents, dimensions=DIMENSIONS):
+        """Fit the embedding on the catalogue's patterns (needs sklearn)."""
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        texts, tags = pattern_rows(intents)
+        if not texts:
+            raise ValueError("No patterns to index")
+        tfidf = TfidfVectorizer(analyzer="char_wb", ngram_range=NGRAM_RANGE, sublinear_tf=True)
+        X = tfidf.fit_transform(texts)
+        k = min(dimensions, X.shape[0] - 1, X.shape[1] - 1)
+        if k >= 2:
+            projection = TruncatedSVD(k, random_state=0).fit(X).components_.T
+        else:
+            projection = np.eye(X.shape[1])
+        index = cls.__new__(cls)
+        index.vocabulary = {term: i for i, term in enumerate(sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get))}
+        index.idf = tfidf.idf_
+        # Feature-major so a message's n-grams gather contiguous rows
+        index.projection = np.ascontiguousarray(projection, dtype=np.float32)
+        index.ngram_range = NGRAM_RANGE
+        return index._with_rows(texts, tags, index.embed(texts))
+
+    @classmethod
+    def load(cls, path):
+        return cls(mmap_npz(path))
+
+    def save(self, path):
+        arrays = {
+            "format": np.array(FORMAT_VERSION),
+            "terms": np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str),
+            "idf": np.asarray(self.idf),
+            "projection": np.asarray(self.projection),
+            "ngram_range": np.array(self.ngram_range),
+            "texts": np.array(self.texts, dtype=str),
+            "tags": np.array(self.tags, dtype=str),
+            "vectors": np.asarray(self.vectors),
+        }
+        # Write atomically so readers never see a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def embed(self, texts):
+        """Unit-length embeddings, one row per text (zeros if no known n-gram)."""
+        lo, hi = self.ngram_range
+        vocabulary = self.vocabulary
+        indices, values, starts = [], [], []
+        for text in texts:
+            counts = {}
+            for gram in char_ngrams(text.lower(), lo, hi):
+                j = vocabulary.get(gram)
+                if j is not None:
+                    counts[j] = counts.get(j, 0) + 1
+            starts.append(len(indices))
+            indices.extend(counts)
+            values.extend(counts.values())
+        out = np.zeros((len(texts), self.projection.shape[1]), dtype=np.float32)
+        if not indices:
+            return out
+        idx = np.asarray(indices)
+        weights = (np.log(np.asarray(values, dtype=np.float64)) + 1) * self.idf[idx]
+        sizes = np.diff(starts + [len(indices)])
+        docs = np.repeat(np.arange(len(texts)), sizes)
+        weights /= np.sqrt(np.bincount(docs, weights * weights, minlength=len(texts)))[docs]
+        present = sizes > 0
+        out[present] = np.add.reduceat(self.projection[idx] * weights[:, None].astype(np.float32),
+                                       np.asarray(starts)[present], axis=0)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def best_match(self, text, threshold):
+        """``(tag, similarity)`` of the closest pattern, or ``(None, similarity)``
+        when it is below ``threshold``."""
+        if not self.tags:
+            return None, 0.0
+        query = self.embed([text])[0]
+        if not query.any():
+            return None, 0.0
+        sims = self.vectors @ query
+        best = int(np.argmax(sims))
+        similarity = float(sims[best])
+        return (self.tags[best], similarity) if similarity >= threshold else (None, similarity)
+
+    def best_matches(self, texts, threshold):
+        """``best_match`` for many texts with one matrix product."""
+        if not self.tags or not texts:
+            return [(None, 0.0)] * len(texts)
+        sims = self.embed(texts) @ np.asarray(self.vectors).T
+        best = sims.argmax(axis=1)
+        out = []
+        for i, j in enumerate(best):
+            similarity = float(sims[i, j])
+            out.append((self.tags[j], similarity) if similarity >= threshold and similarity > 0 else (None, similarity))
+        return out
+
+    def patched(self, changed):
+        """A copy with the patterns of the ``changed`` intents (tag -> intent,
+        or ``None`` if deleted) re-embedded in the current space; the other
+        rows are reused as they are."""
+        keep = [i for i, tag in enumerate(self.tags) if tag not in changed]
+        texts, tags = pattern_rows([intent for intent in changed.values() if intent is not None])
+        vectors = np.concatenate([np.asarray(self.vectors)[keep], self.embed(texts)])
+        return self._with_rows([self.texts[i] for i in keep] + texts, [self.tags[i] for i in keep] + tags, vectors)
+
+    def synced(self, intents):
+        """This index brought in line with ``intents``, patching only the
+        intents whose patterns differ (``self`` if none do)."""
+        have, want = {}, {}
+        for text, tag in zip(self.texts, self.tags):
+            have.setdefault(tag, set()).add(text)
+        texts, tags = pattern_rows(intents)
+        for text, tag in zip(texts, tags):
+            want.setdefault(tag, set()).add(text)
+        by_tag = {intent["tag"]: intent for intent in intents}
+        changed = {tag: by_tag.get(tag) for tag in set(have) | set(want) if have.get(tag) != want.get(tag)}
+        return self.patched(changed) if changed else self
+
+    def _with_rows(self, texts, tags, vectors):
+        index = SemanticIndex.__new__(SemanticIndex)
+        index.vocabulary, index.idf, index.projection, index.ngram_range = (
+            self.vocabulary, self.idf, self.projection, self.ngram_range)
+        index.texts, index.tags, index.vectors = texts, tags, vectors
+        return index
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Build the pattern vectors for a model from a catalogue")
+    parser.add_argument("model_path", nargs="?", default="intent_model.pkl")
+    parser.add_argument("--intents", default="intents.json", help="intents.json or an intent store")
+    parser.add_argument("--dimensions", type=int, default=DIMENSIONS)
+    args = parser.parse_args()
+    from train_intent_model import read_catalogue
+    index = SemanticIndex.build(read_catalogue(args.intents), args.dimensions)
+    index.save(semantic_path(args.model_path))
+    print(f"Indexed {len(index)} patterns in {index.projection.shape[1]} dimensions to {semantic_path(args.model_path)}")
+
+
+if __name__ == "__main__":
+    main()
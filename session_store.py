@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+
+DEFAULT_TTL = 30 * 60
+DEFAULT_DB_PATH = "chat_sessions.sqlite3"
+
+
+@dataclass(slots=True)
+class ChatState:
+    """Per-conversation dialogue state, kept server-side."""
+    account_no: str = None
+    awaiting_account_input: bool = False
+    awaiting_intent: str = None
+    awaiting_loan_type: bool = False
+    loan_type: str = None
+    completed: bool = False
+    slots: dict = field(default_factory=dict)
+
+    def dumps(self):
+        # Keyed by field name, so adding or reordering fields never shifts
+        # values; fields at their default are left out (loads restores them)
+        values = {f: v for f, v in ((f, getattr(self, f)) for f in FIELD_NAMES) if v != DEFAULTS[f]}
+        return json.dumps(values, separators=(",", ":"), ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, data):
+        """Rebuild a state from ``dumps``; None for any other layout (the
+        caller starts a fresh conversation). Unknown keys are ignored and
+        missing ones take their defaults."""
+        values = json.loads(data)
+        if not isinstance(values, dict):
+            return None
+        return cls(**{f: values[f] for f in FIELD_NAMES if f in values})
+
+
+FIELD_NAMES = [f.name for f in fields(ChatState)]
+DEFAULTS = {f: getattr(ChatState(), f) for f in FIELD_NAMES}
+
+
+class MemorySessionStore:
+    """In-process store with TTL and LRU bounds; states are kept as objects,
+    so nothing is serialized per turn. Suits a single worker process."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_sessions=100000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._data = OrderedDict()  # sid -> (expires, state)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            if item[0] < now:
+                del self._data[sid]
+                return None
+            return item[1]
+
+    def put(self, sid, state):
+        now = time.monotonic()
+        with self._lock:
+            self._data[sid] = (now + self.ttl, state)
+            self._data.move_to_end(sid)
+            # Oldest-touched first, so expired sessions sit at the front
+            while self._data:
+                oldest_sid, (expires, _) = next(iter(self._data.items()))
+                if expires >= now and len(self._data) <= self.max_sessions:
+                    break
+                del self._data[oldest_sid]
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteSessionStore:
+    """Shared store for multi-worker deployments: one small row per session
+    in a WAL-mode SQLite file, one connection per thread."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, ttl=DEFAULT_TTL, purge_every=500):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS chat_sessions (sid TEXT PRIMARY KEY, state TEXT NOT NULL, expires REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_expires ON chat_sessions (expires)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection must not cross a fork
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT state FROM chat_sessions WHERE sid = ? AND expires >= ?", (sid, time.time())
+        ).fetchone()
+        return ChatState.loads(row[0]) if row else None
+
+    def put(self, sid, state):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO chat_sessions (sid, state, expires) VALUES (?, ?, ?)",
+            (sid, state.dumps(), time.time() + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM chat_sessions WHERE expires < ?", (time.time(),))
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM chat_sessions WHERE sid = ?", (sid,))
+
+
+def make_session_store(backend="memory", ttl=DEFAULT_TTL, path=DEFAULT_DB_PATH):
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, ttl=ttl)
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl)
+    raise ValueError(f"Unknown session backend: {backend}")
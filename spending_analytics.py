@@ -0,0 +1,192 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+ROLLING_MONTHS = 3
+ANOMALY_SCORE = 3.5  # robust z-score (median/MAD) above which a debit is flagged
+MIN_CATEGORY_SIZE = 5  # fewer debits than this in a category: too few to call one unusual
+
+_MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+_MONTH_RE = re.compile(r"\b(" + "|".join(_MONTHS) + r")[a-z]*\b(?:\s+(\d{4}))?")
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def _stem(word):
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _stems(text):
+    return {_stem(w) for w in _WORD_RE.findall(text.lower())}
+
+
+def parse_month(text, today=None):
+    """The month a question is about: "this month", "last month" or a month
+    name with an optional year (the latest one not in the future).
+    Returns a ``pandas.Period`` or ``None`` when no month is mentioned."""
+    import pandas as pd  # imported on first use: pandas is a large part of startup time
+
+    current = pd.Period(today or date.today(), freq="M")
+    if "last month" in text:
+        return current - 1
+    if "this month" in text:
+        return current
+    m = _MONTH_RE.search(text)
+    if m is None:
+        return None
+    month = _MONTHS.index(m.group(1)) + 1
+    if m.group(2):
+        return pd.Period(year=int(m.group(2)), month=month, freq="M")
+    period = pd.Period(year=current.year, month=month, freq="M")
+    return period if period <= current else period - 12
+
+
+class AccountInsights:
+    """Spending aggregates for one account at one ledger version, computed
+    with vectorized pandas operations over its whole history."""
+
+    def __init__(self, rows):
+        import pandas as pd
+
+        df = pd.DataFrame.from_records(rows, columns=["date", "type", "amount", "balance"])
+        df["month"] = pd.to_datetime(df["date"].str[:10]).dt.to_period("M")
+        df["spent"] = -df["amount"].clip(upper=0)
+        df["income"] = df["amount"].clip(lower=0)
+        self.transactions = len(df)
+        self._reports = {}
+
+        # Month x category spending, and the category totals over all months
+        self.by_month_category = df.pivot_table(index="month", columns="type", values="spent",
+                                                aggfunc="sum", fill_value=0.0)
+        categories = self.by_month_category.sum()
+        self.categories = categories[categories > 0].sort_values(ascending=False)
+
+        # Monthly cash flow with no gaps, so rolling windows count calendar months
+        flow = df.groupby("month")[["income", "spent"]].sum()
+        if len(flow):
+            flow = flow.reindex(pd.period_range(flow.index.min(), flow.index.max(), freq="M"), fill_value=0.0)
+        flow["net"] = flow["income"] - flow["spent"]
+        flow["spent_avg"] = flow["spent"].rolling(ROLLING_MONTHS, min_periods=1).mean()
+        flow["net_avg"] = flow["net"].rolling(ROLLING_MONTHS, min_periods=1).mean()
+        self.cash_flow = flow
+
+        # Debits far above what the account usually spends in that category
+        debits = df[df["amount"] < 0]
+        spent = debits.groupby("type")["spent"]
+        median = spent.transform("median")
+        mad = (debits["spent"] - median).abs().groupby(debits["type"]).transform("median")
+        score = 0.6745 * (debits["spent"] - median) / mad.replace(0, np.nan)
+        flagged = (score > ANOMALY_SCORE) & (spent.transform("size") >= MIN_CATEGORY_SIZE)
+        self.anomalies = debits.loc[flagged, ["date", "type", "amount"]].assign(score=score[flagged])
+
+    def match_category(self, text):
+        """The account's category named in ``text`` ("groceries" finds
+        "Grocery"), longest name first; ``None`` if there is none."""
+        words = _stems(text)
+        for name in sorted(self.by_month_category.columns, key=len, reverse=True):
+            if _stems(name) <= words:
+                return name
+        return None
+
+    def spent(self, month, category=None):
+        if month not in self.by_month_category.index:
+            return 0.0
+        row = self.by_month_category.loc[month]
+        return float(row.get(category, 0.0) if category else row.sum())
+
+    def income(self, month):
+        return float(self.cash_flow["income"].get(month, 0.0))
+
+    def top_categories(self, month, n=3):
+        if month not in self.by_month_category.index:
+            return []
+        row = self.by_month_category.loc[month]
+        row = row[row > 0].nlargest(n)
+        return [(name, float(value)) for name, value in row.items()]
+
+    def month_anomalies(self, month):
+        return self.anomalies[self.anomalies["date"].str[:7] == str(month)]
+
+    def report(self, months=12, anomalies=10):
+        key = (months, anomalies)
+        if key not in self._reports:
+            self._reports[key] = self._report(months, anomalies)
+        return self._reports[key]
+
+    def _report(self, months, anomalies):
+        flow = self.cash_flow.tail(months).round(2)
+        recent = self.anomalies.sort_values("date", ascending=False).head(anomalies)
+        return {
+            "transactions": self.transactions,
+            "categories": [{"type": name, "spent": round(float(v), 2)} for name, v in self.categories.items()],
+            "cash_flow": [{"month": str(month), **{k: float(v) for k, v in row.items()}} for month, row in flow.iterrows()],
+            "anomalies": [{"date": r.date, "type": r.type, "amount": r.amount, "score": round(float(r.score), 1)}
+                          for r in recent.itertuples()],
+        }
+
+
+class SpendingAnalytics:
+    """Per-account ``AccountInsights`` in a small LRU cache.
+
+    Entries carry the account's ledger version, which every posting bumps,
+    so new transactions (from any worker process) invalidate the cached
+    aggregates on the next read.
+    """
+
+    def __init__(self, ledger, max_accounts=256):
+        self.ledger = ledger
+        self.max_accounts = max_accounts
+        self._data = OrderedDict()  # account_no -> (version, insights)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def insights(self, account_no):
+        account_no = str(account_no)
+        version = self.ledger.version(account_no)
+        if version is None:
+            return None
+        with self._lock:
+            cached = self._data.get(account_no)
+            if cached is not None and cached[0] == version:
+                self._data.move_to_end(account_no)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        insights = AccountInsights(self.ledger.history(account_no))
+        with self._lock:
+            self._data[account_no] = (version, insights)
+            self._data.move_to_end(account_no)
+            while len(self._data) > self.max_accounts:
+                self._data.popitem(last=False)
+        return insights
+
+    def resize(self, max_accounts):
+        with self._lock:
+            self.max_accounts = max_accounts
+            while len(self._data) > max(max_accounts, 0):
+                self._data.popitem(last=False)
+
+    def invalidate(self, account_no=None):
+        with self._lock:
+            if account_no is None:
+                self._data.clear()
+            else:
+                self._data.pop(str(account_no), None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "accounts": len(self._data),
+                "max_accounts": self.max_accounts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total else 0
+            }
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent_store import open_store  # noqa: E402
+
+SEED = {"intents": [
+    {"tag": "greeting", "patterns": ["hi", "hello"], "responses": ["Hello!"]},
+    {"tag": "weather", "patterns": ["what's the weather"], "responses": ["I can't check the weather."]},
+    {"tag": "thanks", "patterns": ["thanks"], "responses": ["You're welcome!"]},
+    {"tag": "goodbye", "patterns": ["bye"], "responses": ["Goodbye!"]},
+]}
+
+
+def write_seed(path, seed):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(seed, f)
+    # A later mtime, as after a git pull or a deploy
+    stamp = os.stat(path).st_mtime + 10
+    os.utime(path, (stamp, stamp))
+
+
+def test_store_edits_survive_a_touched_seed(tmp_path):
+    db, seed_path = str(tmp_path / "intents.sqlite3"), str(tmp_path / "intents.json")
+    write_seed(seed_path, SEED)
+    store = open_store(db, seed_path)
+    assert [i["tag"] for i in store.intents()] == ["greeting", "weather", "thanks", "goodbye"]
+
+    store.update_intent("greeting", responses=["Hi there, welcome to SkyBank!"])
+    store.delete_intent("weather")
+    store.add_patterns("thanks", ["thank you so much"])
+
+    write_seed(seed_path, SEED)
+    store = open_store(db, seed_path)
+    assert store.get("greeting")["responses"] == ["Hi there, welcome to SkyBank!"]
+    assert "weather" not in store
+    assert store.get("thanks")["patterns"] == ["thanks", "thank you so much"]
+
+
+def test_seed_edits_reach_untouched_intents_only(tmp_path):
+    db, seed_path = str(tmp_path / "intents.sqlite3"), str(tmp_path / "intents.json")
+    write_seed(seed_path, SEED)
+    store = open_store(db, seed_path)
+    store.update_intent("greeting", responses=["Edited in the store."])
+
+    seed = json.loads(json.dumps(SEED))
+    for intent in seed["intents"]:
+        intent["responses"].append("From the file.")
+    seed["intents"].append({"tag": "loan", "patterns": ["I want a loan"], "responses": ["Which loan?"]})
+    write_seed(seed_path, seed)
+    store = open_store(db, seed_path)
+
+    assert store.get("greeting")["responses"] == ["Edited in the store."]
+    assert store.get("goodbye")["responses"] == ["Goodbye!", "From the file."]
+    assert store.get("loan")["responses"] == ["Which loan?"]
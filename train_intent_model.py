@@ -1,37 +1,55 @@
 # train_intent_model.py
 import json
+import os
 import random
 import pickle
+import re
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
+from incremental_model import IncrementalIntentModel
+from compact_model import compact_path, export_pipeline, file_digest
+from intent_store import DEFAULT_DB_PATH as INTENTS_DB, open_store
+from semantic_index import SemanticIndex, semantic_path
 
 RANDOM_SEED = 42
+INCREMENTAL_STATE_FILE = "incremental_state.pkl"  # kept next to the model it updates
+PLACEHOLDER_RE = re.compile(r"\{\w+\}")
 
-def load_intents(path="intents.json"):
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def read_catalogue(path=INTENTS_DB):
+    """The intents in the store at ``path`` (seeded from intents.json, see
+    intent_store.py) or straight from a JSON file."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["intents"]
+    return open_store(path).intents()
+
+def load_intents(path=INTENTS_DB):
+    return training_data(read_catalogue(path))
+
+def training_data(intents):
     texts, labels = [], []
-    for intent in data["intents"]:
+    for intent in intents:
         tag = intent["tag"]
         for p in intent.get("patterns", []):
             # remove placeholders like {account_number} so model trains on real words
-            p_clean = p.replace("{account_number}", "").replace("{amount}", "").replace("{recipient}", "").replace("{card_type}", "").strip()
+            p_clean = PLACEHOLDER_RE.sub("", p).strip()
             if p_clean:
                 texts.append(p_clean.lower())
                 labels.append(tag)
     return texts, labels
 
-def train_save(model_path="intent_model.pkl"):
+def train_save(model_path="intent_model.pkl", intents_path=INTENTS_DB):
     random.seed(RANDOM_SEED)
     np.random.seed(RANDOM_SEED)
 
-    X, y = load_intents()
+    intents = read_catalogue(intents_path)
+    X, y = training_data(intents)
     if not X:
-        raise RuntimeError("No training data found in intents.json")
+        raise RuntimeError(f"No training data found in {intents_path}")
 
     # Small dataset — augment slightly by duplicating with minor shuffles
     X_ext, y_ext = [], []
@@ -44,24 +62,103 @@ def train_save(model_path="intent_model.pkl"):
     # Split into training and testing sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=RANDOM_SEED)
 
-    # Define pipeline
-    pipeline = Pipeline([
+    # Train
+    pipeline = build_pipeline()
+    pipeline.fit(X_train, y_train)
+
+    # Evaluate. The duplicated corpus puts most test patterns in the training
+    # set too, so only the unseen ones say anything; see
+    # benchmarks/bench_intent_models.py for a proper held-out evaluation
+    seen = set(X_train)
+    unseen = [i for i, x in enumerate(X_test) if x not in seen]
+    preds = pipeline.predict(X_test)
+    print("Accuracy (training fit):", accuracy_score(y_test, preds))
+    if unseen:
+        print(f"Accuracy on {len(unseen)} unseen patterns:",
+              accuracy_score([y_test[i] for i in unseen], [preds[i] for i in unseen]))
+    print(classification_report(y_test, preds, zero_division=0))
+
+    save_model(pipeline, model_path)
+    print(f"Saved model to {model_path}")
+    # Serving loads this sklearn-free export when it is there
+    if export_pipeline(pipeline, compact_path(model_path), file_digest(model_path)):
+        print(f"Exported inference arrays to {compact_path(model_path)}")
+    # Pattern vectors for the semantic fallback
+    SemanticIndex.build(intents).save(semantic_path(model_path))
+    print(f"Saved pattern vectors to {semantic_path(model_path)}")
+    return model_path
+
+def build_pipeline():
+    return Pipeline([
         ("tfidf", TfidfVectorizer(ngram_range=(1,2), max_features=4000)),
         ("clf", LogisticRegression(max_iter=1000, class_weight="balanced"))
     ])
 
-    # Train
-    pipeline.fit(X_train, y_train)
+def save_model(model, model_path):
+    # Write atomically so readers never see a half-written file
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(model, f)
+    os.replace(tmp_path, model_path)
 
-    # Evaluate
-    preds = pipeline.predict(X_test)
-    print("Accuracy:", accuracy_score(y_test, preds))
-    print(classification_report(y_test, preds))
+def incremental_state_path(model_path):
+    """The incremental state for models written to ``model_path``'s directory."""
+    return os.path.join(os.path.dirname(model_path), INCREMENTAL_STATE_FILE)
+
+def train_incremental(model_path="intent_model.pkl", state_path=None, rebuild=False,
+                      intents_path=INTENTS_DB):
+    """Bring the incremental model in line with the intent catalogue.
+
+    Only patterns added or removed since the last run are vectorized, and
+    new tags simply become new classes. ``rebuild`` starts from scratch.
+    The pattern vectors are patched the same way, in the space fitted by
+    the last full build, and rebuilt with ``rebuild``. The state lives in
+    the model's directory unless ``state_path`` is given.
+    """
+    state_path = state_path or incremental_state_path(model_path)
+    intents = read_catalogue(intents_path)
+    X, y = training_data(intents)
+    if not X:
+        raise RuntimeError(f"No training data found in {intents_path}")
+
+    model = None
+    if not rebuild and os.path.exists(state_path):
+        with open(state_path, "rb") as f:
+            model = pickle.load(f)
+    if not isinstance(model, IncrementalIntentModel):
+        model = IncrementalIntentModel()
+
+    added, removed = model.sync(X, y)
+    print(f"Incremental update: +{added} / -{removed} patterns, {len(model.counts)} intents")
 
-    # Save model
-    with open(model_path, "wb") as f:
-        pickle.dump(pipeline, f)
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    save_model(model, state_path)
+    save_model(model, model_path)
+    # An older full model's export must not shadow this one
+    if os.path.exists(compact_path(model_path)):
+        os.remove(compact_path(model_path))
+    vectors_path = semantic_path(state_path)
+    if not rebuild and os.path.exists(vectors_path):
+        vectors = SemanticIndex.load(vectors_path).synced(intents)
+    else:
+        vectors = SemanticIndex.build(intents)
+    vectors.save(vectors_path)
+    vectors.save(semantic_path(model_path))
     print(f"Saved model to {model_path}")
+    return model_path
 
 if __name__ == "__main__":
-    train_save()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the intent model from the intent catalogue")
+    parser.add_argument("model_path", nargs="?", default="intent_model.pkl")
+    parser.add_argument("--intents", default=INTENTS_DB, help="intent store, or a .json catalogue (default: %(default)s)")
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full")
+    parser.add_argument("--rebuild", action="store_true", help="incremental mode: discard the saved state first")
+    parser.add_argument("--nice", type=int, default=0, help="lower this process's CPU priority by N")
+    args = parser.parse_args()
+    if args.nice and hasattr(os, "nice"):
+        os.nice(args.nice)
+    if args.mode == "incremental":
+        train_incremental(args.model_path, rebuild=args.rebuild, intents_path=args.intents)
+    else:
+        train_save(args.model_path, args.intents)